@@ -0,0 +1,60 @@
+"""Командные утилиты сервиса: ``python -m app.cli export --course-id ... --format csv``."""
+
+import argparse
+import sys
+from datetime import datetime
+
+from app.core.config import settings
+from app.core.database import read_router
+from app.models.metric import MetricName
+from app.services.export import ENCODERS, MetricExportService, parquet_available
+
+
+def _export(args: argparse.Namespace) -> int:
+    if args.format == "parquet" and not parquet_available():
+        print("Parquet export requires pyarrow", file=sys.stderr)
+        return 2
+
+    db = read_router.session()
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        for chunk in MetricExportService().stream(
+            db,
+            args.format,
+            course_id=args.course_id,
+            period_from=args.period_from,
+            period_to=args.period_to,
+            metrics=args.metrics,
+            chunk_size=args.chunk_size,
+        ):
+            output.write(chunk)
+    finally:
+        db.close()
+        if output is not sys.stdout.buffer:
+            output.close()
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Потоковая выгрузка metric_results")
+    export.add_argument("--format", choices=sorted(ENCODERS), default="csv")
+    export.add_argument("--course-id")
+    export.add_argument("--period-from", type=datetime.fromisoformat)
+    export.add_argument("--period-to", type=datetime.fromisoformat)
+    export.add_argument("--metric", dest="metrics", action="append", type=MetricName)
+    export.add_argument("--chunk-size", type=int, default=settings.export_chunk_size)
+    export.add_argument("--output", default="-", help="Путь к файлу или '-' для stdout")
+    export.set_defaults(handler=_export)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
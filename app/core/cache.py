@@ -0,0 +1,267 @@
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from app.core.config import settings
+
+
+def naive_utc(value: datetime) -> datetime:
+    """Периоды в БД хранятся как naive UTC: aware-значения приводим к ним."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _period_key(value: datetime) -> str:
+    return naive_utc(value).isoformat()
+
+
+def _course_key(course_id: str) -> str:
+    # Версии, кэш и SSE-топики пишутся и читаются по одному ключу, в каком бы регистре ни пришёл id.
+    try:
+        return str(uuid.UUID(str(course_id)))
+    except ValueError:
+        return str(course_id)
+
+
+def scope_key(course_id: str, period_start: datetime, period_end: datetime) -> str:
+    return f"{_course_key(course_id)}:{_period_key(period_start)}:{_period_key(period_end)}"
+
+
+class LocalLRUCache:
+    """In-process LRU с TTL и ограничениями по числу записей и суммарному размеру.
+
+    Счётчики версий тоже ограничены ``max_entries`` (LRU). Вытесненный счётчик поднимает общий
+    «пол»: отсутствующий ключ читается как пол, а ``incr`` начинается выше него. Так версия scope
+    не откатывается назад и не совпадает с версией уже закэшированных устаревших данных.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._counters: "OrderedDict[str, int]" = OrderedDict()
+        self._counter_floor = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None) -> None:
+        if len(value) > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (ttl_seconds or self.ttl_seconds)
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (value, expires_at)
+            self._bytes += len(value)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def get_counter(self, key: str) -> int:
+        with self._lock:
+            value = self._counters.get(key)
+            if value is None:
+                return self._counter_floor
+            self._counters.move_to_end(key)
+            return value
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = self._counters.pop(key, self._counter_floor) + 1
+            self._counters[key] = value
+            while len(self._counters) > self.max_entries:
+                _, evicted = self._counters.popitem(last=False)
+                self._counter_floor = max(self._counter_floor, evicted)
+            return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "local",
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "counters": len(self._counters),
+            }
+
+
+class InMemoryRedis:
+    """Локальная замена Redis-клиента (get/set/incr) для тестов и одиночного процесса."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            current = int(self._data.get(key, (b"0", None))[0]) + 1
+            self._data[key] = (str(current).encode(), None)
+            return current
+
+    def info(self, section: str = "memory") -> Dict[str, Any]:
+        with self._lock:
+            return {"used_memory": sum(len(v) for v, _ in self._data.values())}
+
+
+class SharedCache:
+    """Общий для воркеров кэш поверх Redis-совместимого клиента."""
+
+    def __init__(self, client, ttl_seconds: float, prefix: str = "analytics:"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, ttl_seconds: float) -> "SharedCache":
+        try:
+            import redis
+        except ImportError as exc:  # pragma: no cover - зависит от окружения
+            raise RuntimeError("ANALYTICS_CACHE_BACKEND=redis requires the 'redis' package") from exc
+        return cls(redis.Redis.from_url(url), ttl_seconds)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None) -> None:
+        self.client.set(self.prefix + key, value, ex=int(ttl_seconds or self.ttl_seconds))
+
+    def get_counter(self, key: str) -> int:
+        raw = self.client.get(self.prefix + key)
+        return int(raw) if raw is not None else 0
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(self.prefix + key))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "shared", "entries": None, "bytes": self.client.info("memory").get("used_memory")}
+
+
+class AnalyticsCache:
+    """Read-through кэш аналитики с версией на (course, period).
+
+    Ключ записи включает текущую версию scope, поэтому ``bump`` после коммита
+    новых результатов инвалидирует все записи scope за O(1), не перебирая ключи.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def version(self, course_id: str, period_start: datetime, period_end: datetime) -> int:
+        if not self.enabled:
+            return 0
+        return self.backend.get_counter("v:" + scope_key(course_id, period_start, period_end))
+
+    def bump(self, course_id: str, period_start: datetime, period_end: datetime) -> None:
+        if self.enabled:
+            self.backend.incr("v:" + scope_key(course_id, period_start, period_end))
+
+    def get_or_load(
+        self,
+        kind: str,
+        course_id: str,
+        period_start: datetime,
+        period_end: datetime,
+        params: Hashable,
+        loader: Callable[[], Any],
+    ) -> Any:
+        if not self.enabled:
+            return loader()
+        version = self.version(course_id, period_start, period_end)
+        key = f"{kind}:{scope_key(course_id, period_start, period_end)}:{version}:{params!r}"
+        raw = self.backend.get(key)
+        if raw is not None:
+            self._record(hit=True)
+            return pickle.loads(raw)
+        self._record(hit=False)
+        value = loader()
+        self.backend.set(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        return value
+
+    def _record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self._hits, self._misses
+        total = hits + misses
+        backend_stats = self.backend.stats() if self.enabled else {"backend": "none", "entries": 0, "bytes": 0}
+        return {
+            **backend_stats,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+        }
+
+
+def build_analytics_cache(
+    backend_name: str = settings.analytics_cache_backend, web_concurrency: int = settings.web_concurrency
+) -> AnalyticsCache:
+    backend_name = backend_name.lower()
+    if backend_name == "local" and web_concurrency > 1:
+        # Версии scope у local свои в каждом процессе: bump на записавшем воркере не видят соседи,
+        # и они отдавали бы старые значения до истечения TTL.
+        raise RuntimeError(
+            "ANALYTICS_CACHE_BACKEND=local is per-process; use 'redis' or 'none' with WEB_CONCURRENCY > 1"
+        )
+    if backend_name == "none":
+        return AnalyticsCache(backend=None)
+    if backend_name == "redis":
+        return AnalyticsCache(
+            backend=SharedCache.from_url(settings.redis_url, settings.analytics_cache_ttl_seconds)
+        )
+    return AnalyticsCache(
+        backend=LocalLRUCache(
+            max_entries=settings.analytics_cache_max_entries,
+            max_bytes=settings.analytics_cache_max_bytes,
+            ttl_seconds=settings.analytics_cache_ttl_seconds,
+        )
+    )
+
+
+analytics_cache = build_analytics_cache()
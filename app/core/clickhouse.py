@@ -1,10 +1,21 @@
-from typing import Optional
+import asyncio
+import json
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Set, Tuple
 
-from httpx import AsyncClient
+from httpx import AsyncClient, BasicAuth
 
 from app.core.config import settings
+from app.core.logging import current_job_id, current_request_id
+
+logger = logging.getLogger(__name__)
 
 _client: Optional[AsyncClient] = None
+_kill_tasks: Set[asyncio.Task] = set()
 
 
 def get_clickhouse_client() -> AsyncClient:
@@ -22,3 +33,133 @@ async def close_clickhouse_client() -> None:
     if _client and not _client.is_closed:
         await _client.aclose()
     _client = None
+
+
+def clickhouse_auth() -> Optional[BasicAuth]:
+    if not settings.clickhouse_password:
+        return None
+    return BasicAuth(settings.clickhouse_user, settings.clickhouse_password)
+
+
+def _stamp(value: datetime) -> str:
+    return value.strftime("%Y%m%dT%H%M%S")
+
+
+def metric_query_id(metric: str, course_id: str, start: datetime, end: datetime) -> Tuple[str, bool]:
+    """query_id скана и признак, что им можно заменять ещё идущий запрос (replace_running_query).
+
+    Внутри задания id детерминирован: повтор того же задания заменяет свой скан. X-Request-ID
+    выбирает клиент, и у разных вызывающих он может совпасть, поэтому к нему добавляется
+    серверный суффикс — такие сканы друг друга не заменяют.
+    """
+    scope = f"metric:{metric}:{course_id}:{_stamp(start)}-{_stamp(end)}"
+    job_id = current_job_id()
+    if job_id is not None:
+        return f"{scope}:job-{job_id}", True
+    return f"{scope}:{current_request_id() or 'none'}:{uuid.uuid4().hex[:8]}", False
+
+
+class QueryStats(NamedTuple):
+    rows_read: int
+    bytes_read: int
+    elapsed_seconds: float
+    result_rows: int
+
+
+def parse_query_stats(headers: Mapping[str, str], payload: Optional[Dict[str, Any]] = None) -> QueryStats:
+    """Статистика выполнения: блок ``statistics`` ответа FORMAT JSON, иначе заголовок X-ClickHouse-Summary."""
+    statistics = (payload or {}).get("statistics") or {}
+    try:
+        summary = json.loads(headers.get("X-ClickHouse-Summary") or "{}")
+    except ValueError:
+        summary = {}
+    elapsed = statistics.get("elapsed")
+    if elapsed is None and summary.get("elapsed_ns") is not None:
+        elapsed = int(summary["elapsed_ns"]) / 1e9
+    return QueryStats(
+        rows_read=int(statistics.get("rows_read", summary.get("read_rows", 0))),
+        bytes_read=int(statistics.get("bytes_read", summary.get("read_bytes", 0))),
+        elapsed_seconds=float(elapsed or 0.0),
+        result_rows=int((payload or {}).get("rows", summary.get("result_rows", 0))),
+    )
+
+
+async def kill_query(client: AsyncClient, query_id: str) -> None:
+    escaped = query_id.replace("\\", "\\\\").replace("'", "\\'")
+    try:
+        response = await client.post(
+            "/",
+            params={"query": f"KILL QUERY WHERE query_id = '{escaped}' ASYNC"},
+            auth=clickhouse_auth(),
+        )
+        response.raise_for_status()
+    except Exception as exc:  # pragma: no cover - логирующий guard
+        logger.warning("Failed to kill ClickHouse query %s: %s", query_id, exc)
+
+
+def kill_query_in_background(client: AsyncClient, query_id: str) -> None:
+    """KILL QUERY отдельной задачей: вызывающая корутина уже отменена и не должна ждать."""
+    task = asyncio.get_running_loop().create_task(kill_query(client, query_id))
+    _kill_tasks.add(task)
+    task.add_done_callback(_kill_tasks.discard)
+
+
+class ClickHouseQueryLog:
+    """Накопленная статистика сканов по (метрика, курс) и журнал медленных запросов.
+
+    Число scope ограничено: при переполнении вытесняется давно не встречавшийся.
+    """
+
+    def __init__(
+        self,
+        max_scopes: int = settings.clickhouse_query_stats_max_scopes,
+        slow_query_seconds: float = settings.clickhouse_slow_query_seconds,
+    ):
+        self.max_scopes = max_scopes
+        self.slow_query_seconds = slow_query_seconds
+        self._scopes: "OrderedDict[Tuple[str, str], Dict[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, metric: str, course_id: str, query_id: str, stats: QueryStats) -> None:
+        key = (metric, course_id)
+        with self._lock:
+            scope = self._scopes.get(key)
+            if scope is None:
+                scope = self._scopes[key] = {
+                    "queries": 0,
+                    "rows_read": 0,
+                    "bytes_read": 0,
+                    "elapsed_seconds": 0.0,
+                    "max_elapsed_seconds": 0.0,
+                }
+            self._scopes.move_to_end(key)
+            scope["queries"] += 1
+            scope["rows_read"] += stats.rows_read
+            scope["bytes_read"] += stats.bytes_read
+            scope["elapsed_seconds"] += stats.elapsed_seconds
+            scope["max_elapsed_seconds"] = max(scope["max_elapsed_seconds"], stats.elapsed_seconds)
+            while len(self._scopes) > self.max_scopes:
+                self._scopes.popitem(last=False)
+        if self.slow_query_seconds > 0 and stats.elapsed_seconds >= self.slow_query_seconds:
+            logger.warning(
+                "Slow ClickHouse query %s: metric=%s course=%s elapsed=%.3fs rows_read=%s bytes_read=%s",
+                query_id,
+                metric,
+                course_id,
+                stats.elapsed_seconds,
+                stats.rows_read,
+                stats.bytes_read,
+            )
+
+    def top(self, limit: int = 20, order_by: str = "bytes_read") -> List[Dict[str, Any]]:
+        with self._lock:
+            items = [(key, dict(scope)) for key, scope in self._scopes.items()]
+        items.sort(key=lambda item: item[1][order_by], reverse=True)
+        return [{"metric": metric, "course_id": course_id, **scope} for (metric, course_id), scope in items[:limit]]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scopes.clear()
+
+
+query_log = ClickHouseQueryLog()
@@ -1,3 +1,7 @@
+import os
+import socket
+from typing import List
+
 from pydantic import BaseSettings, Field
 
 
@@ -6,16 +10,63 @@ class Settings(BaseSettings):
 
     secret_key: str = Field("CHANGE_ME", env="SECRET_KEY")
     algorithm: str = Field("HS256", env="JWT_ALGORITHM")
+    jwt_private_key_files: List[str] = Field(default_factory=list, env="JWT_PRIVATE_KEY_FILES")
+    jwt_accept_hs256: bool = Field(False, env="JWT_ACCEPT_HS256")
+    jwt_keys_reload_interval_seconds: float = Field(60.0, env="JWT_KEYS_RELOAD_INTERVAL_SECONDS")
+    jwks_max_age_seconds: int = Field(300, env="JWKS_MAX_AGE_SECONDS")
     access_token_expire_minutes: int = Field(30, env="ACCESS_TOKEN_EXPIRE_MINUTES")
     refresh_token_expire_minutes: int = Field(60 * 24 * 7, env="REFRESH_TOKEN_EXPIRE_MINUTES")
+    access_token_cache_size: int = Field(10000, env="ACCESS_TOKEN_CACHE_SIZE")
+    bcrypt_rounds: int = Field(12, env="BCRYPT_ROUNDS")
+    password_hash_workers: int = Field(2, env="PASSWORD_HASH_WORKERS")
+    password_hash_queue_limit: int = Field(8, env="PASSWORD_HASH_QUEUE_LIMIT")
+    password_hash_timeout_seconds: float = Field(10.0, env="PASSWORD_HASH_TIMEOUT_SECONDS")
     database_url: str = Field("sqlite:///./app.db", env="DATABASE_URL")
+    database_replica_urls: List[str] = Field(default_factory=list, env="DATABASE_REPLICA_URLS")
+    db_pool_size: int = Field(10, env="DB_POOL_SIZE")
+    db_max_overflow: int = Field(20, env="DB_MAX_OVERFLOW")
+    db_pool_recycle_seconds: int = Field(1800, env="DB_POOL_RECYCLE_SECONDS")
+    db_pool_timeout_seconds: float = Field(30.0, env="DB_POOL_TIMEOUT_SECONDS")
+    db_pool_pre_ping: bool = Field(True, env="DB_POOL_PRE_PING")
+    replica_max_lag_seconds: float = Field(5.0, env="REPLICA_MAX_LAG_SECONDS")
+    replica_lag_check_interval_seconds: float = Field(2.0, env="REPLICA_LAG_CHECK_INTERVAL_SECONDS")
     refresh_cleanup_interval_seconds: int = Field(3600, env="REFRESH_CLEANUP_INTERVAL_SECONDS")
+    refresh_purge_batch_size: int = Field(1000, env="REFRESH_PURGE_BATCH_SIZE")
+    refresh_purge_pause_seconds: float = Field(0.1, env="REFRESH_PURGE_PAUSE_SECONDS")
+    revoked_token_index_size: int = Field(100000, env="REVOKED_TOKEN_INDEX_SIZE")
+    revocation_sync_interval_seconds: float = Field(5.0, env="REVOCATION_SYNC_INTERVAL_SECONDS")
+    leader_lock_key: int = Field(72150311, env="LEADER_LOCK_KEY")
+    task_shutdown_timeout_seconds: float = Field(10.0, env="TASK_SHUTDOWN_TIMEOUT_SECONDS")
+    analytics_cache_backend: str = Field("local", env="ANALYTICS_CACHE_BACKEND")
+    analytics_cache_ttl_seconds: float = Field(300.0, env="ANALYTICS_CACHE_TTL_SECONDS")
+    analytics_cache_max_entries: int = Field(10000, env="ANALYTICS_CACHE_MAX_ENTRIES")
+    analytics_cache_max_bytes: int = Field(64 * 1024 * 1024, env="ANALYTICS_CACHE_MAX_BYTES")
+    # Число процессов-воркеров сервера (переменная, которую читают uvicorn и gunicorn).
+    web_concurrency: int = Field(1, env="WEB_CONCURRENCY")
+    redis_url: str = Field("redis://localhost:6379/0", env="REDIS_URL")
+    analytics_freshness_seconds: int = Field(3600, env="ANALYTICS_FRESHNESS_SECONDS")
+    sse_max_buffer: int = Field(100, env="SSE_MAX_BUFFER")
+    sse_keepalive_seconds: float = Field(15.0, env="SSE_KEEPALIVE_SECONDS")
+    export_chunk_size: int = Field(5000, env="EXPORT_CHUNK_SIZE")
+    calculation_workers: int = Field(2, env="CALCULATION_WORKERS")
+    calculation_poll_interval_seconds: float = Field(1.0, env="CALCULATION_POLL_INTERVAL_SECONDS")
+    calculation_lease_seconds: float = Field(60.0, env="CALCULATION_LEASE_SECONDS")
+    calculation_heartbeat_interval_seconds: float = Field(15.0, env="CALCULATION_HEARTBEAT_INTERVAL_SECONDS")
+    calculation_max_attempts: int = Field(3, env="CALCULATION_MAX_ATTEMPTS")
+    scheduler_interval_seconds: float = Field(300.0, env="SCHEDULER_INTERVAL_SECONDS")
+    scheduler_jitter_ratio: float = Field(0.2, env="SCHEDULER_JITTER_RATIO")
+    scheduler_max_courses_per_tick: int = Field(50, env="SCHEDULER_MAX_COURSES_PER_TICK")
+    scheduler_windows: List[str] = Field(["day", "week", "term"], env="SCHEDULER_WINDOWS")
+    scheduler_term_start_months: List[int] = Field([2, 9], env="SCHEDULER_TERM_START_MONTHS")
+    node_id: str = Field(default_factory=lambda: f"{socket.gethostname()}-{os.getpid()}", env="NODE_ID")
     clickhouse_url: str = Field("http://localhost:8123", env="CLICKHOUSE_URL")
     clickhouse_user: str = Field("default", env="CLICKHOUSE_USER")
     clickhouse_password: str = Field("", env="CLICKHOUSE_PASSWORD")
     clickhouse_database: str = Field("default", env="CLICKHOUSE_DATABASE")
     clickhouse_events_table: str = Field("events", env="CLICKHOUSE_EVENTS_TABLE")
     clickhouse_timeout_seconds: float = Field(2.0, env="CLICKHOUSE_TIMEOUT_SECONDS")
+    clickhouse_slow_query_seconds: float = Field(1.0, env="CLICKHOUSE_SLOW_QUERY_SECONDS")
+    clickhouse_query_stats_max_scopes: int = Field(5000, env="CLICKHOUSE_QUERY_STATS_MAX_SCOPES")
 
     class Config:
         env_file = ".env"
@@ -1,25 +1,157 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+# Отставание реплики: 0, если весь принятый WAL уже применён (иначе idle-реплика выглядела бы «старой»).
+_PG_REPLICA_LAG_SQL = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
 
 def _sqlite_connect_args(url: str) -> dict:
     return {"check_same_thread": False} if url.startswith("sqlite") else {}
 
 
-engine = create_engine(
-    settings.database_url,
-    future=True,
-    echo=False,
-    connect_args=_sqlite_connect_args(settings.database_url),
-)
+def _engine_kwargs(url: str) -> dict:
+    kwargs: dict = {
+        "future": True,
+        "echo": False,
+        "connect_args": _sqlite_connect_args(url),
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    if not url.startswith("sqlite"):
+        kwargs.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_recycle=settings.db_pool_recycle_seconds,
+            pool_timeout=settings.db_pool_timeout_seconds,
+        )
+    return kwargs
+
+
+engine = create_engine(settings.database_url, **_engine_kwargs(settings.database_url))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
 
 
+@dataclass
+class _Replica:
+    url: str
+    engine: Engine
+    session_factory: sessionmaker
+    lag_seconds: Optional[float] = None
+    checked_at: float = float("-inf")
+
+
+class ReadReplicaRouter:
+    """Выдаёт read-only сессии с реплик, укладывающихся в допустимое отставание.
+
+    Если реплик нет или все отстают/недоступны, сессия открывается на primary.
+    """
+
+    def __init__(
+        self,
+        replica_urls: List[str],
+        max_lag_seconds: float,
+        lag_check_interval_seconds: float,
+    ):
+        self.max_lag_seconds = max_lag_seconds
+        self.lag_check_interval_seconds = lag_check_interval_seconds
+        self._replicas = [self._make_replica(url) for url in replica_urls]
+        self._cursor = itertools.count()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _make_replica(url: str) -> _Replica:
+        replica_engine = create_engine(url, **_engine_kwargs(url))
+        return _Replica(
+            url=url,
+            engine=replica_engine,
+            session_factory=sessionmaker(autocommit=False, autoflush=False, bind=replica_engine, future=True),
+        )
+
+    def engines(self) -> List[Tuple[str, Engine]]:
+        """Движки реплик с безопасными именами (URL содержит пароль)."""
+        return [(f"replica-{index}", replica.engine) for index, replica in enumerate(self._replicas)]
+
+    def session(self) -> Session:
+        replica = self._pick()
+        if replica is None:
+            return SessionLocal()
+        return replica.session_factory()
+
+    def _pick(self) -> Optional[_Replica]:
+        if not self._replicas:
+            return None
+        start = next(self._cursor)
+        for offset in range(len(self._replicas)):
+            replica = self._replicas[(start + offset) % len(self._replicas)]
+            if self._is_fresh(replica):
+                return replica
+        return None
+
+    def _is_fresh(self, replica: _Replica) -> bool:
+        now = time.monotonic()
+        if now - replica.checked_at >= self.lag_check_interval_seconds:
+            with self._lock:
+                if now - replica.checked_at >= self.lag_check_interval_seconds:
+                    replica.lag_seconds = self._measure_lag(replica)
+                    replica.checked_at = now
+        lag = replica.lag_seconds
+        return lag is not None and lag <= self.max_lag_seconds
+
+    @staticmethod
+    def _measure_lag(replica: _Replica) -> Optional[float]:
+        if replica.engine.dialect.name != "postgresql":
+            return 0.0
+        try:
+            with replica.engine.connect() as conn:
+                return float(conn.execute(_PG_REPLICA_LAG_SQL).scalar() or 0.0)
+        except Exception as exc:  # pragma: no cover - логирующий guard
+            logger.warning("Replica %s is unavailable: %s", replica.engine.url, exc)
+            return None
+
+
+read_router = ReadReplicaRouter(
+    replica_urls=settings.database_replica_urls,
+    max_lag_seconds=settings.replica_max_lag_seconds,
+    lag_check_interval_seconds=settings.replica_lag_check_interval_seconds,
+)
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """Сессия для чтения аналитики: реплика в пределах staleness-бюджета либо primary."""
+    db = read_router.session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_session_factory():
+    """Фабрика read-сессий для потоковых ответов, которые живут дольше зависимостей запроса."""
+    return read_router.session
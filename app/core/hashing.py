@@ -0,0 +1,135 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+from passlib.context import CryptContext
+
+from app.core.config import settings
+from app.core.telemetry import PASSWORD_HASH_REJECTED, PASSWORD_HASH_SECONDS
+
+T = TypeVar("T")
+_contexts: Dict[int, CryptContext] = {}
+
+
+def _context(rounds: int) -> CryptContext:
+    context = _contexts.get(rounds)
+    if context is None:
+        context = _contexts[rounds] = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds, deprecated="auto")
+    return context
+
+
+# Функции верхнего уровня: выполняются в дочерних процессах пула (spawn).
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return _context(rounds).verify_and_update(password, hashed_password)
+
+
+class HasherSaturatedError(RuntimeError):
+    """Все слоты хеширования заняты: запрос нужно отклонить, а не ставить в бесконечную очередь."""
+
+
+class PasswordHasher:
+    """bcrypt в отдельном пуле процессов с ограниченной очередью.
+
+    Одновременно в работе или ожидании не больше ``workers + queue_limit`` операций; остальные
+    получают HasherSaturatedError сразу, не занимая общий threadpool Starlette; то же исключение (503)
+    и при превышении таймаута ожидания. ``workers=0`` — хеширование в вызывающем потоке с тем же лимитом.
+    """
+
+    def __init__(
+        self,
+        workers: int = settings.password_hash_workers,
+        queue_limit: int = settings.password_hash_queue_limit,
+        rounds: int = settings.bcrypt_rounds,
+        timeout_seconds: float = settings.password_hash_timeout_seconds,
+    ):
+        self.workers = workers
+        self.rounds = rounds
+        self.timeout_seconds = timeout_seconds
+        self.capacity = max(workers, 1) + queue_limit
+        self.in_flight = 0
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _release(self, started: float, operation: str) -> None:
+        PASSWORD_HASH_SECONDS.observe(time.perf_counter() - started, operation=operation)
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _submit(self, fn: Callable[..., T], *args) -> "Future[T]":
+        try:
+            return self._pool().submit(fn, *args)
+        except BrokenProcessPool:
+            self.shutdown()
+            return self._pool().submit(fn, *args)
+
+    def _result(self, future: "Future[T]") -> T:
+        try:
+            return future.result(timeout=self.timeout_seconds)
+        except FutureTimeoutError as exc:
+            # Ожидающая задача снимается с очереди; уже запущенная дорабатывает и держит слот до конца.
+            future.cancel()
+            raise HasherSaturatedError("Password hashing timed out") from exc
+
+    def _run(self, fn: Callable[..., T], *args) -> T:
+        if not self._slots.acquire(blocking=False):
+            PASSWORD_HASH_REJECTED.inc()
+            raise HasherSaturatedError("Password hashing queue is full")
+        with self._lock:
+            self.in_flight += 1
+        started = time.perf_counter()
+        operation = fn.__name__.lstrip("_")
+        if self.workers <= 0:
+            try:
+                return fn(*args)
+            finally:
+                self._release(started, operation)
+        future: Optional[Future] = None
+        try:
+            future = self._submit(fn, *args)
+            try:
+                return self._result(future)
+            except BrokenProcessPool:
+                # Упавший воркер ломает весь пул: пересоздаём его и повторяем один раз.
+                self.shutdown()
+                future = self._submit(fn, *args)
+                return self._result(future)
+        finally:
+            # Слот освобождается, когда задача действительно завершилась в пуле, а не по таймауту ожидания.
+            if future is None:
+                self._release(started, operation)
+            else:
+                future.add_done_callback(lambda _: self._release(started, operation))
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password, self.rounds)
+
+    def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Проверка пароля; второй элемент — новый хеш, если стоимость хранимого отличается от текущей."""
+        return self._run(_verify_and_update, password, hashed_password, self.rounds)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
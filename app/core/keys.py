@@ -0,0 +1,132 @@
+import base64
+import hashlib
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from jose import JWTError, jwk, jwt
+
+from app.core.config import settings
+from app.core.token_cache import access_token_cache
+
+logger = logging.getLogger(__name__)
+
+SYMMETRIC_ALGORITHM = "HS256"
+# python-jose 3.3 не умеет EdDSA, поэтому из асимметричных — только ES256.
+SUPPORTED_ALGORITHMS = (SYMMETRIC_ALGORITHM, "ES256")
+
+
+def _thumbprint(public_jwk: Dict[str, Any]) -> str:
+    """kid по RFC 7638: sha256 от канонического JSON обязательных полей EC-ключа."""
+    canonical = json.dumps({name: public_jwk[name] for name in ("crv", "kty", "x", "y")}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(hashlib.sha256(canonical.encode()).digest()).rstrip(b"=").decode()
+
+
+class SigningKey:
+    """Приватный ключ из PEM и его публичная часть в виде JWK."""
+
+    def __init__(self, pem: str, algorithm: str):
+        public = jwk.construct(pem, algorithm).public_key().to_dict()
+        self.pem = pem
+        self.kid = _thumbprint(public)
+        self.public_jwk = {**public, "kid": self.kid, "use": "sig"}
+
+
+class KeyRing:
+    """Ключи подписи JWT.
+
+    HS256 — общий ``secret_key``, как раньше. Для ES256 ключи читаются из PEM-файлов: первый подписывает,
+    остальные только проверяют и публикуются в JWKS, чтобы сервисы-соседи проверяли токены локально.
+    Токены несут ``kid``; ротация — перестановка файлов в списке и ``reload``.
+    """
+
+    def __init__(
+        self,
+        algorithm: str = settings.algorithm,
+        secret_key: str = settings.secret_key,
+        key_files: Sequence[str] = tuple(settings.jwt_private_key_files),
+        accept_hs256: bool = settings.jwt_accept_hs256,
+        on_change: Optional[Callable[[], None]] = None,
+    ):
+        if algorithm not in SUPPORTED_ALGORITHMS:
+            raise ValueError(f"Unsupported JWT algorithm {algorithm}; expected one of {SUPPORTED_ALGORITHMS}")
+        self.algorithm = algorithm
+        self.secret_key = secret_key
+        self.key_files = list(key_files)
+        self.accept_hs256 = accept_hs256
+        self.on_change = on_change
+        self._keys: Dict[str, SigningKey] = {}
+        self._active: Optional[SigningKey] = None
+        self._lock = threading.Lock()
+        if self.asymmetric:
+            if not self.key_files:
+                raise ValueError(f"JWT_PRIVATE_KEY_FILES is required for {algorithm}")
+            self.reload()
+
+    @property
+    def asymmetric(self) -> bool:
+        return self.algorithm != SYMMETRIC_ALGORITHM
+
+    @property
+    def kids(self) -> List[str]:
+        return list(self._keys)
+
+    @property
+    def active_kid(self) -> Optional[str]:
+        return self._active.kid if self._active is not None else None
+
+    def load(self, pems: Sequence[str]) -> bool:
+        """Заменяет набор ключей (первый — активный); True, если набор или активный ключ изменились."""
+        keys = [SigningKey(pem, self.algorithm) for pem in pems]
+        if not keys:
+            raise ValueError("At least one signing key is required")
+        with self._lock:
+            # Порядок важен: первый kid — активный.
+            changed = [key.kid for key in keys] != list(self._keys)
+            self._keys = {key.kid: key for key in keys}
+            self._active = keys[0]
+        if changed:
+            logger.info("JWT signing keys loaded: active=%s, published=%s", keys[0].kid, len(keys))
+            # Токен, подписанный изъятым ключом, не должен оставаться в кэше проверенных.
+            if self.on_change is not None:
+                self.on_change()
+        return changed
+
+    def reload(self) -> bool:
+        if not self.asymmetric:
+            return False
+        return self.load([Path(path).read_text() for path in self.key_files])
+
+    def sign(self, claims: Dict[str, Any]) -> str:
+        if not self.asymmetric:
+            return jwt.encode(claims, self.secret_key, algorithm=self.algorithm)
+        active = self._active
+        return jwt.encode(claims, active.pem, algorithm=self.algorithm, headers={"kid": active.kid})
+
+    def verify(self, token: str) -> Optional[Dict[str, Any]]:
+        try:
+            header = jwt.get_unverified_header(token)
+        except JWTError:
+            return None
+        algorithm = header.get("alg")
+        if algorithm == SYMMETRIC_ALGORITHM and (not self.asymmetric or self.accept_hs256):
+            key: Any = self.secret_key
+        elif algorithm == self.algorithm and self.asymmetric:
+            signing_key = self._keys.get(header.get("kid"))
+            if signing_key is None:
+                return None
+            key = signing_key.public_jwk
+        else:
+            return None
+        try:
+            return jwt.decode(token, key, algorithms=[algorithm])
+        except JWTError:
+            return None
+
+    def jwks(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {"keys": [key.public_jwk for key in self._keys.values()]}
+
+
+key_ring = KeyRing(on_change=access_token_cache.clear)
@@ -1 +1,49 @@
-"""Настройки логирования будут определены здесь после уточнения требований."""
+"""Контекст логирования: идентификатор запроса для корреляции логов и запросов ClickHouse."""
+
+import re
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+REQUEST_ID_HEADER = "X-Request-ID"
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+# Id задания, которое выполняется в текущем контексте; в отличие от X-Request-ID его выдаёт только сервер.
+job_id_var: ContextVar[Optional[str]] = ContextVar("job_id", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+def current_job_id() -> Optional[str]:
+    return job_id_var.get()
+
+
+class RequestIdMiddleware:
+    """Берёт X-Request-ID клиента (если он безопасен) или выдаёт новый и возвращает его в ответе."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = dict(scope["headers"]).get(REQUEST_ID_HEADER.lower().encode(), b"").decode("latin-1")
+        request_id = incoming if _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (REQUEST_ID_HEADER.lower().encode(), request_id.encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set
+
+from app.core.config import settings
+
+
+class Subscription:
+    """Подписка на набор топиков с ограниченным буфером; переполнение означает вытеснение."""
+
+    def __init__(self, broker: "UpdateBroker", topics: Iterable[str], max_buffer: int):
+        self.broker = broker
+        self.topics: Set[str] = set(topics)
+        self.max_buffer = max_buffer
+        self.evicted = False
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        self._lock = threading.Lock()
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+
+    def _offer(self, message: Dict[str, Any]) -> bool:
+        """Кладёт сообщение в буфер; True, если подписчик только что вытеснен."""
+        with self._lock:
+            if self.evicted:
+                return False
+            evicted = len(self._buffer) >= self.max_buffer
+            if evicted:
+                # Медленный потребитель: не копим бесконечно, отключаем — клиент переподключится.
+                self.evicted = True
+                self._buffer.clear()
+            else:
+                self._buffer.append(message)
+        if not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._ready.set)
+        return evicted
+
+    async def get(self, timeout: float) -> Optional[List[Dict[str, Any]]]:
+        """Накопившиеся сообщения; [] по таймауту, None после вытеснения."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._ready.clear()
+        with self._lock:
+            if self.evicted:
+                return None
+            messages = list(self._buffer)
+            self._buffer.clear()
+        return messages
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class UpdateBroker:
+    """In-process pub/sub уведомлений о новых результатах по топикам (course, period)."""
+
+    def __init__(self, max_buffer: int = settings.sse_max_buffer):
+        self.max_buffer = max_buffer
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        """Создаёт подписку; вызывать из event loop, в котором она будет читаться."""
+        subscription = Subscription(self, topics, self.max_buffer)
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscriptions.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscriptions.get(topic)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[topic]
+
+    def publish(self, topic: str, message: Dict[str, Any]) -> int:
+        """Рассылает сообщение подписчикам топика (потокобезопасно); возвращает число получателей."""
+        with self._lock:
+            subscribers = list(self._subscriptions.get(topic, ()))
+        for subscription in subscribers:
+            if subscription._offer(message):
+                self.unsubscribe(subscription)
+                with self._lock:
+                    self.evictions += 1
+        return len(subscribers)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            unique = {sub for subs in self._subscriptions.values() for sub in subs}
+            return {"subscribers": len(unique), "topics": len(self._subscriptions), "evictions": self.evictions}
+
+
+metric_updates = UpdateBroker()
@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Tuple
+
+from app.core.config import settings
+
+
+def _timestamp(value: datetime) -> float:
+    # В БД время хранится как naive UTC.
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class RevokedTokenIndex:
+    """Отозванные refresh-токены процесса: jti -> exp.
+
+    Запись живёт до истечения токена — после этого его отклонит уже проверка подписи/exp.
+    Переполнение вытесняет самые старые записи: промах означает лишь обычный запрос в БД.
+    ``watermark`` — наибольший ``revoked_at``, полученный из таблицы при дельта-синхронизации.
+    """
+
+    def __init__(self, max_entries: int = settings.revoked_token_index_size):
+        self.max_entries = max_entries
+        self.watermark: Optional[datetime] = None
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, jti: str, expires_at: float) -> None:
+        if self.max_entries <= 0 or expires_at <= time.time():
+            return
+        with self._lock:
+            self._entries[jti] = expires_at
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def contains(self, jti: str) -> bool:
+        with self._lock:
+            expires_at = self._entries.get(jti)
+            if expires_at is None:
+                return False
+            if expires_at <= time.time():
+                del self._entries[jti]
+                return False
+            return True
+
+    def merge(self, rows: Iterable[Tuple[str, datetime, datetime]]) -> int:
+        """Добавляет строки (jti, expires_at, revoked_at) из таблицы и сдвигает watermark."""
+        count = 0
+        for jti, expires_at, revoked_at in rows:
+            self.add(str(jti), _timestamp(expires_at))
+            if self.watermark is None or revoked_at > self.watermark:
+                self.watermark = revoked_at
+            count += 1
+        return count
+
+    def prune(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [jti for jti, expires_at in self._entries.items() if expires_at <= now]
+            for jti in expired:
+                del self._entries[jti]
+        return len(expired)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.watermark = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+revoked_tokens = RevokedTokenIndex()
@@ -4,29 +4,46 @@ from typing import Any, Dict, Optional, Tuple, Callable
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.core.hashing import HasherSaturatedError, password_hasher
+from app.core.keys import key_ring
+from app.core.token_cache import access_token_cache
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def _hashing_unavailable() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is temporarily overloaded",
+        headers={"Retry-After": "1"},
+    )
 
 
 def hash_password(password: str) -> str:
-    """Хешируем пароль через bcrypt (passlib)."""
-    return pwd_context.hash(password)
+    """Хешируем пароль через bcrypt в выделенном пуле процессов; 503 при переполнении очереди."""
+    try:
+        return password_hasher.hash(password)
+    except HasherSaturatedError as exc:
+        raise _hashing_unavailable() from exc
+
+
+def verify_and_update_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Проверка пароля; второй элемент — хеш с текущей стоимостью bcrypt, если хранимый устарел."""
+    try:
+        return password_hasher.verify_and_update(password, hashed_password)
+    except HasherSaturatedError as exc:
+        raise _hashing_unavailable() from exc
 
 
 def verify_password(password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(password, hashed_password)
+    return verify_and_update_password(password, hashed_password)[0]
 
 
 def _create_token(data: Dict[str, Any], expires_delta: timedelta, token_type: str) -> str:
     to_encode = data.copy()
     now = datetime.utcnow()
     to_encode.update({"exp": now + expires_delta, "iat": now, "type": token_type})
-    return jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
+    return key_ring.sign(to_encode)
 
 
 def create_access_token(subject: str, role: str) -> str:
@@ -42,19 +59,15 @@ def create_refresh_token(subject: str, role: str) -> Tuple[str, str, datetime]:
     jti = str(uuid.uuid4())
     now = datetime.utcnow()
     expires_at = now + expires_delta
-    token = jwt.encode(
-        {"sub": subject, "role": role, "exp": expires_at, "iat": now, "type": "refresh", "jti": jti},
-        settings.secret_key,
-        algorithm=settings.algorithm,
+    token = key_ring.sign(
+        {"sub": subject, "role": role, "exp": expires_at, "iat": now, "type": "refresh", "jti": jti}
     )
     return token, jti, expires_at
 
 
 def decode_token(token: str) -> Optional[Dict[str, Any]]:
-    try:
-        return jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-    except JWTError:
-        return None
+    """Проверяет подпись (по ``kid`` для асимметричных ключей) и срок; None для невалидного токена."""
+    return key_ring.verify(token)
 
 
 bearer_scheme = HTTPBearer(auto_error=True)
@@ -62,12 +75,17 @@ bearer_scheme = HTTPBearer(auto_error=True)
 
 def get_current_payload(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> Dict[str, Any]:
     token = credentials.credentials
+    # Повторные запросы с тем же токеном не проходят jwt.decode заново: кэш до exp токена.
+    payload = access_token_cache.get(token)
+    if payload is not None:
+        return payload
     payload = decode_token(token)
     if not payload or payload.get("type") != "access":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
         )
+    access_token_cache.set(token, payload)
     return payload
 
 
@@ -0,0 +1,22 @@
+from typing import Any, Iterable, Sequence
+
+import orjson
+from fastapi.responses import Response
+
+
+def dumps(content: Any) -> bytes:
+    """JSON через orjson: datetime — ISO 8601, Enum — значение, как в jsonable_encoder."""
+    return orjson.dumps(content)
+
+
+def rows_to_dicts(fields: Sequence[str], rows: Iterable[Sequence[Any]]) -> list[dict]:
+    return [dict(zip(fields, row)) for row in rows]
+
+
+class FastJSONResponse(Response):
+    """Ответ для больших аналитических выборок: кортежи строк кодируются без pydantic-моделей."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
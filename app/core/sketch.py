@@ -0,0 +1,109 @@
+import json
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+Centroid = Tuple[float, float]
+
+
+class QuantileSketch:
+    """Компактный скетч квантилей: не более ``max_centroids`` центроидов (mean, weight).
+
+    Значения сортируются и сжимаются в группы равного веса; квантиль оценивается
+    линейной интерполяцией между центрами соседних центроидов (как в t-digest).
+    """
+
+    def __init__(
+        self,
+        centroids: Sequence[Centroid] = (),
+        min_value: Optional[float] = None,
+        max_value: Optional[float] = None,
+        max_centroids: int = 64,
+    ):
+        self.centroids: List[Centroid] = list(centroids)
+        self.min_value = min_value
+        self.max_value = max_value
+        self.max_centroids = max_centroids
+
+    @classmethod
+    def from_values(cls, values: Iterable[float], max_centroids: int = 64) -> "QuantileSketch":
+        ordered = sorted(values)
+        if not ordered:
+            return cls(max_centroids=max_centroids)
+        return cls(
+            centroids=cls._compress([(v, 1.0) for v in ordered], max_centroids),
+            min_value=ordered[0],
+            max_value=ordered[-1],
+            max_centroids=max_centroids,
+        )
+
+    @staticmethod
+    def _compress(centroids: Sequence[Centroid], max_centroids: int) -> List[Centroid]:
+        if len(centroids) <= max_centroids:
+            return list(centroids)
+        total = sum(weight for _, weight in centroids)
+        target = total / max_centroids
+        result: List[Centroid] = []
+        acc_sum = acc_weight = 0.0
+        for mean, weight in centroids:
+            acc_sum += mean * weight
+            acc_weight += weight
+            if acc_weight >= target:
+                result.append((acc_sum / acc_weight, acc_weight))
+                acc_sum = acc_weight = 0.0
+        if acc_weight:
+            result.append((acc_sum / acc_weight, acc_weight))
+        return result
+
+    @property
+    def count(self) -> float:
+        return sum(weight for _, weight in self.centroids)
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        mins = [v for v in (self.min_value, other.min_value) if v is not None]
+        maxs = [v for v in (self.max_value, other.max_value) if v is not None]
+        merged = sorted(self.centroids + other.centroids)
+        return QuantileSketch(
+            centroids=self._compress(merged, self.max_centroids),
+            min_value=min(mins) if mins else None,
+            max_value=max(maxs) if maxs else None,
+            max_centroids=self.max_centroids,
+        )
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.centroids:
+            return None
+        q = min(max(q, 0.0), 1.0)
+        target = q * self.count
+        # Опорные точки: (накопленный вес в центре центроида, среднее); края — точные min/max.
+        points: List[Tuple[float, float]] = [(0.0, self.min_value)]
+        cumulative = 0.0
+        for mean, weight in self.centroids:
+            points.append((cumulative + weight / 2, mean))
+            cumulative += weight
+        points.append((cumulative, self.max_value))
+        for (left_pos, left_val), (right_pos, right_val) in zip(points, points[1:]):
+            if target <= right_pos:
+                if right_pos == left_pos:
+                    return right_val
+                ratio = (target - left_pos) / (right_pos - left_pos)
+                return left_val + (right_val - left_val) * ratio
+        return self.max_value
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "min": self.min_value,
+                "max": self.max_value,
+                "c": [[mean, weight] for mean, weight in self.centroids],
+            },
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, raw: str, max_centroids: int = 64) -> "QuantileSketch":
+        data = json.loads(raw) if raw else {}
+        return cls(
+            centroids=[(float(m), float(w)) for m, w in data.get("c", [])],
+            min_value=data.get("min"),
+            max_value=data.get("max"),
+            max_centroids=max_centroids,
+        )
@@ -1,39 +1,343 @@
+import asyncio
 import logging
+import random
 import threading
 import time
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
 
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
 from sqlalchemy.orm import sessionmaker
 
+from app.core.config import settings
+from app.core.database import engine
+from app.core.keys import KeyRing
+from app.core.revocation import RevokedTokenIndex
 from app.repositories.refresh_token_repository import RefreshTokenRepository
 
 logger = logging.getLogger(__name__)
-_cleanup_thread: Optional[threading.Thread] = None
-_lock = threading.Lock()
+# Запас на расхождение часов узлов, проставляющих revoked_at: повторное чтение строк идемпотентно.
+REVOCATION_SYNC_OVERLAP = timedelta(seconds=5)
 
 
-def start_refresh_token_cleanup(
-    session_factory: sessionmaker, repo: RefreshTokenRepository, interval_seconds: int
-) -> Optional[threading.Thread]:
-    """Запускает фоновый поток очистки истёкших refresh-токенов (idempotent)."""
-    global _cleanup_thread
+def jittered(interval_seconds: float, jitter_ratio: float) -> float:
+    """Интервал со случайным отклонением ±jitter_ratio, чтобы узлы не просыпались одновременно."""
+    if jitter_ratio <= 0:
+        return interval_seconds
+    return interval_seconds * random.uniform(1 - jitter_ratio, 1 + jitter_ratio)
 
-    if interval_seconds <= 0:
-        return None
 
-    with _lock:
-        if _cleanup_thread and _cleanup_thread.is_alive():
-            return _cleanup_thread
+class AdvisoryLockLeader:
+    """Выбор лидера через session-level advisory lock Postgres.
+
+    Лидер держит блокировку на выделенном соединении; при его обрыве Postgres снимает блокировку
+    сам, и её забирает другой узел на следующей проверке. Вне Postgres (SQLite, тесты) процесс
+    всегда лидер.
+    """
+
+    def __init__(self, engine_provider: Callable[[], Engine], lock_key: int = settings.leader_lock_key):
+        self.engine_provider = engine_provider
+        self.lock_key = lock_key
+        self._conn: Optional[Connection] = None
+        self._lock = threading.Lock()
 
-        def _worker():
-            while True:
+    def is_leader(self) -> bool:
+        current = self.engine_provider()
+        if current.dialect.name != "postgresql":
+            return True
+        with self._lock:
+            if self._conn is not None:
                 try:
-                    with session_factory() as db:
-                        repo.purge_expired(db)
-                except Exception as exc:  # pragma: no cover - логирующий guard
-                    logger.warning("Failed to purge expired refresh tokens: %s", exc)
-                time.sleep(interval_seconds)
-
-        _cleanup_thread = threading.Thread(target=_worker, name="refresh-token-cleanup", daemon=True)
-        _cleanup_thread.start()
-        return _cleanup_thread
+                    self._conn.execute(text("SELECT 1"))
+                    self._conn.commit()
+                    return True
+                except Exception as exc:
+                    logger.warning("Leader connection lost: %s", exc)
+                    self._close()
+            conn = current.connect()
+            try:
+                acquired = bool(
+                    conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.lock_key}).scalar()
+                )
+                conn.commit()
+            except Exception:
+                # Блокировка могла быть взята до ошибки: соединение нельзя возвращать в пул.
+                conn.invalidate()
+                conn.close()
+                raise
+            if not acquired:
+                conn.close()
+                return False
+            self._conn = conn
+            logger.info("Acquired background task leadership (lock %s)", self.lock_key)
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.lock_key})
+                self._conn.commit()
+            except Exception:  # pragma: no cover - соединение уже потеряно, блокировку снял сервер
+                pass
+            self._close()
+
+    def _close(self) -> None:
+        """Закрывает соединение лидера, не возвращая его в пул.
+
+        Session-level блокировка живёт, пока живёт серверная сессия: ``close()`` вернул бы её
+        в пул вместе с блокировкой, и лидерство «держал» бы случайный потребитель пула.
+        """
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.invalidate()
+                conn.close()
+            except Exception:  # pragma: no cover - логирующий guard
+                pass
+
+
+class PeriodicJob:
+    """Периодическая задача супервизора и статистика её запусков."""
+
+    def __init__(
+        self,
+        name: str,
+        target: Callable[[], Any],
+        interval_seconds: float,
+        jitter_ratio: float = 0.0,
+        run_immediately: bool = True,
+        leader_only: bool = False,
+    ):
+        self.name = name
+        self.target = target
+        self.interval_seconds = interval_seconds
+        self.jitter_ratio = jitter_ratio
+        self.run_immediately = run_immediately
+        self.leader_only = leader_only
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_started_at: Optional[datetime] = None
+        self.last_duration_seconds = 0.0
+        self.max_duration_seconds = 0.0
+        self.total_duration_seconds = 0.0
+        self.last_error: Optional[str] = None
+
+    def record(self, duration: float, error: Optional[BaseException]) -> None:
+        self.runs += 1
+        self.last_duration_seconds = duration
+        self.max_duration_seconds = max(self.max_duration_seconds, duration)
+        self.total_duration_seconds += duration
+        if error is not None:
+            self.failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval_seconds,
+            "leader_only": self.leader_only,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_started_at": self.last_started_at,
+            "last_duration_seconds": self.last_duration_seconds,
+            "max_duration_seconds": self.max_duration_seconds,
+            "avg_duration_seconds": self.total_duration_seconds / self.runs if self.runs else 0.0,
+            "last_error": self.last_error,
+        }
+
+
+class TaskSupervisor:
+    """Периодические фоновые задачи в event loop приложения.
+
+    Запускается и останавливается lifespan'ом: на остановке задачи получают сигнал и
+    shutdown_timeout_seconds на завершение текущего прохода, затем отменяются. Синхронные цели
+    выполняются в потоке (``asyncio.to_thread``), корутины — в loop. Задачи с ``leader_only``
+    выполняет только лидер среди воркеров и реплик, остальные пропускают проход.
+    """
+
+    def __init__(
+        self,
+        leader: Optional[AdvisoryLockLeader] = None,
+        shutdown_timeout_seconds: float = settings.task_shutdown_timeout_seconds,
+    ):
+        self.leader = leader
+        self.shutdown_timeout_seconds = shutdown_timeout_seconds
+        self._jobs: Dict[str, PeriodicJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._stopping: Optional[asyncio.Event] = None
+
+    def register(
+        self,
+        name: str,
+        target: Callable[[], Any],
+        interval_seconds: float,
+        jitter_ratio: float = 0.0,
+        run_immediately: bool = True,
+        leader_only: bool = False,
+    ) -> Optional[PeriodicJob]:
+        """Регистрирует задачу (idempotent по имени); ``interval_seconds <= 0`` выключает её."""
+        if interval_seconds <= 0:
+            return None
+        job = self._jobs.get(name)
+        if job is None:
+            job = self._jobs[name] = PeriodicJob(
+                name, target, interval_seconds, jitter_ratio, run_immediately, leader_only
+            )
+            if self.running:
+                self._spawn(job)
+        return job
+
+    @property
+    def running(self) -> bool:
+        return self._stopping is not None and not self._stopping.is_set()
+
+    def start(self) -> None:
+        """Запускает зарегистрированные задачи в текущем event loop (idempotent)."""
+        if self.running:
+            return
+        self._stopping = asyncio.Event()
+        for job in self._jobs.values():
+            self._spawn(job)
+
+    async def stop(self) -> None:
+        if self._stopping is None:
+            return
+        self._stopping.set()
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=self.shutdown_timeout_seconds)
+            for task in pending:
+                logger.warning("Cancelling background task %s on shutdown", task.get_name())
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._stopping = None
+        if self.leader is not None:
+            await asyncio.to_thread(self.leader.release)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"running": self.running, "jobs": [job.stats() for job in self._jobs.values()]}
+
+    def _spawn(self, job: PeriodicJob) -> None:
+        self._tasks[job.name] = asyncio.get_running_loop().create_task(self._loop(job), name=f"periodic-{job.name}")
+
+    async def _sleep(self, seconds: float) -> bool:
+        """Пауза до следующего прохода; True, если пришёл сигнал остановки."""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _loop(self, job: PeriodicJob) -> None:
+        if not job.run_immediately and await self._sleep(jittered(job.interval_seconds, job.jitter_ratio)):
+            return
+        while True:
+            await self.run_job(job)
+            if await self._sleep(jittered(job.interval_seconds, job.jitter_ratio)):
+                return
+
+    async def run_job(self, job: PeriodicJob) -> bool:
+        """Один проход задачи; False, если он пропущен (узел не лидер)."""
+        if job.leader_only and self.leader is not None:
+            try:
+                leader = await asyncio.to_thread(self.leader.is_leader)
+            except Exception as exc:
+                logger.warning("Leader election failed for %s: %s", job.name, exc)
+                leader = False
+            if not leader:
+                job.skipped += 1
+                return False
+        job.last_started_at = datetime.utcnow()
+        started = time.monotonic()
+        error: Optional[BaseException] = None
+        try:
+            if asyncio.iscoroutinefunction(job.target):
+                await job.target()
+            else:
+                await asyncio.to_thread(job.target)
+        except Exception as exc:
+            error = exc
+            logger.warning("Periodic task %s failed: %s", job.name, exc)
+        job.record(time.monotonic() - started, error)
+        return True
+
+
+supervisor = TaskSupervisor(leader=AdvisoryLockLeader(engine_provider=lambda: engine))
+
+
+def register_refresh_token_cleanup(
+    tasks: TaskSupervisor, session_factory: sessionmaker, repo: RefreshTokenRepository, interval_seconds: float
+) -> Optional[PeriodicJob]:
+    """Очистка истёкших refresh-токенов: одна на кластер, выполняет лидер."""
+
+    def _purge():
+        with session_factory() as db:
+            repo.purge_expired(db)
+
+    return tasks.register("refresh-token-cleanup", _purge, interval_seconds, leader_only=True)
+
+
+def sync_revoked_tokens(
+    session_factory: sessionmaker,
+    repo: RefreshTokenRepository,
+    index: RevokedTokenIndex,
+    batch_size: int = 5000,
+) -> int:
+    """Догружает в индекс отзывы, сделанные другими воркерами с прошлой синхронизации.
+
+    Окно перекрытия перечитывается один раз за проход, дальше страницы идут по курсору (revoked_at, jti):
+    иначе больше batch_size отзывов с одинаковым revoked_at зацикливали бы синхронизацию на первой странице.
+    """
+    index.prune()
+    total = 0
+    watermark = index.watermark
+    since = watermark - REVOCATION_SYNC_OVERLAP if watermark is not None else None
+    after = None
+    with session_factory() as db:
+        while True:
+            rows = repo.revoked_since(db, since, limit=batch_size, after=after)
+            total += index.merge(rows)
+            if len(rows) < batch_size:
+                return total
+            jti, _, revoked_at = rows[-1]
+            after = (revoked_at, jti)
+
+
+def register_revocation_sync(
+    tasks: TaskSupervisor,
+    session_factory: sessionmaker,
+    repo: RefreshTokenRepository,
+    index: RevokedTokenIndex,
+    interval_seconds: float,
+) -> Optional[PeriodicJob]:
+    """Дельта-синхронизация индекса отозванных refresh-токенов: индекс свой у каждого воркера."""
+    return tasks.register(
+        "revocation-sync", lambda: sync_revoked_tokens(session_factory, repo, index), interval_seconds
+    )
+
+
+def register_recalculation_scheduler(
+    tasks: TaskSupervisor,
+    flush: Callable[[], None],
+    tick: Callable[[], int],
+    interval_seconds: float,
+    jitter_ratio: float,
+) -> Optional[PeriodicJob]:
+    """Планировщик пересчётов: отметки активности сбрасывает каждый воркер, задания ставит лидер."""
+    tasks.register("course-activity-flush", flush, interval_seconds, jitter_ratio, run_immediately=False)
+    return tasks.register(
+        "recalculation-scheduler", tick, interval_seconds, jitter_ratio, run_immediately=False, leader_only=True
+    )
+
+
+def register_key_reload(tasks: TaskSupervisor, keys: KeyRing, interval_seconds: float) -> Optional[PeriodicJob]:
+    """Перечитывает PEM-файлы ключей подписи: ротация без рестарта, на каждом воркере."""
+    if not keys.asymmetric:
+        return None
+    return tasks.register("jwt-key-reload", keys.reload, interval_seconds, run_immediately=False)
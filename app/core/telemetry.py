@@ -0,0 +1,284 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+LabelValues = Tuple[str, ...]
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> Iterable[str]:  # pragma: no cover - переопределяется
+        return ()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными границами: запись — bisect и инкремент под коротким локом."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Счётчики по корзинам (последняя — +Inf) не кумулятивны; накопление — при выдаче.
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [корзины..., +Inf, sum]
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: Any) -> int:
+        series = self._series.get(self._key(labels))
+        return int(sum(series[:-1])) if series else 0
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, float("inf")), series[:-1]):
+                cumulative += count
+                labels = _format_labels((*self.labelnames, "le"), (*key, _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {_format_value(cumulative)}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(series[-1])}"
+            yield f"{self.name}_count{labels} {_format_value(cumulative)}"
+
+
+class Gauge(_Metric):
+    """Значение, снимаемое в момент выдачи: ``collect`` возвращает пары (метки, значение)."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        collect: Optional[Callable[[], Iterable[Tuple[Dict[str, Any], float]]]] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def _samples(self) -> Iterable[str]:
+        if self.collect is None:
+            return
+        for labels, value in self.collect():
+            yield f"{self.name}{_format_labels(self.labelnames, self._key(labels))} {_format_value(value)}"
+
+
+class Registry:
+    """Набор метрик процесса в текстовом формате Prometheus 0.0.4."""
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        collect: Optional[Callable[[], Iterable[Tuple[Dict[str, Any], float]]]] = None,
+    ) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, collect))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status")
+)
+INGEST_REQUESTS = registry.counter("ingest_requests_total", "Event ingest requests", ("outcome",))
+INGEST_EVENTS = registry.counter("ingest_events_total", "Events accepted for ingest")
+INGEST_BATCH_EVENTS = registry.histogram("ingest_batch_events", "Events per ingest request", buckets=COUNT_BUCKETS)
+INGEST_BATCH_BYTES = registry.histogram("ingest_batch_bytes", "Bytes sent to ClickHouse per ingest request", buckets=BYTES_BUCKETS)
+CLICKHOUSE_INSERT_SECONDS = registry.histogram(
+    "clickhouse_insert_duration_seconds", "ClickHouse event insert latency", ("outcome",)
+)
+CLICKHOUSE_QUERY_SECONDS = registry.histogram(
+    "clickhouse_query_duration_seconds", "ClickHouse metric query latency", ("metric", "outcome")
+)
+CLICKHOUSE_QUERY_ROWS = registry.histogram(
+    "clickhouse_query_rows", "Rows returned per metric query", ("metric",), buckets=COUNT_BUCKETS
+)
+CLICKHOUSE_ROWS_READ = registry.counter(
+    "clickhouse_rows_read_total", "Rows scanned by ClickHouse for metric queries", ("metric",)
+)
+CLICKHOUSE_BYTES_READ = registry.counter(
+    "clickhouse_bytes_read_total", "Bytes scanned by ClickHouse for metric queries", ("metric",)
+)
+CLICKHOUSE_QUERIES_KILLED = registry.counter(
+    "clickhouse_queries_killed_total", "Metric queries killed after the caller went away", ("metric",)
+)
+METRIC_UPSERT_SECONDS = registry.histogram(
+    "metric_upsert_duration_seconds", "Postgres upsert of metric results", ("metric",)
+)
+METRIC_UPSERT_ROWS = registry.counter("metric_upsert_rows_total", "Metric result rows written", ("metric",))
+AUTH_SECONDS = registry.histogram("auth_operation_duration_seconds", "Auth operation latency", ("operation", "outcome"))
+PASSWORD_HASH_SECONDS = registry.histogram(
+    "password_hash_duration_seconds", "bcrypt hash/verify latency including pool wait", ("operation",)
+)
+PASSWORD_HASH_REJECTED = registry.counter(
+    "password_hash_rejected_total", "bcrypt operations rejected because the hasher queue was full"
+)
+REFRESH_TOKENS_PURGED = registry.counter(
+    "refresh_tokens_purged_total", "Expired refresh tokens deleted by the background cleanup"
+)
+REFRESH_PURGE_SECONDS = registry.histogram(
+    "refresh_token_purge_duration_seconds", "Duration of one refresh-token cleanup run"
+)
+
+
+def timed(histogram: Histogram, **labels: Any) -> Callable[[F], F]:
+    """Декоратор: длительность вызова в ``histogram`` с меткой outcome (ok либо код/тип ошибки)."""
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "ok"
+            try:
+                return func(*args, **kwargs)
+            except Exception as exc:
+                outcome = str(getattr(exc, "status_code", type(exc).__name__))
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started, outcome=outcome, **labels)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+class RequestMetricsMiddleware:
+    """ASGI-middleware: латентность HTTP-запросов по шаблону маршрута (без высокой кардинальности путей)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started, method=scope["method"], route=route, status=status_code
+            )
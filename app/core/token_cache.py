@@ -0,0 +1,60 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+
+class VerifiedTokenCache:
+    """LRU проверенных access-токенов: sha256(token) -> payload до момента ``exp``.
+
+    В ключе — только дайджест, сами токены в памяти не хранятся. Запись живёт не дольше токена,
+    поэтому истёкший токен после вытеснения снова проходит полную проверку и отклоняется.
+    """
+
+    def __init__(self, max_entries: int = settings.access_token_cache_size):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        if self.max_entries <= 0:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def set(self, token: str, payload: Dict[str, Any]) -> None:
+        exp = payload.get("exp")
+        if self.max_entries <= 0 or not isinstance(exp, (int, float)):
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (payload, float(exp))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+access_token_cache = VerifiedTokenCache()
@@ -1,42 +1,84 @@
 from contextlib import asynccontextmanager
 
+import anyio
 from fastapi import FastAPI
 
 from app.core.config import settings
 from app.core.clickhouse import close_clickhouse_client
 from app.core.database import SessionLocal, engine
-from app.core.tasks import start_refresh_token_cleanup
+from app.core.hashing import password_hasher
+from app.core.keys import key_ring
+from app.core.logging import RequestIdMiddleware
+from app.core.revocation import revoked_tokens
+from app.core.tasks import (
+    register_key_reload,
+    register_recalculation_scheduler,
+    register_refresh_token_cleanup,
+    register_revocation_sync,
+    supervisor,
+)
+from app.core.telemetry import RequestMetricsMiddleware
 import app.models  # noqa: F401
 from app.models.base import Base
 from app.repositories.refresh_token_repository import RefreshTokenRepository
 from app.routers import auth as auth_router
 from app.routers import events as events_router
+from app.routers import keys as keys_router
 from app.routers import metrics as metrics_router
 from app.routers import analytics as analytics_router
+from app.routers import telemetry as telemetry_router
+from app.services.scheduler import RecalculationScheduler
 
 _refresh_repo = RefreshTokenRepository()
+_scheduler = RecalculationScheduler(session_factory=SessionLocal)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     Base.metadata.create_all(bind=engine)
-    start_refresh_token_cleanup(
+    register_refresh_token_cleanup(
+        supervisor,
         session_factory=SessionLocal,
         repo=_refresh_repo,
         interval_seconds=settings.refresh_cleanup_interval_seconds,
     )
-    try:
-        yield
-    finally:
-        await close_clickhouse_client()
+    register_revocation_sync(
+        supervisor,
+        session_factory=SessionLocal,
+        repo=_refresh_repo,
+        index=revoked_tokens,
+        interval_seconds=settings.revocation_sync_interval_seconds,
+    )
+    register_recalculation_scheduler(
+        supervisor,
+        flush=_scheduler.flush_pending,
+        tick=_scheduler.tick,
+        interval_seconds=settings.scheduler_interval_seconds,
+        jitter_ratio=settings.scheduler_jitter_ratio,
+    )
+    register_key_reload(supervisor, key_ring, settings.jwt_keys_reload_interval_seconds)
+    supervisor.start()
+    async with anyio.create_task_group() as background:
+        await background.start(metrics_router.job_queue.serve)
+        try:
+            yield
+        finally:
+            await supervisor.stop()
+            await metrics_router.job_queue.stop()
+            password_hasher.shutdown()
+            await close_clickhouse_client()
 
 
 def create_app() -> FastAPI:
     application = FastAPI(title="Student Metrics API", lifespan=lifespan)
     application.include_router(auth_router.router)
+    application.include_router(keys_router.router)
     application.include_router(events_router.router)
     application.include_router(metrics_router.router)
     application.include_router(analytics_router.router)
+    application.include_router(telemetry_router.router)
+    application.add_middleware(RequestMetricsMiddleware)
+    application.add_middleware(RequestIdMiddleware)
     return application
 
 
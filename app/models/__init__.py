@@ -3,3 +3,5 @@
 from app.models import user  # noqa: F401
 from app.models import refresh_token  # noqa: F401
 from app.models import metric  # noqa: F401
+from app.models import job  # noqa: F401
+from app.models import course_activity  # noqa: F401
@@ -0,0 +1,17 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, DateTime
+
+from app.models.base import Base
+from app.models.types import GUID
+
+
+class CourseActivity(Base):
+    """Отметка «курс получил новые события» для планировщика пересчётов."""
+
+    __tablename__ = "course_activity"
+
+    course_id: str = Column(GUID, primary_key=True)
+    last_event_at: datetime = Column(DateTime, nullable=False)
+    last_scheduled_at: Optional[datetime] = Column(DateTime, nullable=True)
@@ -0,0 +1,72 @@
+import uuid
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
+
+from sqlalchemy import Column, DateTime, Float, Index, SmallInteger, String, Text, text
+
+from app.models.base import Base
+from app.models.metric import MetricName
+from app.models.types import GUID
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class JobPriority(str, Enum):
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
+
+
+# Меньшее значение забирается раньше: интерактивные запросы обгоняют ночные пакеты.
+PRIORITY_LEVELS: dict[JobPriority, int] = {
+    JobPriority.INTERACTIVE: 0,
+    JobPriority.BATCH: 100,
+}
+ACTIVE_STATUSES = (JobStatus.QUEUED.value, JobStatus.RUNNING.value)
+_ACTIVE_PREDICATE = text("status IN ('queued', 'running')")
+
+
+class CalculationJob(Base):
+    """Задание на пересчёт метрик курса за период."""
+
+    __tablename__ = "calculation_jobs"
+    __table_args__ = (
+        # Single-flight: не более одного активного задания на (course, period, metrics).
+        Index(
+            "uq_calculation_jobs_active_dedupe",
+            "dedupe_key",
+            unique=True,
+            postgresql_where=_ACTIVE_PREDICATE,
+            sqlite_where=_ACTIVE_PREDICATE,
+        ),
+        # Выбор следующего задания: queued по приоритету и времени постановки.
+        Index("ix_calculation_jobs_claim", "status", "priority", "created_at"),
+        # Поиск running-заданий с истёкшей арендой (узел-владелец умер).
+        Index("ix_calculation_jobs_lease", "status", "lease_expires_at"),
+    )
+
+    id: str = Column(GUID, primary_key=True, default=lambda: str(uuid.uuid4()))
+    dedupe_key: str = Column(String(64), nullable=False)
+    course_id: str = Column(GUID, nullable=False)
+    period_start: datetime = Column(DateTime, nullable=False)
+    period_end: datetime = Column(DateTime, nullable=False)
+    metrics: str = Column(Text, nullable=False)
+    priority: int = Column(SmallInteger, nullable=False, default=PRIORITY_LEVELS[JobPriority.INTERACTIVE])
+    status: str = Column(String(16), nullable=False, default=JobStatus.QUEUED.value)
+    progress: float = Column(Float, nullable=False, default=0.0)
+    error: Optional[str] = Column(Text, nullable=True)
+    owner: Optional[str] = Column(String(128), nullable=True)
+    lease_expires_at: Optional[datetime] = Column(DateTime, nullable=True)
+    attempts: int = Column(SmallInteger, nullable=False, default=0)
+    created_at: datetime = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at: Optional[datetime] = Column(DateTime, nullable=True)
+    finished_at: Optional[datetime] = Column(DateTime, nullable=True)
+
+    @property
+    def metric_names(self) -> List[MetricName]:
+        return [MetricName(name) for name in self.metrics.split(",") if name]
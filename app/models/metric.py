@@ -3,9 +3,11 @@ from datetime import datetime
 from enum import Enum
 from typing import Optional
 
-from sqlalchemy import Column, DateTime, Enum as SqlEnum, Float, String, UniqueConstraint
+from sqlalchemy import BigInteger, Column, DateTime, Float, Index, Integer, SmallInteger, Text, UniqueConstraint, text
+from sqlalchemy.types import TypeDecorator
 
 from app.models.base import Base
+from app.models.types import GUID
 
 
 class MetricName(str, Enum):
@@ -17,6 +19,31 @@ class MetricName(str, Enum):
     FOCUS_RATIO = "focus_ratio"
 
 
+# Коды хранятся в БД: значения менять нельзя, новые метрики — только с новым кодом.
+METRIC_CODES: dict[MetricName, int] = {
+    MetricName.RETENTION: 1,
+    MetricName.ENGAGEMENT: 2,
+    MetricName.COMPLETION: 3,
+    MetricName.TIME_ON_TASK: 4,
+    MetricName.ACTIVITY_INDEX: 5,
+    MetricName.FOCUS_RATIO: 6,
+}
+METRICS_BY_CODE: dict[int, MetricName] = {code: name for name, code in METRIC_CODES.items()}
+
+
+class MetricNameType(TypeDecorator):
+    """MetricName, хранящийся как smallint-код."""
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else METRIC_CODES[MetricName(value)]
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else METRICS_BY_CODE[int(value)]
+
+
 class MetricResult(Base):
     __tablename__ = "metric_results"
     __table_args__ = (
@@ -29,16 +56,88 @@ class MetricResult(Base):
             "period_end",
             name="uq_metric_scope",
         ),
+        # Когортные выборки: курс + период + набор пользователей, index-only scan в PostgreSQL.
+        Index(
+            "ix_metric_results_course_period_user",
+            "course_id",
+            "period_start",
+            "period_end",
+            "user_id",
+            "metric_name",
+            postgresql_include=["value"],
+        ),
+        # Лидерборд: keyset-пагинация по (value, user_id) внутри scope, прямым или обратным сканом.
+        Index(
+            "ix_metric_results_leaderboard",
+            "course_id",
+            "metric_name",
+            "period_start",
+            "period_end",
+            "module_id",
+            "value",
+            "user_id",
+        ),
+        # Тренды пользователя: диапазонный скан по period_start.
+        Index(
+            "ix_metric_results_user_series",
+            "user_id",
+            "course_id",
+            "metric_name",
+            "period_start",
+            postgresql_include=["value"],
+        ),
     )
 
-    id: str = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    metric_name: MetricName = Column(
-        SqlEnum(MetricName, name="metric_names", native_enum=False), nullable=False
-    )
-    user_id: str = Column(String, nullable=False, index=True)
-    course_id: str = Column(String, nullable=False, index=True)
-    module_id: Optional[str] = Column(String, nullable=True, index=True)
+    id: int = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    metric_name: MetricName = Column(MetricNameType, nullable=False)
+    user_id: str = Column(GUID, nullable=False, index=True)
+    course_id: str = Column(GUID, nullable=False, index=True)
+    module_id: Optional[str] = Column(GUID, nullable=True, index=True)
     value: float = Column(Float, nullable=False)
     period_start: datetime = Column(DateTime, nullable=False)
     period_end: datetime = Column(DateTime, nullable=False)
     calculated_at: datetime = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+_COURSE_SCOPE = text("module_id IS NULL")
+
+
+class CourseMetricSummary(Base):
+    """Агрегаты метрики по курсу, поддерживаемые при записи результатов."""
+
+    __tablename__ = "course_metric_summaries"
+    __table_args__ = (
+        UniqueConstraint(
+            "metric_name",
+            "course_id",
+            "module_id",
+            "period_start",
+            "period_end",
+            name="uq_course_metric_summary_scope",
+        ),
+        # NULL в module_id не считается равным другому NULL: сводке по курсу целиком нужен отдельный индекс.
+        Index(
+            "uq_course_metric_summary_course_scope",
+            "metric_name",
+            "course_id",
+            "period_start",
+            "period_end",
+            unique=True,
+            postgresql_where=_COURSE_SCOPE,
+            sqlite_where=_COURSE_SCOPE,
+        ),
+    )
+
+    id: str = Column(GUID, primary_key=True, default=lambda: str(uuid.uuid4()))
+    metric_name: MetricName = Column(MetricNameType, nullable=False)
+    course_id: str = Column(GUID, nullable=False, index=True)
+    module_id: Optional[str] = Column(GUID, nullable=True)
+    period_start: datetime = Column(DateTime, nullable=False)
+    period_end: datetime = Column(DateTime, nullable=False)
+    count: int = Column(Integer, nullable=False, default=0)
+    value_sum: float = Column(Float, nullable=False, default=0.0)
+    value_sum_sq: float = Column(Float, nullable=False, default=0.0)
+    min_value: Optional[float] = Column(Float, nullable=True)
+    max_value: Optional[float] = Column(Float, nullable=True)
+    sketch: str = Column(Text, nullable=False, default="")
+    updated_at: datetime = Column(DateTime, default=datetime.utcnow, nullable=False)
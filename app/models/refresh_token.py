@@ -1,15 +1,18 @@
 from datetime import datetime
+from typing import Optional
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, String
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey
 
 from app.models.base import Base
+from app.models.types import GUID
 
 
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
 
-    jti: str = Column(String, primary_key=True)
-    user_id: str = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    jti: str = Column(GUID, primary_key=True)
+    user_id: str = Column(GUID, ForeignKey("users.id"), nullable=False, index=True)
     revoked: bool = Column(Boolean, default=False, nullable=False)
-    expires_at: datetime = Column(DateTime, nullable=False)
+    expires_at: datetime = Column(DateTime, nullable=False, index=True)
+    revoked_at: Optional[datetime] = Column(DateTime, nullable=True, index=True)
     created_at: datetime = Column(DateTime, default=datetime.utcnow, nullable=False)
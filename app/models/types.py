@@ -0,0 +1,24 @@
+import uuid
+
+from sqlalchemy import String
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.types import TypeDecorator
+
+
+class GUID(TypeDecorator):
+    """UUID в текстовом виде для API; в PostgreSQL хранится нативным 16-байтным UUID."""
+
+    impl = String
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=False))
+        return dialect.type_descriptor(String())
+
+    def process_bind_param(self, value, dialect):
+        # Каноническая форма на всех диалектах; не-UUID отклоняется до запроса (ValueError).
+        return None if value is None else str(uuid.UUID(str(value)))
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else str(value)
@@ -5,6 +5,7 @@ from enum import Enum
 from sqlalchemy import Column, DateTime, Enum as SqlEnum, String
 
 from app.models.base import Base
+from app.models.types import GUID
 
 
 class UserRole(str, Enum):
@@ -16,7 +17,7 @@ class UserRole(str, Enum):
 class User(Base):
     __tablename__ = "users"
 
-    id: str = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id: str = Column(GUID, primary_key=True, default=lambda: str(uuid.uuid4()))
     email: str = Column(String, unique=True, nullable=False, index=True)
     hashed_password: str = Column(String, nullable=False)
     role: UserRole = Column(SqlEnum(UserRole, name="user_roles", native_enum=False), nullable=False)
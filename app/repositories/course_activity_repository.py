@@ -0,0 +1,63 @@
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.course_activity import CourseActivity
+
+
+class CourseActivityRepository:
+    def touch_many(self, db: Session, seen: Dict[str, datetime]) -> None:
+        """Сдвигает last_event_at вперёд для курсов с новыми событиями (создаёт записи при необходимости)."""
+        for course_id, event_at in seen.items():
+            updated = db.execute(
+                update(CourseActivity)
+                .where(CourseActivity.course_id == course_id, CourseActivity.last_event_at < event_at)
+                .values(last_event_at=event_at)
+            ).rowcount
+            if updated or db.get(CourseActivity, course_id) is not None:
+                continue
+            try:
+                with db.begin_nested():
+                    db.add(CourseActivity(course_id=course_id, last_event_at=event_at))
+            except IntegrityError:
+                # Запись создал другой узел — повторно сдвигаем время.
+                db.execute(
+                    update(CourseActivity)
+                    .where(CourseActivity.course_id == course_id, CourseActivity.last_event_at < event_at)
+                    .values(last_event_at=event_at)
+                )
+        db.commit()
+
+    def list_dirty(self, db: Session, limit: int) -> List[Tuple[str, datetime]]:
+        """Курсы с событиями после последнего планирования, самые давно не пересчитанные — первыми."""
+        rows = db.execute(
+            select(CourseActivity.course_id, CourseActivity.last_event_at)
+            .where(
+                or_(
+                    CourseActivity.last_scheduled_at.is_(None),
+                    CourseActivity.last_scheduled_at < CourseActivity.last_event_at,
+                )
+            )
+            .order_by(CourseActivity.last_scheduled_at.is_not(None), CourseActivity.last_scheduled_at)
+            .limit(limit)
+        ).all()
+        return [(course_id, last_event_at) for course_id, last_event_at in rows]
+
+    def mark_scheduled(self, db: Session, course_id: str, seen_event_at: datetime) -> bool:
+        """Помечает курс запланированным до ``seen_event_at``; False, если его уже забрал другой узел."""
+        marked = db.execute(
+            update(CourseActivity)
+            .where(
+                CourseActivity.course_id == course_id,
+                or_(
+                    CourseActivity.last_scheduled_at.is_(None),
+                    CourseActivity.last_scheduled_at < seen_event_at,
+                ),
+            )
+            .values(last_scheduled_at=seen_event_at)
+        ).rowcount
+        db.commit()
+        return bool(marked)
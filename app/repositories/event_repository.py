@@ -1,10 +1,14 @@
 import json
+import time
+import uuid
 from typing import List, Sequence
 
-from httpx import AsyncClient, BasicAuth, HTTPStatusError
+from httpx import AsyncClient, HTTPStatusError
 
-from app.core.clickhouse import get_clickhouse_client
+from app.core.clickhouse import clickhouse_auth, get_clickhouse_client
 from app.core.config import settings
+from app.core.logging import current_request_id
+from app.core.telemetry import CLICKHOUSE_INSERT_SECONDS, INGEST_BATCH_BYTES
 from app.schemas.events import EventIn
 
 
@@ -25,21 +29,27 @@ class EventRepository:
             "FORMAT JSONEachRow"
         )
 
-        body = "\n".join([event.json() for event in events])
-        auth = (
-            BasicAuth(settings.clickhouse_user, settings.clickhouse_password)
-            if settings.clickhouse_password
-            else None
-        )
-        response = await client.post(
-            "/",
-            params={"query": query, "database": settings.clickhouse_database},
-            content=body,
-            headers={"Content-Type": "application/json"},
-            auth=auth,
-        )
+        body = "\n".join([event.json() for event in events]).encode()
+        INGEST_BATCH_BYTES.observe(len(body))
+        started = time.perf_counter()
+        outcome = "error"
         try:
+            response = await client.post(
+                "/",
+                params={
+                    "query": query,
+                    "database": settings.clickhouse_database,
+                    # Суффикс: клиент может повторить X-Request-ID, а одинаковые query_id ClickHouse не допускает.
+                    "query_id": f"ingest:{current_request_id() or 'none'}:{uuid.uuid4().hex[:8]}",
+                },
+                content=body,
+                headers={"Content-Type": "application/json"},
+                auth=clickhouse_auth(),
+            )
             response.raise_for_status()
+            outcome = "ok"
         except HTTPStatusError as exc:
             detail = exc.response.text
             raise RuntimeError(f"ClickHouse insert failed: {detail}") from exc
+        finally:
+            CLICKHOUSE_INSERT_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
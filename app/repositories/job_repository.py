@@ -0,0 +1,164 @@
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.cache import scope_key
+from app.models.job import ACTIVE_STATUSES, CalculationJob, JobStatus
+from app.models.metric import METRIC_CODES, MetricName
+
+
+def dedupe_key(course_id: str, period_start: datetime, period_end: datetime, metrics: Sequence[MetricName]) -> str:
+    codes = ",".join(str(code) for code in sorted(METRIC_CODES[MetricName(m)] for m in metrics))
+    return hashlib.sha256(f"{scope_key(course_id, period_start, period_end)}:{codes}".encode()).hexdigest()
+
+
+class JobRepository:
+    def get(self, db: Session, job_id: str) -> Optional[CalculationJob]:
+        return db.get(CalculationJob, job_id)
+
+    def get_active(self, db: Session, key: str) -> Optional[CalculationJob]:
+        return db.execute(
+            select(CalculationJob).where(
+                CalculationJob.dedupe_key == key,
+                CalculationJob.status.in_(ACTIVE_STATUSES),
+            )
+        ).scalar_one_or_none()
+
+    def submit(
+        self,
+        db: Session,
+        course_id: str,
+        period_start: datetime,
+        period_end: datetime,
+        metrics: Sequence[MetricName],
+        priority: int,
+    ) -> Tuple[CalculationJob, bool]:
+        """Ставит задание в очередь или возвращает уже активное с тем же scope; второй элемент — создано ли новое."""
+        key = dedupe_key(course_id, period_start, period_end, metrics)
+        for _ in range(2):
+            existing = self.get_active(db, key)
+            if existing is not None:
+                if priority < existing.priority and existing.status == JobStatus.QUEUED.value:
+                    existing.priority = priority
+                    db.commit()
+                return existing, False
+            job = CalculationJob(
+                dedupe_key=key,
+                course_id=course_id,
+                period_start=period_start,
+                period_end=period_end,
+                metrics=",".join(MetricName(m).value for m in metrics),
+                priority=priority,
+            )
+            db.add(job)
+            try:
+                db.commit()
+            except IntegrityError:
+                # Параллельная постановка того же scope успела раньше — присоединяемся к ней.
+                db.rollback()
+                continue
+            db.refresh(job)
+            return job, True
+        raise RuntimeError(f"Failed to submit calculation job for {key}")
+
+    @staticmethod
+    def _claimable(now: datetime):
+        # queued либо running с истёкшей арендой: владелец не продлевал её и считается умершим.
+        return or_(
+            CalculationJob.status == JobStatus.QUEUED.value,
+            and_(CalculationJob.status == JobStatus.RUNNING.value, CalculationJob.lease_expires_at < now),
+        )
+
+    def claim_next(
+        self, db: Session, owner: str, lease_seconds: float, max_attempts: int
+    ) -> Optional[CalculationJob]:
+        """Атомарно берёт в аренду самое приоритетное доступное задание (включая брошенные умершими узлами)."""
+        for _ in range(3):
+            now = datetime.utcnow()
+            job_id = db.execute(
+                select(CalculationJob.id)
+                .where(self._claimable(now))
+                .order_by(CalculationJob.priority, CalculationJob.created_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            ).scalar_one_or_none()
+            if job_id is None:
+                db.rollback()
+                return None
+            claimed = db.execute(
+                update(CalculationJob)
+                .where(CalculationJob.id == job_id, self._claimable(now))
+                .values(
+                    status=JobStatus.RUNNING.value,
+                    owner=owner,
+                    lease_expires_at=now + timedelta(seconds=lease_seconds),
+                    started_at=now,
+                    progress=0.0,
+                    attempts=CalculationJob.attempts + 1,
+                )
+            ).rowcount
+            db.commit()
+            if not claimed:
+                continue
+            job = self.get(db, job_id)
+            if job.attempts > max_attempts:
+                self.finish(db, job_id, owner, job.attempts, error=f"Lease expired {max_attempts} times, giving up")
+                continue
+            return job
+        return None
+
+    @staticmethod
+    def _held(job_id: str, owner: str, attempt: int):
+        # attempts растёт при каждом захвате и служит fencing-токеном: owner одинаков у всех воркеров
+        # процесса, и повторно захвативший задание сосед не должен совпасть с прежним исполнением.
+        return and_(
+            CalculationJob.id == job_id,
+            CalculationJob.owner == owner,
+            CalculationJob.attempts == attempt,
+            CalculationJob.status == JobStatus.RUNNING.value,
+        )
+
+    def holds_lease(self, db: Session, job_id: str, owner: str, attempt: int, lock: bool = False) -> bool:
+        """Проверяет, что задание всё ещё за этим захватом; ``lock`` держит строку до конца транзакции.
+
+        С блокировкой повторный захват ждёт коммита записи результатов и не пересекается с ней.
+        """
+        query = select(CalculationJob.id).where(self._held(job_id, owner, attempt))
+        if lock:
+            query = query.with_for_update()
+        return db.execute(query).scalar_one_or_none() is not None
+
+    def renew(self, db: Session, job_id: str, owner: str, attempt: int, lease_seconds: float) -> bool:
+        """Продлевает аренду; False, если задание уже перехвачено (в том числе соседом по процессу) или завершено."""
+        renewed = db.execute(
+            update(CalculationJob)
+            .where(self._held(job_id, owner, attempt))
+            .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds))
+        ).rowcount
+        db.commit()
+        return bool(renewed)
+
+    def set_progress(self, db: Session, job_id: str, owner: str, attempt: int, progress: float) -> bool:
+        updated = db.execute(
+            update(CalculationJob).where(self._held(job_id, owner, attempt)).values(progress=progress)
+        ).rowcount
+        db.commit()
+        return bool(updated)
+
+    def finish(
+        self, db: Session, job_id: str, owner: str, attempt: int, error: Optional[str] = None
+    ) -> bool:
+        values = {"finished_at": datetime.utcnow(), "lease_expires_at": None}
+        if error is None:
+            values.update(status=JobStatus.SUCCEEDED.value, progress=1.0)
+        else:
+            values.update(status=JobStatus.FAILED.value, error=error)
+        updated = db.execute(
+            update(CalculationJob).where(self._held(job_id, owner, attempt)).values(**values)
+        ).rowcount
+        db.commit()
+        return bool(updated)
@@ -1,10 +1,26 @@
+import asyncio
+import time
 from datetime import datetime
 from typing import Iterable, List, Tuple
 
-from httpx import AsyncClient, BasicAuth, HTTPStatusError
+from httpx import AsyncClient, HTTPStatusError, TimeoutException
 
-from app.core.clickhouse import get_clickhouse_client
+from app.core.clickhouse import (
+    clickhouse_auth,
+    get_clickhouse_client,
+    kill_query_in_background,
+    metric_query_id,
+    parse_query_stats,
+    query_log,
+)
 from app.core.config import settings
+from app.core.telemetry import (
+    CLICKHOUSE_BYTES_READ,
+    CLICKHOUSE_QUERIES_KILLED,
+    CLICKHOUSE_QUERY_ROWS,
+    CLICKHOUSE_QUERY_SECONDS,
+    CLICKHOUSE_ROWS_READ,
+)
 from app.models.metric import MetricName
 
 
@@ -194,22 +210,34 @@ class ClickHouseMetricRepository:
     ) -> List[Tuple[str, float]]:
         client: AsyncClient = self.client_provider()
         query = MetricQueryBuilder.build(metric, start, end, course_id)
-        auth = (
-            BasicAuth(settings.clickhouse_user, settings.clickhouse_password)
-            if settings.clickhouse_password
-            else None
-        )
-        response = await client.post(
-            "/",
-            params={"database": settings.clickhouse_database, "query": query},
-            auth=auth,
-        )
+        query_id, replaceable = metric_query_id(metric.value, course_id, start, end)
+        params = {"database": settings.clickhouse_database, "query": query, "query_id": query_id}
+        if replaceable:
+            # Повтор того же задания заменяет его ещё идущий скан, а не дублирует его.
+            params["replace_running_query"] = 1
+        started = time.perf_counter()
+        outcome = "error"
         try:
+            response = await client.post("/", params=params, auth=clickhouse_auth())
             response.raise_for_status()
+            outcome = "ok"
         except HTTPStatusError as exc:
             detail = exc.response.text
             raise RuntimeError(f"ClickHouse metrics query failed: {detail}") from exc
+        except (asyncio.CancelledError, TimeoutException):
+            # Клиент ушёл или истёк таймаут: закрытие HTTP-соединения не всегда останавливает скан на сервере.
+            outcome = "cancelled"
+            CLICKHOUSE_QUERIES_KILLED.inc(metric=metric.value)
+            kill_query_in_background(client, query_id)
+            raise
+        finally:
+            CLICKHOUSE_QUERY_SECONDS.observe(time.perf_counter() - started, metric=metric.value, outcome=outcome)
 
         payload = response.json()
         data = payload.get("data", [])
+        CLICKHOUSE_QUERY_ROWS.observe(len(data), metric=metric.value)
+        stats = parse_query_stats(response.headers, payload)
+        CLICKHOUSE_ROWS_READ.inc(stats.rows_read, metric=metric.value)
+        CLICKHOUSE_BYTES_READ.inc(stats.bytes_read, metric=metric.value)
+        query_log.record(metric.value, course_id, query_id, stats)
         return [(row["user_id"], float(row["value"])) for row in data]
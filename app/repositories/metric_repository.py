@@ -1,13 +1,37 @@
-from datetime import datetime
-from typing import Iterable, List, Sequence, Tuple
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 
-from sqlalchemy import and_, func
+from sqlalchemy import and_, func, select, tuple_
 from sqlalchemy.orm import Session
 
-from app.models.metric import MetricName, MetricResult
+from app.core.cache import AnalyticsCache, analytics_cache, scope_key
+from app.core.pubsub import UpdateBroker, metric_updates
+from app.core.sketch import QuantileSketch
+from app.core.telemetry import METRIC_UPSERT_ROWS, METRIC_UPSERT_SECONDS
+from app.models.metric import CourseMetricSummary, MetricName, MetricResult
+
+
+class CourseAggregate(NamedTuple):
+    metric_name: MetricName
+    average_value: float
+    count: Optional[int] = None
+    stddev: Optional[float] = None
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+
+
+def _stddev(count: int, value_sum: float, value_sum_sq: float) -> float:
+    mean = value_sum / count
+    return math.sqrt(max(0.0, value_sum_sq / count - mean * mean))
 
 
 class MetricRepository:
+    def __init__(self, cache: AnalyticsCache | None = None, updates: UpdateBroker | None = None):
+        self.cache = cache or analytics_cache
+        self.updates = updates or metric_updates
+
     def upsert_batch(
         self,
         db: Session,
@@ -16,9 +40,22 @@ class MetricRepository:
         period_start,
         period_end,
         rows: Iterable[tuple[str, float]],
+        guard: Optional[Callable[[Session], None]] = None,
     ) -> None:
-        """Сохраняет результаты метрики (user_id, value) с заменой существующих."""
+        """Сохраняет результаты метрики (user_id, value) с заменой существующих.
+
+        ``guard`` выполняется первым в транзакции записи и может отменить её исключением.
+        """
+        started = time.perf_counter()
+        written = 0
+        if guard is not None:
+            try:
+                guard(db)
+            except Exception:
+                db.rollback()
+                raise
         for user_id, value in rows:
+            written += 1
             existing = (
                 db.query(MetricResult)
                 .filter(
@@ -46,7 +83,78 @@ class MetricRepository:
                         period_end=period_end,
                     )
                 )
+        db.flush()
+        self._refresh_course_summary(db, metric_name, course_id, None, period_start, period_end)
         db.commit()
+        METRIC_UPSERT_SECONDS.observe(time.perf_counter() - started, metric=MetricName(metric_name).value)
+        METRIC_UPSERT_ROWS.inc(written, metric=MetricName(metric_name).value)
+        self.cache.bump(course_id, period_start, period_end)
+        self.updates.publish(
+            scope_key(course_id, period_start, period_end),
+            {
+                "course_id": course_id,
+                "period_start": period_start,
+                "period_end": period_end,
+                "metric_name": metric_name,
+                "calculated_at": datetime.utcnow(),
+            },
+        )
+
+    def _refresh_course_summary(
+        self,
+        db: Session,
+        metric_name: MetricName,
+        course_id: str,
+        module_id: Optional[str],
+        period_start: datetime,
+        period_end: datetime,
+    ) -> None:
+        """Пересобирает сводку scope в той же транзакции, что и запись результатов."""
+        module_filter = (
+            MetricResult.module_id.is_(None) if module_id is None else MetricResult.module_id == module_id
+        )
+        values = [
+            value
+            for (value,) in db.query(MetricResult.value).filter(
+                MetricResult.metric_name == metric_name,
+                MetricResult.course_id == course_id,
+                module_filter,
+                MetricResult.period_start == period_start,
+                MetricResult.period_end == period_end,
+            )
+        ]
+        summary_module_filter = (
+            CourseMetricSummary.module_id.is_(None)
+            if module_id is None
+            else CourseMetricSummary.module_id == module_id
+        )
+        summary = (
+            db.query(CourseMetricSummary)
+            .filter(
+                CourseMetricSummary.metric_name == metric_name,
+                CourseMetricSummary.course_id == course_id,
+                summary_module_filter,
+                CourseMetricSummary.period_start == period_start,
+                CourseMetricSummary.period_end == period_end,
+            )
+            .first()
+        )
+        if summary is None:
+            summary = CourseMetricSummary(
+                metric_name=metric_name,
+                course_id=course_id,
+                module_id=module_id,
+                period_start=period_start,
+                period_end=period_end,
+            )
+            db.add(summary)
+        summary.count = len(values)
+        summary.value_sum = sum(values)
+        summary.value_sum_sq = sum(v * v for v in values)
+        summary.min_value = min(values) if values else None
+        summary.max_value = max(values) if values else None
+        summary.sketch = QuantileSketch.from_values(values).to_json()
+        summary.updated_at = datetime.utcnow()
 
     def get_user_metrics(
         self,
@@ -67,6 +175,189 @@ class MetricRepository:
             query = query.filter(MetricResult.metric_name.in_(metrics))
         return query.order_by(MetricResult.metric_name).all()
 
+    def get_user_metric_rows(
+        self,
+        db: Session,
+        user_id: str,
+        course_id: str,
+        period_start: datetime,
+        period_end: datetime,
+        metrics: Sequence[MetricName] | None = None,
+    ) -> List[tuple]:
+        """То же, что get_user_metrics, но кортежами в порядке полей MetricResultOut (без ORM-объектов)."""
+        query = db.query(
+            MetricResult.metric_name,
+            MetricResult.user_id,
+            MetricResult.course_id,
+            MetricResult.module_id,
+            MetricResult.value,
+            MetricResult.period_start,
+            MetricResult.period_end,
+            MetricResult.calculated_at,
+        ).filter(
+            MetricResult.user_id == user_id,
+            MetricResult.course_id == course_id,
+            MetricResult.period_start == period_start,
+            MetricResult.period_end == period_end,
+        )
+        if metrics:
+            query = query.filter(MetricResult.metric_name.in_(metrics))
+        return [tuple(row) for row in query.order_by(MetricResult.metric_name).all()]
+
+    def get_user_series(
+        self,
+        db: Session,
+        user_id: str,
+        course_id: str,
+        metric_name: MetricName,
+        period_from: datetime | None = None,
+        period_to: datetime | None = None,
+        window: timedelta | None = None,
+    ) -> List[Tuple[datetime, float]]:
+        """Значения метрики пользователя по всем периодам диапазона, по возрастанию period_start.
+
+        Окна разной длины (день и неделя с понедельника) начинаются в один момент: в ряд попадает
+        одна точка на period_start — окна длиной ``window`` или, если она не задана, самого короткого.
+        """
+        query = db.query(MetricResult.period_start, MetricResult.period_end, MetricResult.value).filter(
+            MetricResult.user_id == user_id,
+            MetricResult.course_id == course_id,
+            MetricResult.metric_name == metric_name,
+        )
+        if period_from is not None:
+            query = query.filter(MetricResult.period_start >= period_from)
+        if period_to is not None:
+            query = query.filter(MetricResult.period_start < period_to)
+        points: List[Tuple[datetime, float]] = []
+        for row in query.order_by(MetricResult.period_start, MetricResult.period_end):
+            if window is not None and row.period_end - row.period_start != window:
+                continue
+            if points and points[-1][0] == row.period_start:
+                continue
+            points.append((row.period_start, row.value))
+        return points
+
+    def get_cohort_metrics(
+        self,
+        db: Session,
+        course_id: str,
+        period_start: datetime,
+        period_end: datetime,
+        user_ids: Sequence[str] | None = None,
+        metrics: Sequence[MetricName] | None = None,
+    ) -> List[Tuple[str, MetricName, float]]:
+        """Значения метрик группы пользователей (или всего курса) одним запросом."""
+        query = db.query(MetricResult.user_id, MetricResult.metric_name, MetricResult.value).filter(
+            MetricResult.course_id == course_id,
+            MetricResult.period_start == period_start,
+            MetricResult.period_end == period_end,
+        )
+        if user_ids:
+            query = query.filter(MetricResult.user_id.in_(user_ids))
+        if metrics:
+            query = query.filter(MetricResult.metric_name.in_(metrics))
+        return [(row.user_id, row.metric_name, row.value) for row in query.all()]
+
+    @staticmethod
+    def _leaderboard_scope(
+        query,
+        course_id: str,
+        metric_name: MetricName,
+        period_start: datetime,
+        period_end: datetime,
+        module_id: Optional[str],
+    ):
+        return query.filter(
+            MetricResult.course_id == course_id,
+            MetricResult.metric_name == metric_name,
+            MetricResult.period_start == period_start,
+            MetricResult.period_end == period_end,
+            MetricResult.module_id.is_(None) if module_id is None else MetricResult.module_id == module_id,
+        )
+
+    def get_leaderboard_page(
+        self,
+        db: Session,
+        course_id: str,
+        metric_name: MetricName,
+        period_start: datetime,
+        period_end: datetime,
+        module_id: Optional[str] = None,
+        limit: int = 50,
+        after: Optional[Tuple[float, str]] = None,
+        descending: bool = True,
+    ) -> List[Tuple[str, float]]:
+        """Страница рейтинга после ключа ``after`` = (value, user_id); стоимость O(limit) по индексу."""
+        query = self._leaderboard_scope(
+            db.query(MetricResult.user_id, MetricResult.value),
+            course_id,
+            metric_name,
+            period_start,
+            period_end,
+            module_id,
+        )
+        key = tuple_(MetricResult.value, MetricResult.user_id)
+        if after is not None:
+            query = query.filter(key < tuple_(*after) if descending else key > tuple_(*after))
+        if descending:
+            query = query.order_by(MetricResult.value.desc(), MetricResult.user_id.desc())
+        else:
+            query = query.order_by(MetricResult.value.asc(), MetricResult.user_id.asc())
+        return [(row.user_id, row.value) for row in query.limit(limit).all()]
+
+    def get_user_rank(
+        self,
+        db: Session,
+        course_id: str,
+        metric_name: MetricName,
+        period_start: datetime,
+        period_end: datetime,
+        user_id: str,
+        module_id: Optional[str] = None,
+    ) -> Optional[Tuple[float, int, int]]:
+        """Возвращает (value, rank, total); rank — 1 + число строго лучших значений (count по диапазону индекса)."""
+        scope = (course_id, metric_name, period_start, period_end, module_id)
+        value = self._leaderboard_scope(db.query(MetricResult.value), *scope).filter(
+            MetricResult.user_id == user_id
+        ).scalar()
+        if value is None:
+            return None
+        better = self._leaderboard_scope(db.query(func.count()), *scope).filter(MetricResult.value > value).scalar()
+        total = self._leaderboard_scope(db.query(func.count()), *scope).scalar()
+        return value, better + 1, total
+
+    def iter_results(
+        self,
+        db: Session,
+        course_id: str | None = None,
+        period_from: datetime | None = None,
+        period_to: datetime | None = None,
+        metrics: Sequence[MetricName] | None = None,
+        chunk_size: int = 5000,
+    ) -> Iterator[Sequence[tuple]]:
+        """Потоково отдаёт строки результатов пачками по ``chunk_size`` (server-side cursor в PostgreSQL)."""
+        stmt = select(
+            MetricResult.metric_name,
+            MetricResult.user_id,
+            MetricResult.course_id,
+            MetricResult.module_id,
+            MetricResult.value,
+            MetricResult.period_start,
+            MetricResult.period_end,
+            MetricResult.calculated_at,
+        )
+        if course_id is not None:
+            stmt = stmt.where(MetricResult.course_id == course_id)
+        if period_from is not None:
+            stmt = stmt.where(MetricResult.period_start >= period_from)
+        if period_to is not None:
+            stmt = stmt.where(MetricResult.period_end <= period_to)
+        if metrics:
+            stmt = stmt.where(MetricResult.metric_name.in_(metrics))
+        result = db.execute(stmt.execution_options(yield_per=chunk_size))
+        for partition in result.partitions():
+            yield partition
+
     def get_course_aggregates(
         self,
         db: Session,
@@ -74,19 +365,117 @@ class MetricRepository:
         period_start: datetime,
         period_end: datetime,
         metrics: Sequence[MetricName] | None = None,
-    ) -> List[Tuple[MetricName, float]]:
+    ) -> List[CourseAggregate]:
+        """Читает агрегаты из сводной таблицы за O(#метрик).
+
+        Для каждой метрики без сводки (данные, записанные в обход репозитория) считаем среднее
+        по строкам того же scope — курс целиком, ``module_id IS NULL``.
+        """
+        query = db.query(CourseMetricSummary).filter(
+            CourseMetricSummary.course_id == course_id,
+            CourseMetricSummary.module_id.is_(None),
+            CourseMetricSummary.period_start == period_start,
+            CourseMetricSummary.period_end == period_end,
+            CourseMetricSummary.count > 0,
+        )
+        if metrics:
+            query = query.filter(CourseMetricSummary.metric_name.in_(metrics))
+        aggregates = [self._summary_to_aggregate(summary) for summary in query.all()]
+
+        found = {aggregate.metric_name for aggregate in aggregates}
+        missing = [m for m in (metrics or list(MetricName)) if m not in found]
+        if missing:
+            aggregates.extend(
+                self._aggregate_results(db, course_id, period_start, period_end, missing)
+            )
+        return aggregates
+
+    def get_scope_validator(
+        self,
+        db: Session,
+        course_id: str,
+        period_start: datetime,
+        period_end: datetime,
+        metrics: Sequence[MetricName] | None = None,
+        user_id: str | None = None,
+    ) -> Tuple[int, Optional[datetime]]:
+        """Возвращает (число записей, момент последнего изменения) scope, не читая строки результатов.
+
+        Сводки обновляются в той же транзакции, что и результаты, поэтому их ``updated_at``
+        меняется при любой записи в scope. Для метрик без сводки берём count/max(calculated_at) по индексу.
+        """
+        summary_query = db.query(CourseMetricSummary.metric_name, CourseMetricSummary.updated_at).filter(
+            CourseMetricSummary.course_id == course_id,
+            CourseMetricSummary.module_id.is_(None),
+            CourseMetricSummary.period_start == period_start,
+            CourseMetricSummary.period_end == period_end,
+        )
+        if metrics:
+            summary_query = summary_query.filter(CourseMetricSummary.metric_name.in_(metrics))
+        summaries = summary_query.all()
+        covered = {metric_name for metric_name, _ in summaries}
+        missing = [m for m in (metrics or list(MetricName)) if m not in covered]
+        count = len(summaries)
+        last_modified = max((updated_at for _, updated_at in summaries), default=None)
+        if not missing:
+            return count, last_modified
+
+        # Метрики без сводки учитываем по строкам — так же, как их считает get_course_aggregates.
+        rows_query = db.query(func.count(MetricResult.id), func.max(MetricResult.calculated_at)).filter(
+            MetricResult.course_id == course_id,
+            MetricResult.metric_name.in_(missing),
+            MetricResult.period_start == period_start,
+            MetricResult.period_end == period_end,
+        )
+        if user_id is not None:
+            rows_query = rows_query.filter(MetricResult.user_id == user_id)
+        rows_count, rows_modified = rows_query.one()
+        if rows_modified is not None and (last_modified is None or rows_modified > last_modified):
+            last_modified = rows_modified
+        return count + rows_count, last_modified
+
+    @staticmethod
+    def _summary_to_aggregate(summary: CourseMetricSummary) -> CourseAggregate:
+        sketch = QuantileSketch.from_json(summary.sketch)
+        return CourseAggregate(
+            metric_name=summary.metric_name,
+            average_value=summary.value_sum / summary.count,
+            count=summary.count,
+            stddev=_stddev(summary.count, summary.value_sum, summary.value_sum_sq),
+            p50=sketch.quantile(0.5),
+            p90=sketch.quantile(0.9),
+        )
+
+    def _aggregate_results(
+        self,
+        db: Session,
+        course_id: str,
+        period_start: datetime,
+        period_end: datetime,
+        metrics: Sequence[MetricName],
+    ) -> List[CourseAggregate]:
         query = (
             db.query(
                 MetricResult.metric_name,
-                func.avg(MetricResult.value).label("average_value"),
+                func.count(MetricResult.value).label("count"),
+                func.sum(MetricResult.value).label("value_sum"),
+                func.sum(MetricResult.value * MetricResult.value).label("value_sum_sq"),
             )
             .filter(
                 MetricResult.course_id == course_id,
+                MetricResult.module_id.is_(None),
+                MetricResult.metric_name.in_(metrics),
                 MetricResult.period_start == period_start,
                 MetricResult.period_end == period_end,
             )
             .group_by(MetricResult.metric_name)
         )
-        if metrics:
-            query = query.filter(MetricResult.metric_name.in_(metrics))
-        return [(row.metric_name, float(row.average_value)) for row in query.all()]
+        return [
+            CourseAggregate(
+                metric_name=row.metric_name,
+                average_value=float(row.value_sum) / row.count,
+                count=row.count,
+                stddev=_stddev(row.count, float(row.value_sum), float(row.value_sum_sq)),
+            )
+            for row in query.all()
+        ]
@@ -1,12 +1,56 @@
+import logging
+import threading
+import time
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
+from sqlalchemy import and_, delete, or_, select, update
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
+from app.core.telemetry import REFRESH_PURGE_SECONDS, REFRESH_TOKENS_PURGED
 from app.models.refresh_token import RefreshToken
 
+logger = logging.getLogger(__name__)
+
+
+class PurgeStats:
+    """Счётчики фоновой очистки refresh-токенов; каждый запуск попадает и в /metrics."""
+
+    def __init__(self):
+        self.runs = 0
+        self.rows_purged = 0
+        self.last_run_rows = 0
+        self.last_run_seconds = 0.0
+        self.last_run_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def record(self, rows: int, seconds: float) -> None:
+        with self._lock:
+            self.runs += 1
+            self.rows_purged += rows
+            self.last_run_rows = rows
+            self.last_run_seconds = seconds
+            self.last_run_at = datetime.utcnow()
+        REFRESH_TOKENS_PURGED.inc(rows)
+        REFRESH_PURGE_SECONDS.observe(seconds)
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "rows_purged": self.rows_purged,
+                "last_run_rows": self.last_run_rows,
+                "last_run_seconds": self.last_run_seconds,
+                "last_run_at": self.last_run_at,
+            }
+
 
 class RefreshTokenRepository:
+    def __init__(self):
+        self.purge_stats = PurgeStats()
+        self.reuse_detected = 0
+
     def create(self, db: Session, jti: str, user_id: str, expires_at: datetime) -> RefreshToken:
         token = RefreshToken(jti=jti, user_id=user_id, expires_at=expires_at)
         db.add(token)
@@ -18,6 +62,7 @@ class RefreshTokenRepository:
         token = db.query(RefreshToken).filter(RefreshToken.jti == jti).first()
         if token:
             token.revoked = True
+            token.revoked_at = datetime.utcnow()
             db.add(token)
             db.commit()
 
@@ -31,10 +76,102 @@ class RefreshTokenRepository:
             .first()
         )
 
-    def purge_expired(self, db: Session) -> int:
-        """Удаляем истёкшие refresh-токены; возвращаем число удалённых записей."""
-        deleted = (
-            db.query(RefreshToken).filter(RefreshToken.expires_at < datetime.utcnow()).delete(synchronize_session=False)
-        )
+    def rotate(self, db: Session, jti: str, user_id: str, new_jti: str, expires_at: datetime) -> bool:
+        """Атомарно отзываем действующий токен и выпускаем новый одной транзакцией.
+
+        Отзыв — условный ``UPDATE ... RETURNING``: из двух конкурентных refresh с одним токеном
+        его выигрывает ровно один. False — токен уже использован, отозван или истёк.
+        """
+        rotated = db.execute(
+            update(RefreshToken)
+            .where(
+                RefreshToken.jti == jti,
+                RefreshToken.user_id == user_id,
+                RefreshToken.revoked.is_(False),
+                RefreshToken.expires_at > datetime.utcnow(),
+            )
+            .values(revoked=True, revoked_at=datetime.utcnow())
+            .returning(RefreshToken.jti)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if rotated is None:
+            db.rollback()
+            self._check_reuse(db, jti, user_id)
+            return False
+        db.add(RefreshToken(jti=new_jti, user_id=user_id, expires_at=expires_at))
         db.commit()
-        return deleted
+        return True
+
+    def _check_reuse(self, db: Session, jti: str, user_id: str) -> None:
+        # Только на пути отказа: повторное предъявление уже отозванного токена — признак утечки.
+        revoked = db.execute(
+            select(RefreshToken.revoked).where(RefreshToken.jti == jti, RefreshToken.user_id == user_id)
+        ).scalar()
+        if revoked:
+            self.reuse_detected += 1
+            logger.warning("Refresh token reuse detected: jti=%s user=%s", jti, user_id)
+
+    def revoked_since(
+        self,
+        db: Session,
+        since: Optional[datetime],
+        limit: int = 5000,
+        after: Optional[Tuple[datetime, str]] = None,
+    ) -> List[Tuple[str, datetime, datetime]]:
+        """Дельта отозванных и ещё не истёкших токенов: (jti, expires_at, revoked_at) по возрастанию (revoked_at, jti).
+
+        after — keyset-курсор (revoked_at, jti) последней строки предыдущей страницы.
+        """
+        query = select(RefreshToken.jti, RefreshToken.expires_at, RefreshToken.revoked_at).where(
+            RefreshToken.revoked_at.is_not(None),
+            RefreshToken.expires_at > datetime.utcnow(),
+        )
+        if since is not None:
+            query = query.where(RefreshToken.revoked_at > since)
+        if after is not None:
+            revoked_at, jti = after
+            query = query.where(
+                or_(
+                    RefreshToken.revoked_at > revoked_at,
+                    and_(RefreshToken.revoked_at == revoked_at, RefreshToken.jti > jti),
+                )
+            )
+        query = query.order_by(RefreshToken.revoked_at, RefreshToken.jti).limit(limit)
+        return [tuple(row) for row in db.execute(query)]
+
+    def purge_expired(
+        self,
+        db: Session,
+        batch_size: int = settings.refresh_purge_batch_size,
+        pause_seconds: float = settings.refresh_purge_pause_seconds,
+    ) -> int:
+        """Удаляем истёкшие refresh-токены пачками по индексу expires_at; возвращаем число удалённых записей.
+
+        Каждая пачка — отдельная короткая транзакция, между пачками пауза, чтобы не держать блокировки
+        и не забивать WAL одним большим DELETE.
+        """
+        started = time.monotonic()
+        cutoff = datetime.utcnow()
+        total = 0
+        while True:
+            jtis = db.execute(
+                select(RefreshToken.jti)
+                .where(RefreshToken.expires_at < cutoff)
+                .order_by(RefreshToken.expires_at)
+                .limit(batch_size)
+            ).scalars().all()
+            if not jtis:
+                break
+            total += db.execute(
+                delete(RefreshToken).where(RefreshToken.jti.in_(jtis)).execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+            if len(jtis) < batch_size:
+                break
+            if pause_seconds > 0:
+                time.sleep(pause_seconds)
+        elapsed = time.monotonic() - started
+        self.purge_stats.record(total, elapsed)
+        if total:
+            logger.info("Purged %s expired refresh tokens in %.2fs", total, elapsed)
+        return total
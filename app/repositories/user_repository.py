@@ -18,3 +18,8 @@ class UserRepository:
         db.commit()
         db.refresh(user)
         return user
+
+    def set_password_hash(self, db: Session, user: User, hashed_password: str) -> None:
+        user.hashed_password = hashed_password
+        db.add(user)
+        db.commit()
@@ -1,64 +1,409 @@
-from datetime import datetime
-from typing import Optional
+import logging
+from datetime import datetime, timedelta
+from typing import Literal, Optional
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
+from app.core.cache import scope_key
+from app.core.clickhouse import query_log
+from app.core.config import settings
+from app.core.database import get_db, get_read_db, get_read_session_factory
+from app.core.http_cache import is_not_modified, make_etag, not_modified_response, set_validators
+from app.core.pubsub import metric_updates
 from app.core.security import require_roles
+from app.core.serialization import FastJSONResponse, rows_to_dicts
+from app.core.tasks import supervisor
 from app.models.metric import MetricName
-from app.schemas.metrics import MetricAggregateOut, MetricResultOut
-from app.services.analytics import AnalyticsService
+from app.schemas.base import UUIDStr
+from app.schemas.metrics import (
+    BackgroundTasksOut,
+    CacheStatsOut,
+    ClickHouseScopeStatsOut,
+    CohortMetricsOut,
+    CohortMetricsRequest,
+    LeaderboardEntryOut,
+    LeaderboardPageOut,
+    MetricAggregateOut,
+    MetricResultOut,
+    MetricSeriesOut,
+    UserRankOut,
+)
+from app.routers import metrics as metrics_router
+from app.services.analytics import USER_METRIC_FIELDS, AnalyticsService, data_age_seconds
+from app.services.export import EXPORT_MEDIA_TYPES, MetricExportService, parquet_available
+from app.services.updates import stream_updates
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1", tags=["analytics"])
 analytics_service = AnalyticsService()
+export_service = MetricExportService()
 authorize_teacher_admin = require_roles({"teacher", "admin"})
+authorize_admin = require_roles({"admin"})
+
+
+def freshness_headers(
+    write_db: Session,
+    course_id: UUIDStr,
+    period_start: datetime,
+    period_end: datetime,
+    metrics: Optional[list[MetricName]],
+    count: int,
+    last_modified: Optional[datetime],
+    max_age: Optional[int],
+) -> dict:
+    """Stale-while-revalidate: заголовки возраста данных и фоновый пересчёт scope, если он устарел.
+
+    Бюджет — ``max_age`` из запроса либо ANALYTICS_FRESHNESS_SECONDS (0 в настройках отключает политику).
+    Пересчёт ставится в общую очередь заданий, поэтому одновременные запросы не порождают дублей.
+    """
+    budget = settings.analytics_freshness_seconds if max_age is None else max_age
+    age = data_age_seconds(last_modified)
+    if age is None or (max_age is None and budget <= 0):
+        return {}
+    stale = age > budget
+    headers = {"X-Data-Age": str(int(age)), "X-Data-Stale": "true" if stale else "false"}
+    if stale and count:
+        try:
+            job, _ = metrics_router.job_queue.submit(
+                db=write_db,
+                course_id=course_id,
+                period_start=period_start,
+                period_end=period_end,
+                metrics=metrics,
+            )
+            headers["X-Revalidation-Job"] = job.id
+        except Exception as exc:  # pragma: no cover - логирующий guard
+            logger.warning("Failed to enqueue revalidation for course %s: %s", course_id, exc)
+    return headers
 
 
 @router.get("/metrics/user/{user_id}", response_model=list[MetricResultOut])
 def get_user_metrics(
-    user_id: str,
-    course_id: str,
+    user_id: UUIDStr,
+    course_id: UUIDStr,
     period_start: datetime,
     period_end: datetime,
+    request: Request,
     metrics: Optional[list[MetricName]] = Query(default=None),
-    db: Session = Depends(get_db),
+    max_age: Optional[int] = Query(default=None, ge=0),
+    db: Session = Depends(get_read_db),
+    write_db: Session = Depends(get_db),
     _=Depends(authorize_teacher_admin),
-) -> list[MetricResultOut]:
-    results = analytics_service.get_user_metrics(
+) -> Response:
+    count, last_modified = analytics_service.get_scope_validator(
+        db=db,
+        course_id=course_id,
+        period_start=period_start,
+        period_end=period_end,
+        metrics=metrics,
+        user_id=user_id,
+    )
+    freshness = freshness_headers(
+        write_db, course_id, period_start, period_end, metrics, count, last_modified, max_age
+    )
+    etag = make_etag("user", user_id, course_id, period_start, period_end, sorted(metrics or []), count, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        response = not_modified_response(etag, last_modified)
+        response.headers.update(freshness)
+        return response
+
+    rows = analytics_service.get_user_metrics(
         db=db,
         user_id=user_id,
         course_id=course_id,
         period_start=period_start,
         period_end=period_end,
         metrics=metrics,
+        primary_db=write_db,
+    )
+    response = FastJSONResponse(rows_to_dicts(USER_METRIC_FIELDS, rows), headers=freshness)
+    set_validators(response, etag, last_modified)
+    return response
+
+
+@router.get("/metrics/user/{user_id}/series", response_model=MetricSeriesOut)
+def get_user_metric_series(
+    user_id: UUIDStr,
+    course_id: UUIDStr,
+    metric: MetricName,
+    period_from: Optional[datetime] = None,
+    period_to: Optional[datetime] = None,
+    window: Optional[timedelta] = None,
+    max_points: Optional[int] = Query(default=None, ge=1, le=10000),
+    db: Session = Depends(get_read_db),
+    _=Depends(authorize_teacher_admin),
+) -> Response:
+    timestamps, values = analytics_service.get_user_series(
+        db=db,
+        user_id=user_id,
+        course_id=course_id,
+        metric_name=metric,
+        period_from=period_from,
+        period_to=period_to,
+        window=window,
+        max_points=max_points,
+    )
+    return FastJSONResponse(
+        {
+            "user_id": user_id,
+            "course_id": course_id,
+            "metric_name": metric,
+            "timestamps": timestamps,
+            "values": values,
+        }
+    )
+
+
+@router.post("/metrics/cohort", response_model=CohortMetricsOut)
+def get_cohort_metrics(
+    payload: CohortMetricsRequest,
+    db: Session = Depends(get_read_db),
+    _=Depends(authorize_teacher_admin),
+) -> Response:
+    metrics, user_ids, values = analytics_service.get_cohort_matrix(
+        db=db,
+        course_id=payload.course_id,
+        period_start=payload.period_start,
+        period_end=payload.period_end,
+        user_ids=payload.user_ids,
+        metrics=payload.metrics,
+    )
+    return FastJSONResponse(
+        {
+            "course_id": payload.course_id,
+            "period_start": payload.period_start,
+            "period_end": payload.period_end,
+            "metrics": metrics,
+            "user_ids": user_ids,
+            "values": values,
+        }
     )
-    return results
 
 
 @router.get("/analytics/course/{course_id}", response_model=list[MetricAggregateOut])
 def get_course_analytics(
-    course_id: str,
+    course_id: UUIDStr,
     period_start: datetime,
     period_end: datetime,
+    request: Request,
     metrics: Optional[list[MetricName]] = Query(default=None),
-    db: Session = Depends(get_db),
+    max_age: Optional[int] = Query(default=None, ge=0),
+    db: Session = Depends(get_read_db),
+    write_db: Session = Depends(get_db),
     _=Depends(authorize_teacher_admin),
-) -> list[MetricAggregateOut]:
+) -> Response:
+    count, last_modified = analytics_service.get_scope_validator(
+        db=db,
+        course_id=course_id,
+        period_start=period_start,
+        period_end=period_end,
+        metrics=metrics,
+    )
+    freshness = freshness_headers(
+        write_db, course_id, period_start, period_end, metrics, count, last_modified, max_age
+    )
+    etag = make_etag("course", course_id, period_start, period_end, sorted(metrics or []), count, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        response = not_modified_response(etag, last_modified)
+        response.headers.update(freshness)
+        return response
+
     aggregates = analytics_service.get_course_aggregates(
         db=db,
         course_id=course_id,
         period_start=period_start,
         period_end=period_end,
         metrics=metrics,
+        primary_db=write_db,
     )
-    return [
-        MetricAggregateOut(
-            metric_name=metric_name,
+    response = FastJSONResponse(
+        [
+            {
+                "metric_name": aggregate.metric_name,
+                "course_id": course_id,
+                "period_start": period_start,
+                "period_end": period_end,
+                "average_value": aggregate.average_value,
+                "count": aggregate.count,
+                "stddev": aggregate.stddev,
+                "p50": aggregate.p50,
+                "p90": aggregate.p90,
+            }
+            for aggregate in aggregates
+        ],
+        headers=freshness,
+    )
+    set_validators(response, etag, last_modified)
+    return response
+
+
+@router.get("/analytics/course/{course_id}/leaderboard", response_model=LeaderboardPageOut)
+def get_course_leaderboard(
+    course_id: UUIDStr,
+    metric: MetricName,
+    period_start: datetime,
+    period_end: datetime,
+    module_id: Optional[UUIDStr] = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    order: Literal["desc", "asc"] = "desc",
+    db: Session = Depends(get_read_db),
+    _=Depends(authorize_teacher_admin),
+) -> LeaderboardPageOut:
+    try:
+        rows, next_cursor = analytics_service.get_leaderboard(
+            db=db,
             course_id=course_id,
+            metric_name=metric,
             period_start=period_start,
             period_end=period_end,
-            average_value=value,
+            module_id=module_id,
+            limit=limit,
+            cursor=cursor,
+            descending=order == "desc",
         )
-        for metric_name, value in aggregates
-    ]
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    return LeaderboardPageOut(
+        metric_name=metric,
+        course_id=course_id,
+        module_id=module_id,
+        period_start=period_start,
+        period_end=period_end,
+        items=[LeaderboardEntryOut(user_id=user_id, value=value) for user_id, value in rows],
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/analytics/course/{course_id}/leaderboard/users/{user_id}", response_model=UserRankOut)
+def get_user_rank(
+    course_id: UUIDStr,
+    user_id: UUIDStr,
+    metric: MetricName,
+    period_start: datetime,
+    period_end: datetime,
+    module_id: Optional[UUIDStr] = None,
+    db: Session = Depends(get_read_db),
+    _=Depends(authorize_teacher_admin),
+) -> UserRankOut:
+    ranked = analytics_service.get_user_rank(
+        db=db,
+        course_id=course_id,
+        metric_name=metric,
+        period_start=period_start,
+        period_end=period_end,
+        user_id=user_id,
+        module_id=module_id,
+    )
+    if ranked is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metric result not found")
+    value, rank, total, percentile = ranked
+    return UserRankOut(
+        metric_name=metric,
+        course_id=course_id,
+        user_id=user_id,
+        value=value,
+        rank=rank,
+        total=total,
+        percentile=percentile,
+    )
+
+
+@router.get("/metrics/export")
+def export_metric_results(
+    format: Literal["csv", "ndjson", "parquet"] = "csv",
+    course_id: Optional[UUIDStr] = None,
+    period_from: Optional[datetime] = None,
+    period_to: Optional[datetime] = None,
+    metrics: Optional[list[MetricName]] = Query(default=None),
+    session_factory=Depends(get_read_session_factory),
+    _=Depends(authorize_admin),
+) -> StreamingResponse:
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Parquet export requires pyarrow",
+        )
+
+    def body():
+        db = session_factory()
+        try:
+            yield from export_service.stream(
+                db,
+                format,
+                course_id=course_id,
+                period_from=period_from,
+                period_to=period_to,
+                metrics=metrics,
+                chunk_size=settings.export_chunk_size,
+            )
+        finally:
+            db.close()
+
+    filename = f"metric_results_{course_id or 'all'}.{format}"
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/analytics/stream")
+async def stream_metric_updates(
+    request: Request,
+    period_start: datetime,
+    period_end: datetime,
+    course_id: list[UUIDStr] = Query(..., max_items=50),
+    include_aggregates: bool = False,
+    _=Depends(authorize_teacher_admin),
+) -> StreamingResponse:
+    """Server-sent events о новых результатах по курсам за период вместо опроса аналитики."""
+    topics = [scope_key(course, period_start, period_end) for course in course_id]
+    session_factory = get_read_session_factory()
+
+    def load(message: dict) -> list[dict]:
+        with session_factory() as db:
+            aggregates = analytics_service.get_course_aggregates(
+                db=db,
+                course_id=message["course_id"],
+                period_start=period_start,
+                period_end=period_end,
+            )
+        return [aggregate._asdict() for aggregate in aggregates]
+
+    async def load_aggregates(message: dict) -> list[dict]:
+        return await run_in_threadpool(load, message)
+
+    return StreamingResponse(
+        stream_updates(
+            lambda: metric_updates.subscribe(topics),
+            is_disconnected=request.is_disconnected,
+            keepalive_seconds=settings.sse_keepalive_seconds,
+            load_aggregates=load_aggregates if include_aggregates else None,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/analytics/cache/stats", response_model=CacheStatsOut)
+def get_cache_stats(_=Depends(authorize_admin)) -> CacheStatsOut:
+    return CacheStatsOut(**analytics_service.cache.stats())
+
+
+@router.get("/analytics/tasks/stats", response_model=BackgroundTasksOut)
+def get_background_task_stats(_=Depends(authorize_admin)) -> BackgroundTasksOut:
+    return BackgroundTasksOut(**supervisor.stats())
+
+
+@router.get("/analytics/clickhouse/stats", response_model=list[ClickHouseScopeStatsOut])
+def get_clickhouse_query_stats(
+    limit: int = Query(20, ge=1, le=500),
+    order_by: Literal["bytes_read", "rows_read", "elapsed_seconds", "queries"] = Query("bytes_read"),
+    _=Depends(authorize_admin),
+) -> list[ClickHouseScopeStatsOut]:
+    """Самые тяжёлые для ClickHouse пары (метрика, курс) с момента старта процесса."""
+    return [ClickHouseScopeStatsOut(**row) for row in query_log.top(limit, order_by)]
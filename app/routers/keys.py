@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Request, Response, status
+
+from app.core.config import settings
+from app.core.http_cache import is_not_modified, make_etag
+from app.core.keys import key_ring
+from app.core.serialization import FastJSONResponse
+
+router = APIRouter(tags=["auth"])
+
+
+@router.get("/.well-known/jwks.json")
+def get_jwks(request: Request) -> Response:
+    """Публичные ключи проверки JWT; сервисы-соседи кэшируют их и проверяют токены без запроса к API."""
+    etag = make_etag("jwks", *key_ring.kids)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.jwks_max_age_seconds}"}
+    if is_not_modified(request, etag, None):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FastJSONResponse(key_ring.jwks(), headers=headers)
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
-from app.schemas.metrics import MetricsCalculationRequest, MetricsCalculationResponse
+from app.core.database import SessionLocal, get_db
+from app.models.job import JobStatus
+from app.repositories.job_repository import JobRepository
+from app.schemas.base import UUIDStr
+from app.schemas.metrics import CalculationJobOut, MetricsCalculationRequest, MetricsCalculationResponse
+from app.services.jobs import CalculationJobQueue
 from app.services.metrics import MetricsEngine
 
 router = APIRouter(prefix="/api/v1/metrics", tags=["metrics"])
 engine = MetricsEngine()
+job_repo = JobRepository()
+job_queue = CalculationJobQueue(engine_provider=lambda: engine, session_factory=SessionLocal, repo=job_repo)
 
 
 @router.post("/calculate", response_model=MetricsCalculationResponse, status_code=202)
@@ -14,11 +20,37 @@ async def calculate_metrics(
     payload: MetricsCalculationRequest,
     db: Session = Depends(get_db),
 ) -> MetricsCalculationResponse:
-    calculated = await engine.calculate_for_course(
+    job, created = job_queue.submit(
         db=db,
         course_id=payload.course_id,
         period_start=payload.period_start,
         period_end=payload.period_end,
         metrics=payload.metrics,
+        priority=payload.priority,
+    )
+    return MetricsCalculationResponse(
+        calculated=job.metric_names,
+        job_id=job.id,
+        status=JobStatus(job.status),
+        deduplicated=not created,
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=CalculationJobOut)
+def get_calculation_job(job_id: UUIDStr, db: Session = Depends(get_db)) -> CalculationJobOut:
+    job = job_repo.get(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return CalculationJobOut(
+        id=job.id,
+        status=JobStatus(job.status),
+        course_id=job.course_id,
+        period_start=job.period_start,
+        period_end=job.period_end,
+        metrics=job.metric_names,
+        progress=job.progress,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
     )
-    return MetricsCalculationResponse(calculated=calculated)
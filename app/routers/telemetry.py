@@ -0,0 +1,42 @@
+from typing import Any, Dict, Iterable, Tuple
+
+import anyio.to_thread
+from fastapi import APIRouter, Response
+
+from app.core.database import engine, read_router
+from app.core.hashing import password_hasher
+from app.core.telemetry import registry
+
+router = APIRouter(tags=["telemetry"])
+
+
+def _threadpool_usage() -> Iterable[Tuple[Dict[str, Any], float]]:
+    # Лимитер anyio — тот самый threadpool, в котором Starlette выполняет sync-роуты.
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    yield {"state": "busy"}, limiter.borrowed_tokens
+    yield {"state": "capacity"}, limiter.total_tokens
+
+
+def _connection_pool_usage() -> Iterable[Tuple[Dict[str, Any], float]]:
+    for name, pool_engine in [("primary", engine), *read_router.engines()]:
+        pool = pool_engine.pool
+        for state in ("checkedout", "size", "overflow"):
+            reader = getattr(pool, state, None)
+            if reader is not None:
+                yield {"pool": name, "state": state}, reader()
+
+
+def _password_hasher_usage() -> Iterable[Tuple[Dict[str, Any], float]]:
+    yield {"state": "in_flight"}, password_hasher.in_flight
+    yield {"state": "capacity"}, password_hasher.capacity
+
+
+registry.gauge("threadpool_threads", "Starlette threadpool tokens in use and capacity", ("state",), _threadpool_usage)
+registry.gauge("db_pool_connections", "SQLAlchemy pool usage per engine", ("pool", "state"), _connection_pool_usage)
+registry.gauge("password_hash_slots", "bcrypt pool operations in flight and capacity", ("state",), _password_hasher_usage)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """Метрики процесса в формате Prometheus; снимаются в event loop, без обращений к БД."""
+    return Response(registry.render(), media_type=registry.content_type)
@@ -1 +1,31 @@
-"""Общие Pydantic-схемы и настройки появятся здесь."""
+"""Общие Pydantic-типы схем."""
+
+import re
+import uuid
+
+# Идентификаторы пользователей, курсов, модулей и заданий — UUID (в PostgreSQL колонки нативного типа uuid):
+# произвольная строка отклоняется на входе с 422, а не ошибкой БД.
+UUID_PATTERN = r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$"
+_UUID_RE = re.compile(UUID_PATTERN)
+
+
+class UUIDStr(str):
+    """UUID-строка, приведённая к канонической форме (нижний регистр).
+
+    GUID хранит и отдаёт UUID в нижнем регистре; без нормализации на входе ключи ответов, кэша и
+    подписок, построенные из «сырых» id запроса, не совпали бы с прочитанными из БД.
+    """
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def __modify_schema__(cls, field_schema: dict) -> None:
+        field_schema.update(type="string", format="uuid", pattern=UUID_PATTERN)
+
+    @classmethod
+    def validate(cls, value) -> str:
+        if not isinstance(value, str) or not _UUID_RE.match(value):
+            raise ValueError("value is not a valid UUID")
+        return str(uuid.UUID(value))
@@ -1,9 +1,11 @@
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, conlist
 
+from app.models.job import JobPriority, JobStatus
 from app.models.metric import MetricName
+from app.schemas.base import UUIDStr
 
 
 class MetricResultOut(BaseModel):
@@ -21,14 +23,32 @@ class MetricResultOut(BaseModel):
 
 
 class MetricsCalculationRequest(BaseModel):
-    course_id: str
+    course_id: UUIDStr
     period_start: datetime
     period_end: datetime
     metrics: Optional[list[MetricName]] = None
+    priority: JobPriority = JobPriority.INTERACTIVE
 
 
 class MetricsCalculationResponse(BaseModel):
     calculated: list[MetricName]
+    job_id: str
+    status: JobStatus
+    deduplicated: bool = False
+
+
+class CalculationJobOut(BaseModel):
+    id: str
+    status: JobStatus
+    course_id: str
+    period_start: datetime
+    period_end: datetime
+    metrics: list[MetricName]
+    progress: float
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
 
 
 class MetricAggregateOut(BaseModel):
@@ -37,3 +57,100 @@ class MetricAggregateOut(BaseModel):
     period_start: datetime
     period_end: datetime
     average_value: float
+    count: Optional[int] = None
+    stddev: Optional[float] = None
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+
+
+class MetricSeriesOut(BaseModel):
+    """Колоночный ряд: values[i] — значение за период, начинающийся в timestamps[i]."""
+
+    user_id: str
+    course_id: str
+    metric_name: MetricName
+    timestamps: list[datetime]
+    values: list[float]
+
+
+class CohortMetricsRequest(BaseModel):
+    course_id: UUIDStr
+    period_start: datetime
+    period_end: datetime
+    user_ids: Optional[conlist(UUIDStr, min_items=1, max_items=5000)] = None  # type: ignore[valid-type]
+    metrics: Optional[list[MetricName]] = None
+
+
+class CohortMetricsOut(BaseModel):
+    """Матрица пользователь × метрика: values[i][j] — метрика metrics[j] пользователя user_ids[i]."""
+
+    course_id: str
+    period_start: datetime
+    period_end: datetime
+    metrics: list[MetricName]
+    user_ids: list[str]
+    values: list[list[Optional[float]]]
+
+
+class CacheStatsOut(BaseModel):
+    backend: str
+    entries: Optional[int] = None
+    bytes: Optional[int] = None
+    counters: Optional[int] = None
+    hits: int
+    misses: int
+    hit_ratio: float
+
+
+class PeriodicTaskStatsOut(BaseModel):
+    name: str
+    interval_seconds: float
+    leader_only: bool
+    runs: int
+    failures: int
+    skipped: int
+    last_started_at: Optional[datetime] = None
+    last_duration_seconds: float
+    max_duration_seconds: float
+    avg_duration_seconds: float
+    last_error: Optional[str] = None
+
+
+class BackgroundTasksOut(BaseModel):
+    running: bool
+    jobs: list[PeriodicTaskStatsOut]
+
+
+class ClickHouseScopeStatsOut(BaseModel):
+    metric: str
+    course_id: str
+    queries: int
+    rows_read: int
+    bytes_read: int
+    elapsed_seconds: float
+    max_elapsed_seconds: float
+
+
+class LeaderboardEntryOut(BaseModel):
+    user_id: str
+    value: float
+
+
+class LeaderboardPageOut(BaseModel):
+    metric_name: MetricName
+    course_id: str
+    module_id: Optional[str] = None
+    period_start: datetime
+    period_end: datetime
+    items: list[LeaderboardEntryOut]
+    next_cursor: Optional[str] = None
+
+
+class UserRankOut(BaseModel):
+    metric_name: MetricName
+    course_id: str
+    user_id: str
+    value: float
+    rank: int
+    total: int
+    percentile: float
@@ -1,17 +1,79 @@
-from datetime import datetime
-from typing import Iterable, List, Tuple
+import base64
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
 from sqlalchemy.orm import Session
 
-from app.models.metric import MetricName, MetricResult
-from app.repositories.metric_repository import MetricRepository
+from app.core.cache import AnalyticsCache, analytics_cache, naive_utc
+from app.models.metric import MetricName
+from app.repositories.metric_repository import CourseAggregate, MetricRepository
+from app.schemas.metrics import MetricResultOut
+
+USER_METRIC_FIELDS = tuple(MetricResultOut.__fields__)
+
+
+def encode_cursor(value: float, user_id: str) -> str:
+    raw = json.dumps([value, user_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """Разбирает курсор лидерборда; ValueError при некорректном значении."""
+    try:
+        value, user_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        # user_id уходит в bind GUID: не-UUID должен давать 400 здесь, а не StatementError в запросе.
+        return float(value), str(uuid.UUID(str(user_id)))
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def data_age_seconds(last_modified: Optional[datetime], now: Optional[datetime] = None) -> Optional[float]:
+    """Возраст данных scope по последнему пересчёту (naive UTC); None, если данных нет."""
+    if last_modified is None:
+        return None
+    return max(0.0, ((now or datetime.utcnow()) - last_modified).total_seconds())
+
+
+def downsample(
+    points: Sequence[Tuple[datetime, float]], max_points: int
+) -> List[Tuple[datetime, float]]:
+    """Сжимает ряд до ``max_points`` смежных корзин: начало корзины и среднее значение."""
+    if max_points <= 0 or len(points) <= max_points:
+        return list(points)
+    result: List[Tuple[datetime, float]] = []
+    for bucket in range(max_points):
+        lo = bucket * len(points) // max_points
+        hi = (bucket + 1) * len(points) // max_points
+        chunk = points[lo:hi]
+        result.append((chunk[0][0], sum(value for _, value in chunk) / len(chunk)))
+    return result
+
+
+def _metrics_param(metrics: Optional[List[MetricName]]) -> Optional[Tuple[str, ...]]:
+    return tuple(sorted(m.value for m in metrics)) if metrics else None
 
 
 class AnalyticsService:
-    """Возвращает агрегированные метрики без пересчёта."""
+    """Возвращает агрегированные метрики без пересчёта (через версионированный кэш).
 
-    def __init__(self, metric_repo: MetricRepository | None = None):
+    Результаты хранятся под периодами в naive UTC, поэтому aware-периоды запроса приводятся к ним.
+    Промах кэша читается из ``primary_db``, если она передана: сразу после ``bump`` реплика может
+    отставать, и значение до записи закрепилось бы под новой версией scope до истечения TTL.
+    """
+
+    def __init__(
+        self,
+        metric_repo: MetricRepository | None = None,
+        cache: AnalyticsCache | None = None,
+    ):
         self.metric_repo = metric_repo or MetricRepository()
+        self.cache = cache or analytics_cache
+
+    def _load_session(self, db: Session, primary_db: Session | None) -> Session:
+        # Без кэша значение не переживает запрос, и отставание реплики ограничено её бюджетом.
+        return primary_db if primary_db is not None and self.cache.enabled else db
 
     def get_user_metrics(
         self,
@@ -21,28 +83,173 @@ class AnalyticsService:
         period_start: datetime,
         period_end: datetime,
         metrics: Iterable[MetricName] | None = None,
-    ) -> List[MetricResult]:
-        return self.metric_repo.get_user_metrics(
+        primary_db: Session | None = None,
+    ) -> List[tuple]:
+        """Строки результатов кортежами в порядке ``USER_METRIC_FIELDS``."""
+        metrics = list(metrics) if metrics else None
+        load_db = self._load_session(db, primary_db)
+
+        def load() -> List[tuple]:
+            return self.metric_repo.get_user_metric_rows(
+                db=load_db,
+                user_id=user_id,
+                course_id=course_id,
+                period_start=naive_utc(period_start),
+                period_end=naive_utc(period_end),
+                metrics=metrics,
+            )
+
+        return self.cache.get_or_load(
+            "user", course_id, period_start, period_end, (user_id, _metrics_param(metrics)), load
+        )
+
+    def get_course_aggregates(
+        self,
+        db: Session,
+        course_id: str,
+        period_start: datetime,
+        period_end: datetime,
+        metrics: Iterable[MetricName] | None = None,
+        primary_db: Session | None = None,
+    ) -> List[CourseAggregate]:
+        metrics = list(metrics) if metrics else None
+        load_db = self._load_session(db, primary_db)
+
+        def load() -> List[CourseAggregate]:
+            return self.metric_repo.get_course_aggregates(
+                db=load_db,
+                course_id=course_id,
+                period_start=naive_utc(period_start),
+                period_end=naive_utc(period_end),
+                metrics=metrics,
+            )
+
+        return self.cache.get_or_load(
+            "course", course_id, period_start, period_end, _metrics_param(metrics), load
+        )
+
+    def get_user_series(
+        self,
+        db: Session,
+        user_id: str,
+        course_id: str,
+        metric_name: MetricName,
+        period_from: Optional[datetime] = None,
+        period_to: Optional[datetime] = None,
+        window: Optional[timedelta] = None,
+        max_points: Optional[int] = None,
+    ) -> Tuple[List[datetime], List[float]]:
+        points = self.metric_repo.get_user_series(
             db=db,
             user_id=user_id,
             course_id=course_id,
-            period_start=period_start,
-            period_end=period_end,
-            metrics=list(metrics) if metrics else None,
+            metric_name=metric_name,
+            period_from=naive_utc(period_from) if period_from is not None else None,
+            period_to=naive_utc(period_to) if period_to is not None else None,
+            window=window,
         )
+        if max_points:
+            points = downsample(points, max_points)
+        return [ts for ts, _ in points], [value for _, value in points]
 
-    def get_course_aggregates(
+    def get_scope_validator(
         self,
         db: Session,
         course_id: str,
         period_start: datetime,
         period_end: datetime,
         metrics: Iterable[MetricName] | None = None,
-    ) -> List[Tuple[MetricName, float]]:
-        return self.metric_repo.get_course_aggregates(
+        user_id: str | None = None,
+    ) -> Tuple[int, Optional[datetime]]:
+        return self.metric_repo.get_scope_validator(
             db=db,
             course_id=course_id,
-            period_start=period_start,
-            period_end=period_end,
+            period_start=naive_utc(period_start),
+            period_end=naive_utc(period_end),
             metrics=list(metrics) if metrics else None,
+            user_id=user_id,
+        )
+
+    def get_cohort_matrix(
+        self,
+        db: Session,
+        course_id: str,
+        period_start: datetime,
+        period_end: datetime,
+        user_ids: Sequence[str] | None = None,
+        metrics: Iterable[MetricName] | None = None,
+    ) -> Tuple[List[MetricName], List[str], List[List[Optional[float]]]]:
+        """Собирает результаты когорты в матрицу (metrics, user_ids, values)."""
+        requested_metrics = list(metrics) if metrics else None
+        rows = self.metric_repo.get_cohort_metrics(
+            db=db,
+            course_id=course_id,
+            period_start=naive_utc(period_start),
+            period_end=naive_utc(period_end),
+            user_ids=list(user_ids) if user_ids else None,
+            metrics=requested_metrics,
+        )
+        by_user: Dict[str, Dict[MetricName, float]] = {}
+        for user_id, metric_name, value in rows:
+            by_user.setdefault(user_id, {})[metric_name] = value
+
+        columns = requested_metrics or sorted({name for _, name, _ in rows}, key=lambda m: m.value)
+        users = list(dict.fromkeys(user_ids)) if user_ids else sorted(by_user)
+        values = [[by_user.get(user_id, {}).get(metric) for metric in columns] for user_id in users]
+        return columns, users, values
+
+    def get_leaderboard(
+        self,
+        db: Session,
+        course_id: str,
+        metric_name: MetricName,
+        period_start: datetime,
+        period_end: datetime,
+        module_id: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        descending: bool = True,
+    ) -> Tuple[List[Tuple[str, float]], Optional[str]]:
+        """Возвращает страницу рейтинга и курсор следующей страницы (None, если это последняя)."""
+        rows = self.metric_repo.get_leaderboard_page(
+            db=db,
+            course_id=course_id,
+            metric_name=metric_name,
+            period_start=naive_utc(period_start),
+            period_end=naive_utc(period_end),
+            module_id=module_id,
+            limit=limit + 1,
+            after=decode_cursor(cursor) if cursor else None,
+            descending=descending,
+        )
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last_user_id, last_value = page[-1]
+            next_cursor = encode_cursor(last_value, last_user_id)
+        return page, next_cursor
+
+    def get_user_rank(
+        self,
+        db: Session,
+        course_id: str,
+        metric_name: MetricName,
+        period_start: datetime,
+        period_end: datetime,
+        user_id: str,
+        module_id: Optional[str] = None,
+    ) -> Optional[Tuple[float, int, int, float]]:
+        """(value, rank, total, percentile); percentile — доля студентов со значением не выше, в %."""
+        ranked = self.metric_repo.get_user_rank(
+            db=db,
+            course_id=course_id,
+            metric_name=metric_name,
+            period_start=naive_utc(period_start),
+            period_end=naive_utc(period_end),
+            user_id=user_id,
+            module_id=module_id,
         )
+        if ranked is None:
+            return None
+        value, rank, total = ranked
+        return value, rank, total, 100.0 * (total - rank + 1) / total
@@ -1,4 +1,3 @@
-from datetime import datetime
 from typing import Tuple
 
 from fastapi import HTTPException, status
@@ -9,8 +8,10 @@ from app.core.security import (
     create_refresh_token,
     decode_token,
     hash_password,
-    verify_password,
+    verify_and_update_password,
 )
+from app.core.revocation import RevokedTokenIndex, revoked_tokens
+from app.core.telemetry import AUTH_SECONDS, timed
 from app.models.user import User, UserRole
 from app.repositories.refresh_token_repository import RefreshTokenRepository
 from app.repositories.user_repository import UserRepository
@@ -22,10 +23,13 @@ class AuthService:
         self,
         user_repo: UserRepository | None = None,
         refresh_repo: RefreshTokenRepository | None = None,
+        revoked: RevokedTokenIndex | None = None,
     ):
         self.user_repo = user_repo or UserRepository()
         self.refresh_repo = refresh_repo or RefreshTokenRepository()
+        self.revoked = revoked or revoked_tokens
 
+    @timed(AUTH_SECONDS, operation="register")
     def register_user(self, db: Session, user_in: UserCreate) -> Tuple[User, str, str]:
         existing = self.user_repo.get_by_email(db, user_in.email)
         if existing:
@@ -46,23 +50,31 @@ class AuthService:
         self.refresh_repo.create(db, jti=jti, user_id=user.id, expires_at=expires_at)
         return user, access, refresh
 
+    @timed(AUTH_SECONDS, operation="login")
     def authenticate(self, db: Session, credentials: UserLogin) -> Tuple[User, str, str]:
         user = self.user_repo.get_by_email(db, credentials.email)
-        if not user or not verify_password(credentials.password, user.hashed_password):
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid credentials",
+            )
+        verified, new_hash = verify_and_update_password(credentials.password, user.hashed_password)
+        if not verified:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid credentials",
             )
+        if new_hash:
+            # Стоимость bcrypt изменилась — перехешируем, пока пароль известен.
+            self.user_repo.set_password_hash(db, user, new_hash)
 
         access = create_access_token(user.id, user.role.value)
         refresh, jti, expires_at = create_refresh_token(user.id, user.role.value)
         self.refresh_repo.create(db, jti=jti, user_id=user.id, expires_at=expires_at)
         return user, access, refresh
 
+    @timed(AUTH_SECONDS, operation="refresh")
     def refresh_tokens(self, db: Session, refresh_token: str) -> Tuple[User, str, str]:
-        # Очищаем истёкшие токены перед попыткой refresh
-        self.refresh_repo.purge_expired(db)
-
         payload = decode_token(refresh_token)
         if not payload or payload.get("type") != "refresh":
             raise HTTPException(
@@ -84,8 +96,8 @@ class AuthService:
                 detail="Invalid refresh token",
             )
 
-        token_record = self.refresh_repo.get_active(db, jti)
-        if not token_record or token_record.expires_at < datetime.utcnow():
+        # Уже отозванные токены (повторы ротированных) отклоняем без обращения к БД.
+        if self.revoked.contains(jti):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid refresh token",
@@ -98,8 +110,14 @@ class AuthService:
                 detail="User not found",
             )
 
-        self.refresh_repo.revoke(db, jti=jti)
-        access = create_access_token(user.id, user.role.value)
         refresh, new_jti, expires_at = create_refresh_token(user.id, user.role.value)
-        self.refresh_repo.create(db, jti=new_jti, user_id=user.id, expires_at=expires_at)
+        rotated = self.refresh_repo.rotate(db, jti=jti, user_id=user.id, new_jti=new_jti, expires_at=expires_at)
+        # В обоих случаях старый токен больше не годится.
+        self.revoked.add(jti, float(payload["exp"]))
+        if not rotated:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid refresh token",
+            )
+        access = create_access_token(user.id, user.role.value)
         return user, access, refresh
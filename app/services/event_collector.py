@@ -1,19 +1,31 @@
 from fastapi import HTTPException, status
 
+from app.core.telemetry import INGEST_BATCH_EVENTS, INGEST_EVENTS, INGEST_REQUESTS
 from app.repositories.event_repository import EventRepository
 from app.schemas.events import EventIn
+from app.services.scheduler import CourseActivityTracker, activity_tracker
 
 
 class EventCollectorService:
-    def __init__(self, repository: EventRepository | None = None):
+    def __init__(
+        self,
+        repository: EventRepository | None = None,
+        activity: CourseActivityTracker | None = None,
+    ):
         self.repository = repository or EventRepository()
+        self.activity = activity or activity_tracker
 
     async def ingest_events(self, events: list[EventIn]) -> int:
+        INGEST_BATCH_EVENTS.observe(len(events))
         try:
             await self.repository.insert_batch(events)
         except Exception as exc:
+            INGEST_REQUESTS.inc(outcome="error")
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Failed to ingest events",
             ) from exc
+        INGEST_REQUESTS.inc(outcome="ok")
+        INGEST_EVENTS.inc(len(events))
+        self.activity.mark({str(event.course_id) for event in events})
         return len(events)
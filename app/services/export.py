@@ -0,0 +1,155 @@
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, Iterable, Iterator, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.core.cache import naive_utc
+from app.models.metric import MetricName
+from app.repositories.metric_repository import MetricRepository
+
+EXPORT_COLUMNS = (
+    "metric_name",
+    "user_id",
+    "course_id",
+    "module_id",
+    "value",
+    "period_start",
+    "period_end",
+    "calculated_at",
+)
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def encode_csv(chunks: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in chunks:
+        writer.writerows([_plain(v) for v in row] for row in chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def encode_ndjson(chunks: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+    for chunk in chunks:
+        lines = [
+            json.dumps(dict(zip(EXPORT_COLUMNS, (_plain(v) for v in row))), separators=(",", ":"))
+            for row in chunk
+        ]
+        if lines:
+            yield ("\n".join(lines) + "\n").encode()
+
+
+class _ParquetSink(io.RawIOBase):
+    """Приёмник для ParquetWriter: копит записанные байты до выдачи, сохраняя сквозную позицию."""
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._parts.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def encode_parquet(chunks: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+    """Каждая пачка строк пишется отдельной row group и сразу отдаётся клиенту."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [
+            ("metric_name", pa.string()),
+            ("user_id", pa.string()),
+            ("course_id", pa.string()),
+            ("module_id", pa.string()),
+            ("value", pa.float64()),
+            ("period_start", pa.timestamp("us")),
+            ("period_end", pa.timestamp("us")),
+            ("calculated_at", pa.timestamp("us")),
+        ]
+    )
+    sink = _ParquetSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in chunks:
+            columns = list(zip(*chunk)) if chunk else [[] for _ in EXPORT_COLUMNS]
+            metric_names = [m.value if isinstance(m, Enum) else m for m in columns[0]]
+            batch = pa.record_batch([pa.array(metric_names), *map(pa.array, columns[1:])], schema=schema)
+            writer.write_batch(batch)
+            data = sink.drain()
+            if data:
+                yield data
+    tail = sink.drain()
+    if tail:
+        yield tail
+
+
+ENCODERS = {"csv": encode_csv, "ndjson": encode_ndjson, "parquet": encode_parquet}
+
+
+class MetricExportService:
+    """Потоковая выгрузка metric_results с постоянным расходом памяти."""
+
+    def __init__(self, metric_repo: MetricRepository | None = None):
+        self.metric_repo = metric_repo or MetricRepository()
+
+    def stream(
+        self,
+        db: Session,
+        export_format: str,
+        course_id: Optional[str] = None,
+        period_from: Optional[datetime] = None,
+        period_to: Optional[datetime] = None,
+        metrics: Optional[Sequence[MetricName]] = None,
+        chunk_size: int = 5000,
+    ) -> Iterator[bytes]:
+        chunks = self.metric_repo.iter_results(
+            db,
+            course_id=course_id,
+            period_from=naive_utc(period_from) if period_from is not None else None,
+            period_to=naive_utc(period_to) if period_to is not None else None,
+            metrics=metrics,
+            chunk_size=chunk_size,
+        )
+        return ENCODERS[export_format](chunks)
@@ -0,0 +1,223 @@
+import logging
+from datetime import datetime
+from typing import Callable, Optional, Sequence, Tuple
+
+import anyio
+import anyio.from_thread
+import anyio.to_thread
+import sniffio
+from sqlalchemy.orm import Session
+
+from app.core.cache import naive_utc
+from app.core.config import settings
+from app.core.logging import job_id_var, request_id_var
+from app.models.job import PRIORITY_LEVELS, CalculationJob, JobPriority
+from app.models.metric import MetricName
+from app.repositories.job_repository import JobRepository
+from app.services.metrics import MetricsEngine
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseLostError(RuntimeError):
+    """Аренда задания перехвачена другим узлом: результаты дальше не пишем."""
+
+
+class CalculationJobQueue:
+    """Очередь пересчётов в таблице calculation_jobs и пул воркеров (task group anyio), разбирающих её.
+
+    Задания забираются из БД, поэтому их может выполнять любой процесс с запущенными воркерами;
+    ``submit`` лишь будит локальный пул, чтобы не ждать следующего опроса.
+    Взятое задание арендуется узлом ``node_id`` на ``lease_seconds`` и продлевается heartbeat-ом;
+    если узел умер, по истечении аренды задание забирает другой узел. Номер попытки (``attempts``)
+    фенсит захват: аренду проверяем перед сканом каждой метрики и под блокировкой строки задания
+    в транзакции записи её результатов.
+    Воркеры живут в event loop API (asyncio или trio), поэтому вся синхронная работа с БД уходит
+    в поток (``anyio.to_thread``), а в loop остаются только ожидания ClickHouse.
+    """
+
+    def __init__(
+        self,
+        engine_provider: Callable[[], MetricsEngine],
+        session_factory: Callable[[], Session],
+        repo: JobRepository | None = None,
+        concurrency: int = settings.calculation_workers,
+        poll_interval_seconds: float = settings.calculation_poll_interval_seconds,
+        node_id: str = settings.node_id,
+        lease_seconds: float = settings.calculation_lease_seconds,
+        heartbeat_interval_seconds: float = settings.calculation_heartbeat_interval_seconds,
+        max_attempts: int = settings.calculation_max_attempts,
+    ):
+        self.engine_provider = engine_provider
+        self.session_factory = session_factory
+        self.repo = repo or JobRepository()
+        self.concurrency = concurrency
+        self.poll_interval_seconds = poll_interval_seconds
+        self.node_id = node_id
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval_seconds = heartbeat_interval_seconds
+        self.max_attempts = max_attempts
+        self._wakeup: Optional[anyio.Event] = None
+        self._cancel_scope: Optional[anyio.CancelScope] = None
+        self._stopped: Optional[anyio.Event] = None
+
+    def submit(
+        self,
+        db: Session,
+        course_id: str,
+        period_start: datetime,
+        period_end: datetime,
+        metrics: Sequence[MetricName] | None = None,
+        priority: JobPriority = JobPriority.INTERACTIVE,
+    ) -> Tuple[CalculationJob, bool]:
+        job, created = self.repo.submit(
+            db,
+            course_id=course_id,
+            period_start=naive_utc(period_start),
+            period_end=naive_utc(period_end),
+            metrics=list(metrics or MetricsEngine.DEFAULT_METRICS),
+            priority=PRIORITY_LEVELS[priority],
+        )
+        self._notify()
+        return job, created
+
+    def _notify(self) -> None:
+        wakeup = self._wakeup
+        if wakeup is None:
+            return
+        try:
+            sniffio.current_async_library()
+        except sniffio.AsyncLibraryNotFoundError:
+            # Вызов из threadpool (sync-роуты): будим пул в его event loop.
+            try:
+                anyio.from_thread.run_sync(wakeup.set)
+            except RuntimeError:
+                pass  # поток не из anyio: задание заберут на следующем опросе
+            return
+        wakeup.set()
+
+    @property
+    def running(self) -> bool:
+        return self._cancel_scope is not None
+
+    async def serve(self, *, task_status=anyio.TASK_STATUS_IGNORED) -> None:
+        """Пул воркеров в собственной task group; работает, пока его не остановят через ``stop``.
+
+        Запускается из lifespan: ``await task_group.start(job_queue.serve)``.
+        """
+        self._stopped = anyio.Event()
+        try:
+            async with anyio.create_task_group() as workers:
+                self._cancel_scope = workers.cancel_scope
+                self._wakeup = anyio.Event()
+                for i in range(self.concurrency):
+                    workers.start_soon(self._worker, name=f"calculation-worker-{i}")
+                task_status.started()
+        finally:
+            self._cancel_scope = None
+            self._wakeup = None
+            self._stopped.set()
+
+    async def stop(self) -> None:
+        if self._cancel_scope is None or self._stopped is None:
+            return
+        self._cancel_scope.cancel()
+        await self._stopped.wait()
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                processed = await self.run_once()
+            except Exception as exc:  # pragma: no cover - логирующий guard
+                logger.warning("Calculation worker failed to claim a job: %s", exc)
+                processed = False
+            if not processed:
+                await self._wait_for_work()
+
+    async def _wait_for_work(self) -> None:
+        wakeup = self._wakeup
+        with anyio.move_on_after(self.poll_interval_seconds):
+            await wakeup.wait()
+        # anyio.Event нельзя сбросить: первый проснувшийся воркер ставит новое.
+        if wakeup.is_set() and self._wakeup is wakeup:
+            self._wakeup = anyio.Event()
+
+    async def run_once(self) -> bool:
+        """Забирает и выполняет одно задание; False, если очередь пуста."""
+        with self.session_factory() as db:
+            job = await anyio.to_thread.run_sync(
+                self.repo.claim_next, db, self.node_id, self.lease_seconds, self.max_attempts
+            )
+            if job is None:
+                return False
+            job_id, attempt = job.id, job.attempts
+            # query_id запросов ClickHouse задания несут его id вместо id HTTP-запроса.
+            request_token = request_id_var.set(f"job-{job_id}")
+            job_token = job_id_var.set(job_id)
+            lease = {"held": True}
+
+            def check_lease(session: Session, lock: bool = False) -> None:
+                if not lease["held"] or not self.repo.holds_lease(session, job_id, self.node_id, attempt, lock):
+                    lease["held"] = False
+                    raise LeaseLostError(f"Lease on job {job_id} was taken over")
+
+            def before_scan(session: Session) -> None:
+                # Проверка до скана ClickHouse; транзакцию не держим открытой на время запроса.
+                try:
+                    check_lease(session)
+                finally:
+                    session.rollback()
+
+            def write_guard(session: Session) -> None:
+                check_lease(session, lock=True)
+
+            def on_progress(done: int, total: int) -> None:
+                if not self.repo.set_progress(db, job_id, self.node_id, attempt, done / total):
+                    raise LeaseLostError(f"Lease on job {job_id} was taken over")
+
+            try:
+                async with anyio.create_task_group() as heartbeat:
+                    heartbeat.start_soon(self._heartbeat, job_id, attempt, lease)
+                    try:
+                        await self.engine_provider().calculate_for_course(
+                            db=db,
+                            course_id=job.course_id,
+                            period_start=job.period_start,
+                            period_end=job.period_end,
+                            metrics=job.metric_names,
+                            on_progress=on_progress,
+                            before_scan=before_scan,
+                            write_guard=write_guard,
+                        )
+                    except LeaseLostError:
+                        logger.warning("Calculation job %s lost its lease on %s", job_id, self.node_id)
+                        await anyio.to_thread.run_sync(db.rollback)
+                    except Exception as exc:
+                        logger.exception("Calculation job %s failed", job_id)
+                        await anyio.to_thread.run_sync(
+                            self._fail, db, job_id, attempt, str(exc) or exc.__class__.__name__
+                        )
+                    else:
+                        await anyio.to_thread.run_sync(self.repo.finish, db, job_id, self.node_id, attempt)
+                    finally:
+                        heartbeat.cancel_scope.cancel()
+            finally:
+                job_id_var.reset(job_token)
+                request_id_var.reset(request_token)
+            return True
+
+    def _fail(self, db: Session, job_id: str, attempt: int, error: str) -> None:
+        db.rollback()
+        self.repo.finish(db, job_id, self.node_id, attempt, error=error)
+
+    def _renew(self, job_id: str, attempt: int) -> bool:
+        with self.session_factory() as db:
+            return self.repo.renew(db, job_id, self.node_id, attempt, self.lease_seconds)
+
+    async def _heartbeat(self, job_id: str, attempt: int, lease: dict) -> None:
+        while lease["held"]:
+            await anyio.sleep(self.heartbeat_interval_seconds)
+            try:
+                lease["held"] = await anyio.to_thread.run_sync(self._renew, job_id, attempt)
+            except Exception as exc:  # pragma: no cover - логирующий guard
+                logger.warning("Failed to renew lease on job %s: %s", job_id, exc)
@@ -1,6 +1,8 @@
 from datetime import datetime
-from typing import Iterable, List
+from functools import partial
+from typing import Callable, Iterable, List, Optional
 
+import anyio.to_thread
 from sqlalchemy.orm import Session
 
 from app.models.metric import MetricName
@@ -9,7 +11,20 @@ from app.repositories.metric_repository import MetricRepository
 
 
 class MetricsEngine:
-    """Расчёт метрик на основе событий в ClickHouse с сохранением в PostgreSQL."""
+    """Расчёт метрик на основе событий в ClickHouse с сохранением в PostgreSQL.
+
+    Запись результатов и ``on_progress`` синхронно ходят в БД и выполняются в потоке,
+    чтобы пересчёт большого курса не останавливал event loop.
+    """
+
+    DEFAULT_METRICS = (
+        MetricName.RETENTION,
+        MetricName.ENGAGEMENT,
+        MetricName.COMPLETION,
+        MetricName.TIME_ON_TASK,
+        MetricName.ACTIVITY_INDEX,
+        MetricName.FOCUS_RATIO,
+    )
 
     def __init__(
         self,
@@ -26,24 +41,31 @@ class MetricsEngine:
         period_start: datetime,
         period_end: datetime,
         metrics: Iterable[MetricName] | None = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        before_scan: Optional[Callable[[Session], None]] = None,
+        write_guard: Optional[Callable[[Session], None]] = None,
     ) -> List[MetricName]:
-        metrics_to_calc = list(metrics or [
-            MetricName.RETENTION,
-            MetricName.ENGAGEMENT,
-            MetricName.COMPLETION,
-            MetricName.TIME_ON_TASK,
-            MetricName.ACTIVITY_INDEX,
-            MetricName.FOCUS_RATIO,
-        ])
-
-        for metric in metrics_to_calc:
+        """``before_scan`` вызывается перед запросом каждой метрики в ClickHouse, ``write_guard`` —
+        в транзакции записи её результатов; оба могут прервать расчёт исключением."""
+        metrics_to_calc = list(metrics or self.DEFAULT_METRICS)
+        guard = {"guard": write_guard} if write_guard is not None else {}
+
+        for done, metric in enumerate(metrics_to_calc, start=1):
+            if before_scan is not None:
+                await anyio.to_thread.run_sync(before_scan, db)
             rows = await self.ch_repo.fetch_metric(metric, period_start, period_end, course_id)
-            self.metric_repo.upsert_batch(
-                db=db,
-                metric_name=metric,
-                course_id=course_id,
-                period_start=period_start,
-                period_end=period_end,
-                rows=rows,
+            await anyio.to_thread.run_sync(
+                partial(
+                    self.metric_repo.upsert_batch,
+                    db=db,
+                    metric_name=metric,
+                    course_id=course_id,
+                    period_start=period_start,
+                    period_end=period_end,
+                    rows=rows,
+                    **guard,
+                )
             )
+            if on_progress is not None:
+                await anyio.to_thread.run_sync(on_progress, done, len(metrics_to_calc))
         return metrics_to_calc
@@ -0,0 +1,142 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.job import PRIORITY_LEVELS, JobPriority, JobStatus
+from app.repositories.course_activity_repository import CourseActivityRepository
+from app.repositories.job_repository import JobRepository
+from app.services.metrics import MetricsEngine
+
+logger = logging.getLogger(__name__)
+
+Window = Tuple[datetime, datetime]
+
+
+class CourseActivityTracker:
+    """Множество курсов с новыми событиями с момента последнего сброса в course_activity."""
+
+    def __init__(self):
+        self._seen: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, course_ids: Iterable[str], at: Optional[datetime] = None) -> None:
+        at = at or datetime.utcnow()
+        with self._lock:
+            for course_id in course_ids:
+                self._seen[course_id] = max(self._seen.get(course_id, at), at)
+
+    def drain(self) -> Dict[str, datetime]:
+        with self._lock:
+            seen, self._seen = self._seen, {}
+        return seen
+
+    def restore(self, seen: Dict[str, datetime]) -> None:
+        with self._lock:
+            for course_id, at in seen.items():
+                self._seen[course_id] = max(self._seen.get(course_id, at), at)
+
+
+def _term_start(now: datetime, term_start_months: Sequence[int]) -> Tuple[datetime, datetime]:
+    starts = sorted(
+        datetime(year, month, 1) for year in (now.year - 1, now.year, now.year + 1) for month in term_start_months
+    )
+    current = max(start for start in starts if start <= now)
+    return current, min(start for start in starts if start > now)
+
+
+def rolling_windows(now: datetime, windows: Sequence[str], term_start_months: Sequence[int]) -> List[Window]:
+    """Скользящие окна пересчёта, содержащие ``now``: day, week (с понедельника), term."""
+    today = datetime(now.year, now.month, now.day)
+    result: List[Window] = []
+    for window in windows:
+        if window == "day":
+            result.append((today, today + timedelta(days=1)))
+        elif window == "week":
+            monday = today - timedelta(days=today.weekday())
+            result.append((monday, monday + timedelta(days=7)))
+        elif window == "term":
+            result.append(_term_start(now, term_start_months))
+        else:
+            raise ValueError(f"Unknown recalculation window: {window}")
+    return result
+
+
+class RecalculationScheduler:
+    """Ставит пакетные пересчёты скользящих окон только для курсов, получивших новые события.
+
+    Отметки о событиях копятся в трекере процесса и на каждом тике сбрасываются в course_activity,
+    поэтому курс, изменившийся на любой реплике, планируется один раз; повторная постановка того же
+    окна схлопывается single-flight очереди заданий. Присоединяться можно только к ещё не начатому
+    заданию: скан выполняющегося уже не увидит новых событий, поэтому такой курс остаётся «грязным»
+    и планируется снова, когда задание завершится.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        tracker: CourseActivityTracker | None = None,
+        activity_repo: CourseActivityRepository | None = None,
+        job_repo: JobRepository | None = None,
+        windows: Sequence[str] = tuple(settings.scheduler_windows),
+        term_start_months: Sequence[int] = tuple(settings.scheduler_term_start_months),
+        max_courses_per_tick: int = settings.scheduler_max_courses_per_tick,
+    ):
+        self.session_factory = session_factory
+        self.tracker = tracker or activity_tracker
+        self.activity_repo = activity_repo or CourseActivityRepository()
+        self.job_repo = job_repo or JobRepository()
+        self.windows = windows
+        self.term_start_months = term_start_months
+        self.max_courses_per_tick = max_courses_per_tick
+
+    def flush(self, db: Session) -> None:
+        seen = self.tracker.drain()
+        if not seen:
+            return
+        try:
+            self.activity_repo.touch_many(db, seen)
+        except Exception:
+            db.rollback()
+            self.tracker.restore(seen)
+            raise
+
+    def flush_pending(self) -> None:
+        """Сбрасывает отметки этого процесса в course_activity, не планируя заданий."""
+        with self.session_factory() as db:
+            self.flush(db)
+
+    def tick(self, now: Optional[datetime] = None) -> int:
+        """Один проход планировщика; возвращает число поставленных (или присоединённых к очереди) заданий."""
+        now = now or datetime.utcnow()
+        windows = rolling_windows(now, self.windows, self.term_start_months)
+        enqueued = 0
+        with self.session_factory() as db:
+            self.flush(db)
+            # Не больше max_courses_per_tick курсов за тик: остальные останутся «грязными» до следующего.
+            for course_id, last_event_at in self.activity_repo.list_dirty(db, self.max_courses_per_tick):
+                running = False
+                for period_start, period_end in windows:
+                    job, _ = self.job_repo.submit(
+                        db,
+                        course_id=course_id,
+                        period_start=period_start,
+                        period_end=period_end,
+                        metrics=list(MetricsEngine.DEFAULT_METRICS),
+                        priority=PRIORITY_LEVELS[JobPriority.BATCH],
+                    )
+                    if job.status == JobStatus.RUNNING.value:
+                        running = True
+                    else:
+                        enqueued += 1
+                if not running:
+                    self.activity_repo.mark_scheduled(db, course_id, last_event_at)
+        if enqueued:
+            logger.info("Scheduled %s rolling-window recalculation jobs", enqueued)
+        return enqueued
+
+
+activity_tracker = CourseActivityTracker()
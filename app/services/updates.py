@@ -0,0 +1,46 @@
+import itertools
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from app.core.pubsub import Subscription
+from app.core.serialization import dumps
+
+
+def format_sse(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\n".encode() + b"data: " + dumps(data) + b"\n\n"
+
+
+async def stream_updates(
+    subscribe: Callable[[], Subscription],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    keepalive_seconds: float,
+    load_aggregates: Optional[Callable[[Dict[str, Any]], Awaitable[List[Dict[str, Any]]]]] = None,
+) -> AsyncIterator[bytes]:
+    """SSE-поток уведомлений подписки: ``metrics_updated`` на каждый scope, keepalive-комментарии в паузах.
+
+    С ``load_aggregates`` уведомления одного курса в пачке схлопываются, и в событие кладутся свежие агрегаты.
+    Вытесненный медленный клиент получает ``evicted`` и должен переподключиться.
+    Подписка создаётся при первой итерации: ответ, который так и не начали отдавать, её не держит.
+    """
+    ids = itertools.count(1)
+    subscription = subscribe()
+    try:
+        yield b"retry: 3000\n\n"
+        while not await is_disconnected():
+            messages = await subscription.get(timeout=keepalive_seconds)
+            if messages is None:
+                yield format_sse("evicted", {"reason": "slow consumer"}, next(ids))
+                return
+            if not messages:
+                yield b": keepalive\n\n"
+                continue
+            if load_aggregates is not None:
+                latest = {message["course_id"]: message for message in messages}
+                for message in latest.values():
+                    payload = {**message, "aggregates": await load_aggregates(message)}
+                    yield format_sse("metrics_updated", payload, next(ids))
+            else:
+                for message in messages:
+                    yield format_sse("metrics_updated", message, next(ids))
+    finally:
+        subscription.close()
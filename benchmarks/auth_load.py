@@ -0,0 +1,281 @@
+"""Нагрузочный прогон /auth/* и чтения аналитики в процессе, с перебором стоимости bcrypt.
+
+Приложение поднимается в том же процессе (httpx.ASGITransport) поверх отдельной базы: SQLite-файл
+во временном каталоге по умолчанию или локальный PostgreSQL через --database-url (только одноразовая
+база — таблицы создаются, пользователи и результаты добавляются с уникальным префиксом прогона).
+Для каждого значения --bcrypt-rounds регистрируются --users пользователей (фаза register), затем
+--concurrency виртуальных клиентов выполняют смесь login/refresh/analytics в течение --duration секунд.
+
+Запуск: python -m benchmarks.auth_load [--users 50] [--concurrency 8,32] [--bcrypt-rounds 4,10,12]
+        [--mix login=0.2,refresh=0.4,analytics=0.4] [--duration 10] [--database-url ...] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import app.core.security as security
+import app.models  # noqa: F401
+from app.core.config import settings
+from app.core.database import _engine_kwargs, get_db, get_read_db
+from app.core.hashing import PasswordHasher
+from app.main import create_app
+from app.models.base import Base
+from app.models.metric import MetricName, MetricResult
+from app.models.user import UserRole
+
+PASSWORD = "load-test-secret"
+PERIOD_START = datetime(2024, 9, 1)
+PERIOD_END = datetime(2024, 9, 8)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+class Recorder:
+    """Латентности и статусы по эндпоинтам."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, seconds: float, status_code: int) -> None:
+        self.latencies[endpoint].append(seconds)
+        if status_code >= 400:
+            self.errors[endpoint][status_code] += 1
+
+    def report(self, elapsed: float) -> Dict[str, dict]:
+        return {
+            endpoint: {
+                "requests": len(values),
+                "rps": len(values) / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+                "max_ms": max(values) * 1000,
+                "errors": dict(self.errors[endpoint]),
+            }
+            for endpoint, values in sorted(self.latencies.items())
+        }
+
+
+class Account:
+    def __init__(self, email: str, user_id: str, course_id: str, access: str, refresh: str):
+        self.email = email
+        self.user_id = user_id
+        self.course_id = course_id
+        self.access = access
+        self.refresh = refresh
+        self.lock = asyncio.Lock()
+
+
+async def timed(client: httpx.AsyncClient, recorder: Recorder, endpoint: str, method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    recorder.record(endpoint, time.perf_counter() - started, response.status_code)
+    return response
+
+
+def apply_tokens(account: Account, response: httpx.Response) -> None:
+    if response.status_code == 200:
+        body = response.json()
+        account.access, account.refresh = body["access_token"], body["refresh_token"]
+
+
+async def seed(
+    client: httpx.AsyncClient, session_factory: sessionmaker, users: int, concurrency: int, recorder: Recorder
+) -> List[Account]:
+    prefix = uuid.uuid4().hex[:8]
+    gate = asyncio.Semaphore(concurrency)
+    course_id = str(uuid.uuid4())
+
+    async def register(i: int) -> Optional[Account]:
+        email = f"load-{prefix}-{i}@example.com"
+        payload = {"email": email, "password": PASSWORD, "role": UserRole.TEACHER.value}
+        async with gate:
+            response = await timed(client, recorder, "register", "POST", "/auth/register", json=payload)
+        if response.status_code != 201:
+            return None
+        body = response.json()
+        return Account(email, body["user"]["id"], course_id, body["access_token"], body["refresh_token"])
+
+    accounts = [account for account in await asyncio.gather(*(register(i) for i in range(users))) if account]
+    with session_factory() as db:
+        db.add_all(
+            MetricResult(
+                metric_name=name,
+                user_id=account.user_id,
+                course_id=course_id,
+                value=random.random(),
+                period_start=PERIOD_START,
+                period_end=PERIOD_END,
+            )
+            for account in accounts
+            for name in MetricName
+        )
+        db.commit()
+    return accounts
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    accounts: List[Account],
+    mix: Dict[str, float],
+    concurrency: int,
+    duration: float,
+    recorder: Recorder,
+) -> float:
+    operations, weights = zip(*mix.items())
+    deadline = time.perf_counter() + duration
+
+    async def operate(account: Account, operation: str) -> None:
+        if operation == "login":
+            payload = {"email": account.email, "password": PASSWORD}
+            apply_tokens(account, await timed(client, recorder, "login", "POST", "/auth/login", json=payload))
+        elif operation == "refresh":
+            # Ротация одноразовая: refresh одного аккаунта выполняем последовательно.
+            async with account.lock:
+                payload = {"refresh_token": account.refresh}
+                apply_tokens(account, await timed(client, recorder, "refresh", "POST", "/auth/refresh", json=payload))
+        else:
+            params = {
+                "course_id": account.course_id,
+                "period_start": PERIOD_START.isoformat(),
+                "period_end": PERIOD_END.isoformat(),
+            }
+            headers = {"Authorization": f"Bearer {account.access}"}
+            url = f"/api/v1/metrics/user/{account.user_id}"
+            await timed(client, recorder, "analytics", "GET", url, params=params, headers=headers)
+
+    async def virtual_client() -> None:
+        while time.perf_counter() < deadline:
+            await operate(random.choice(accounts), random.choices(operations, weights)[0])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_client() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def run_case(args: argparse.Namespace, session_factory: sessionmaker, rounds: int, concurrency: int) -> dict:
+    hasher = PasswordHasher(
+        workers=args.hash_workers,
+        queue_limit=args.hash_queue_limit,
+        rounds=rounds,
+        timeout_seconds=settings.password_hash_timeout_seconds,
+    )
+    security.password_hasher = hasher
+    # Прогрев: spawn воркеров пула не должен попадать в латентность register.
+    await asyncio.gather(*(asyncio.to_thread(hasher.hash, PASSWORD) for _ in range(max(args.hash_workers, 1))))
+    application = create_app()
+
+    def override_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    application.dependency_overrides[get_db] = override_db
+    application.dependency_overrides[get_read_db] = override_db
+    transport = httpx.ASGITransport(app=application)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            seed_recorder = Recorder()
+            started = time.perf_counter()
+            # Регистрацию не ведём шире очереди хешера, иначе часть пользователей получит 503 и не засеется.
+            seed_concurrency = max(1, min(concurrency, max(args.hash_workers, 1) + args.hash_queue_limit))
+            accounts = await seed(client, session_factory, args.users, seed_concurrency, seed_recorder)
+            seed_elapsed = time.perf_counter() - started
+            if not accounts:
+                raise SystemExit("No users registered: check the database and hasher settings")
+            recorder = Recorder()
+            elapsed = await drive(client, accounts, args.mix, concurrency, args.duration, recorder)
+    finally:
+        hasher.shutdown()
+    total = sum(len(values) for values in recorder.latencies.values())
+    return {
+        "bcrypt_rounds": rounds,
+        "concurrency": concurrency,
+        "users": len(accounts),
+        "elapsed_seconds": elapsed,
+        "total_rps": total / elapsed if elapsed else 0.0,
+        "endpoints": {**seed_recorder.report(seed_elapsed), **recorder.report(elapsed)},
+    }
+
+
+def print_case(result: dict) -> None:
+    print(
+        f"\nbcrypt_rounds={result['bcrypt_rounds']} concurrency={result['concurrency']} "
+        f"users={result['users']} total={result['total_rps']:.1f} req/s"
+    )
+    print(f"{'endpoint':<10} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}  errors")
+    for endpoint, stats in result["endpoints"].items():
+        print(
+            f"{endpoint:<10} {stats['requests']:>8} {stats['rps']:>8.1f} {stats['p50_ms']:>8.1f} "
+            f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['max_ms']:>8.1f}  {stats['errors'] or '-'}"
+        )
+
+
+def parse_ints(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in ("login", "refresh", "analytics"):
+            raise argparse.ArgumentTypeError(f"Unknown operation: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="по умолчанию — SQLite во временном каталоге")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=parse_ints, default=[8])
+    parser.add_argument("--bcrypt-rounds", type=parse_ints, default=[settings.bcrypt_rounds])
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("login=0.2,refresh=0.4,analytics=0.4"))
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд смешанной нагрузки на прогон")
+    parser.add_argument("--hash-workers", type=int, default=settings.password_hash_workers)
+    parser.add_argument("--hash-queue-limit", type=int, default=settings.password_hash_queue_limit)
+    parser.add_argument("--json", action="store_true", help="вывести результаты одним JSON-документом")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{Path(tmp) / 'auth_load.db'}"
+        bench_engine = create_engine(url, **_engine_kwargs(url))
+        Base.metadata.create_all(bind=bench_engine)
+        session_factory = sessionmaker(bind=bench_engine, autoflush=False, autocommit=False, future=True)
+        results = []
+        for rounds in args.bcrypt_rounds:
+            for concurrency in args.concurrency:
+                result = asyncio.run(run_case(args, session_factory, rounds, concurrency))
+                results.append(result)
+                if not args.json:
+                    print_case(result)
+        bench_engine.dispose()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Микробенчмарк сериализации ответа /metrics/user: pydantic orm_mode против кортежей + orjson.
+
+Запуск: python -m benchmarks.serialization_bench [--rows 100000]
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.serialization import dumps, rows_to_dicts
+from app.models.metric import MetricName
+from app.schemas.metrics import MetricResultOut
+from app.services.analytics import USER_METRIC_FIELDS
+
+
+def make_rows(count: int) -> list[tuple]:
+    names = list(MetricName)
+    start = datetime(2024, 1, 1)
+    return [
+        (
+            names[i % len(names)],
+            f"user-{i % 1000}",
+            "course-1",
+            None,
+            i / 7,
+            start + timedelta(days=i % 30),
+            start + timedelta(days=i % 30 + 7),
+            start + timedelta(seconds=i),
+        )
+        for i in range(count)
+    ]
+
+
+def pydantic_path(rows: list[tuple]) -> tuple[bytes, float]:
+    # Как было: ORM-объект -> MetricResultOut.from_orm -> jsonable_encoder -> json.dumps.
+    objects = [SimpleNamespace(**dict(zip(USER_METRIC_FIELDS, row))) for row in rows]
+    started = time.perf_counter()
+    payload = json.dumps(
+        jsonable_encoder([MetricResultOut.from_orm(obj) for obj in objects]),
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    return payload, time.perf_counter() - started
+
+
+def fast_path(rows: list[tuple]) -> tuple[bytes, float]:
+    started = time.perf_counter()
+    payload = dumps(rows_to_dicts(USER_METRIC_FIELDS, rows))
+    return payload, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    slow_payload, slow_seconds = pydantic_path(rows)
+    fast_payload, fast_seconds = fast_path(rows)
+    assert json.loads(slow_payload) == json.loads(fast_payload), "wire shape differs"
+
+    print(f"rows={args.rows}")
+    print(f"pydantic+json: {slow_seconds * 1000:.0f} ms")
+    print(f"tuples+orjson: {fast_seconds * 1000:.0f} ms")
+    print(f"speedup: x{slow_seconds / fast_seconds:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""add user time-series index on metric_results
+
+Revision ID: 2b6d0e9f8c51
+Revises: f07b9c4e1a38
+Create Date: 2026-10-19 13:05:26.771940
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b6d0e9f8c51'
+down_revision: Union[str, None] = 'f07b9c4e1a38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_metric_results_user_series",
+        "metric_results",
+        ["user_id", "course_id", "metric_name", "period_start"],
+        postgresql_include=["value"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_metric_results_user_series", table_name="metric_results")
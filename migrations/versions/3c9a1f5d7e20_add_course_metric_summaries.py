@@ -0,0 +1,64 @@
+"""add course metric summaries
+
+Revision ID: 3c9a1f5d7e20
+Revises: 67206af655e3
+Create Date: 2026-10-19 10:12:41.381204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9a1f5d7e20'
+down_revision: Union[str, None] = '67206af655e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "course_metric_summaries",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column(
+            "metric_name",
+            sa.Enum(
+                "retention",
+                "engagement_score",
+                "completion_rate",
+                "time_on_task",
+                "activity_index",
+                "focus_ratio",
+                name="metric_names",
+                native_enum=False,
+            ),
+            nullable=False,
+        ),
+        sa.Column("course_id", sa.String(), nullable=False),
+        sa.Column("module_id", sa.String(), nullable=True),
+        sa.Column("period_start", sa.DateTime(), nullable=False),
+        sa.Column("period_end", sa.DateTime(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("value_sum", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("value_sum_sq", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("min_value", sa.Float(), nullable=True),
+        sa.Column("max_value", sa.Float(), nullable=True),
+        sa.Column("sketch", sa.Text(), nullable=False, server_default=""),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.UniqueConstraint(
+            "metric_name",
+            "course_id",
+            "module_id",
+            "period_start",
+            "period_end",
+            name="uq_course_metric_summary_scope",
+        ),
+    )
+    op.create_index("ix_course_metric_summaries_course_id", "course_metric_summaries", ["course_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_course_metric_summaries_course_id", table_name="course_metric_summaries")
+    op.drop_table("course_metric_summaries")
@@ -0,0 +1,30 @@
+"""add expires_at index on refresh_tokens
+
+Revision ID: 4f1b7d2e8a60
+Revises: c3e8b5f1a294
+Create Date: 2026-10-19 17:12:40.318275
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f1b7d2e8a60'
+down_revision: Union[str, None] = 'c3e8b5f1a294'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # refresh_tokens — горячая таблица логина: строим индекс без блокировки записи (вне транзакции).
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_refresh_tokens_expires_at", "refresh_tokens", ["expires_at"], postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_refresh_tokens_expires_at", table_name="refresh_tokens", postgresql_concurrently=True)
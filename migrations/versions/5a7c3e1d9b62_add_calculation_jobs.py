@@ -0,0 +1,59 @@
+"""add calculation jobs queue
+
+Revision ID: 5a7c3e1d9b62
+Revises: 2b6d0e9f8c51
+Create Date: 2026-10-19 14:21:07.512834
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a7c3e1d9b62'
+down_revision: Union[str, None] = '2b6d0e9f8c51'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_ACTIVE = sa.text("status IN ('queued', 'running')")
+
+
+def _guid() -> sa.types.TypeEngine:
+    return postgresql.UUID() if op.get_context().dialect.name == "postgresql" else sa.String()
+
+
+def upgrade() -> None:
+    op.create_table(
+        "calculation_jobs",
+        sa.Column("id", _guid(), primary_key=True),
+        sa.Column("dedupe_key", sa.String(length=64), nullable=False),
+        sa.Column("course_id", _guid(), nullable=False),
+        sa.Column("period_start", sa.DateTime(), nullable=False),
+        sa.Column("period_end", sa.DateTime(), nullable=False),
+        sa.Column("metrics", sa.Text(), nullable=False),
+        sa.Column("priority", sa.SmallInteger(), nullable=False, server_default="0"),
+        sa.Column("status", sa.String(length=16), nullable=False, server_default="queued"),
+        sa.Column("progress", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index(
+        "uq_calculation_jobs_active_dedupe",
+        "calculation_jobs",
+        ["dedupe_key"],
+        unique=True,
+        postgresql_where=_ACTIVE,
+        sqlite_where=_ACTIVE,
+    )
+    op.create_index("ix_calculation_jobs_claim", "calculation_jobs", ["status", "priority", "created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_calculation_jobs_claim", table_name="calculation_jobs")
+    op.drop_index("uq_calculation_jobs_active_dedupe", table_name="calculation_jobs")
+    op.drop_table("calculation_jobs")
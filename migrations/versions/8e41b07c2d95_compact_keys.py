@@ -0,0 +1,166 @@
+"""compact keys: native uuid, smallint metric codes, bigint metric_results pk
+
+Revision ID: 8e41b07c2d95
+Revises: 3c9a1f5d7e20
+Create Date: 2026-10-19 11:03:17.552930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e41b07c2d95'
+down_revision: Union[str, None] = '3c9a1f5d7e20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Должно совпадать с app.models.metric.METRIC_CODES.
+METRIC_CODES = {
+    "retention": 1,
+    "engagement_score": 2,
+    "completion_rate": 3,
+    "time_on_task": 4,
+    "activity_index": 5,
+    "focus_ratio": 6,
+}
+
+
+def _to_code(column: str) -> str:
+    return f"CASE {column} " + " ".join(f"WHEN '{name}' THEN {code}" for name, code in METRIC_CODES.items()) + " END"
+
+
+def _from_code(column: str) -> str:
+    return f"CASE {column} " + " ".join(f"WHEN {code} THEN '{name}'" for name, code in METRIC_CODES.items()) + " END"
+
+
+_TO_CODE = _to_code("metric_name::text")
+_FROM_CODE = _from_code("metric_name")
+
+_SCOPE_COLUMNS = "metric_name, user_id, course_id, module_id, period_start, period_end"
+_SUMMARY_SCOPE_COLUMNS = "metric_name, course_id, module_id, period_start, period_end"
+
+
+def _is_postgresql() -> bool:
+    return op.get_context().dialect.name == "postgresql"
+
+
+def _upgrade_other() -> None:
+    """SQLite и др.: UUID остаются строками, но метрики переходят на коды, а id результатов — на автоинкремент.
+
+    ALTER COLUMN там нет, поэтому таблицы пересобираются (batch): строки копируются, id выдаются заново.
+    """
+    for table in ("metric_results", "course_metric_summaries"):
+        op.execute(f"UPDATE {table} SET metric_name = {_to_code('metric_name')}")
+        with op.batch_alter_table(table, recreate="always") as batch_op:
+            batch_op.alter_column(
+                "metric_name", type_=sa.SmallInteger(), existing_type=sa.String(16), existing_nullable=False
+            )
+            if table == "metric_results":
+                batch_op.drop_column("id")
+                batch_op.add_column(sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True))
+
+
+def _downgrade_other() -> None:
+    for table in ("course_metric_summaries", "metric_results"):
+        with op.batch_alter_table(table, recreate="always") as batch_op:
+            batch_op.alter_column(
+                "metric_name", type_=sa.String(16), existing_type=sa.SmallInteger(), existing_nullable=False
+            )
+            if table == "metric_results":
+                # Прежний текстовый ключ: числовые id переносятся строками, уникальность сохраняется.
+                batch_op.alter_column("id", type_=sa.String(), existing_type=sa.Integer(), existing_nullable=False)
+        op.execute(f"UPDATE {table} SET metric_name = {_from_code('CAST(metric_name AS INTEGER)')}")
+
+
+def upgrade() -> None:
+    if not _is_postgresql():
+        _upgrade_other()
+        return
+
+    op.execute("ALTER TABLE refresh_tokens DROP CONSTRAINT IF EXISTS refresh_tokens_user_id_fkey")
+    op.execute("ALTER TABLE users ALTER COLUMN id TYPE uuid USING id::uuid")
+    op.execute(
+        "ALTER TABLE refresh_tokens "
+        "ALTER COLUMN jti TYPE uuid USING jti::uuid, "
+        "ALTER COLUMN user_id TYPE uuid USING user_id::uuid"
+    )
+    op.execute(
+        "ALTER TABLE refresh_tokens ADD CONSTRAINT refresh_tokens_user_id_fkey "
+        "FOREIGN KEY (user_id) REFERENCES users (id)"
+    )
+
+    op.execute("ALTER TABLE metric_results DROP CONSTRAINT uq_metric_scope")
+    op.execute(
+        "ALTER TABLE metric_results "
+        "ALTER COLUMN user_id TYPE uuid USING user_id::uuid, "
+        "ALTER COLUMN course_id TYPE uuid USING course_id::uuid, "
+        "ALTER COLUMN module_id TYPE uuid USING module_id::uuid, "
+        f"ALTER COLUMN metric_name TYPE smallint USING ({_TO_CODE})"
+    )
+    op.execute("ALTER TABLE metric_results DROP CONSTRAINT metric_results_pkey")
+    op.execute("ALTER TABLE metric_results DROP COLUMN id")
+    op.execute("ALTER TABLE metric_results ADD COLUMN id BIGSERIAL PRIMARY KEY")
+    op.execute(f"ALTER TABLE metric_results ADD CONSTRAINT uq_metric_scope UNIQUE ({_SCOPE_COLUMNS})")
+    op.execute("DROP TYPE IF EXISTS metric_names")
+
+    op.execute("ALTER TABLE course_metric_summaries DROP CONSTRAINT uq_course_metric_summary_scope")
+    op.execute(
+        "ALTER TABLE course_metric_summaries "
+        "ALTER COLUMN id TYPE uuid USING id::uuid, "
+        "ALTER COLUMN course_id TYPE uuid USING course_id::uuid, "
+        "ALTER COLUMN module_id TYPE uuid USING module_id::uuid, "
+        f"ALTER COLUMN metric_name TYPE smallint USING ({_TO_CODE})"
+    )
+    op.execute(
+        "ALTER TABLE course_metric_summaries ADD CONSTRAINT uq_course_metric_summary_scope "
+        f"UNIQUE ({_SUMMARY_SCOPE_COLUMNS})"
+    )
+
+
+def downgrade() -> None:
+    if not _is_postgresql():
+        _downgrade_other()
+        return
+
+    op.execute("ALTER TABLE course_metric_summaries DROP CONSTRAINT uq_course_metric_summary_scope")
+    op.execute(
+        "ALTER TABLE course_metric_summaries "
+        "ALTER COLUMN id TYPE varchar USING id::text, "
+        "ALTER COLUMN course_id TYPE varchar USING course_id::text, "
+        "ALTER COLUMN module_id TYPE varchar USING module_id::text, "
+        f"ALTER COLUMN metric_name TYPE varchar(16) USING ({_FROM_CODE})"
+    )
+    op.execute(
+        "ALTER TABLE course_metric_summaries ADD CONSTRAINT uq_course_metric_summary_scope "
+        f"UNIQUE ({_SUMMARY_SCOPE_COLUMNS})"
+    )
+
+    op.execute("ALTER TABLE metric_results DROP CONSTRAINT uq_metric_scope")
+    op.execute("ALTER TABLE metric_results DROP CONSTRAINT metric_results_pkey")
+    op.execute("ALTER TABLE metric_results ALTER COLUMN id DROP DEFAULT")
+    op.execute("DROP SEQUENCE IF EXISTS metric_results_id_seq")
+    op.execute(
+        "ALTER TABLE metric_results "
+        "ALTER COLUMN id TYPE varchar USING gen_random_uuid()::text, "
+        "ALTER COLUMN user_id TYPE varchar USING user_id::text, "
+        "ALTER COLUMN course_id TYPE varchar USING course_id::text, "
+        "ALTER COLUMN module_id TYPE varchar USING module_id::text, "
+        f"ALTER COLUMN metric_name TYPE varchar(16) USING ({_FROM_CODE})"
+    )
+    op.execute("ALTER TABLE metric_results ADD PRIMARY KEY (id)")
+    op.execute(f"ALTER TABLE metric_results ADD CONSTRAINT uq_metric_scope UNIQUE ({_SCOPE_COLUMNS})")
+
+    op.execute("ALTER TABLE refresh_tokens DROP CONSTRAINT refresh_tokens_user_id_fkey")
+    op.execute(
+        "ALTER TABLE refresh_tokens "
+        "ALTER COLUMN jti TYPE varchar USING jti::text, "
+        "ALTER COLUMN user_id TYPE varchar USING user_id::text"
+    )
+    op.execute("ALTER TABLE users ALTER COLUMN id TYPE varchar USING id::text")
+    op.execute(
+        "ALTER TABLE refresh_tokens ADD CONSTRAINT refresh_tokens_user_id_fkey "
+        "FOREIGN KEY (user_id) REFERENCES users (id)"
+    )
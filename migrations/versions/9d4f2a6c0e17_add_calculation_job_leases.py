@@ -0,0 +1,34 @@
+"""add lease columns to calculation jobs
+
+Revision ID: 9d4f2a6c0e17
+Revises: 5a7c3e1d9b62
+Create Date: 2026-10-19 15:02:44.108326
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4f2a6c0e17'
+down_revision: Union[str, None] = '5a7c3e1d9b62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("calculation_jobs", sa.Column("owner", sa.String(length=128), nullable=True))
+    op.add_column("calculation_jobs", sa.Column("lease_expires_at", sa.DateTime(), nullable=True))
+    op.add_column(
+        "calculation_jobs", sa.Column("attempts", sa.SmallInteger(), nullable=False, server_default="0")
+    )
+    op.create_index("ix_calculation_jobs_lease", "calculation_jobs", ["status", "lease_expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_calculation_jobs_lease", table_name="calculation_jobs")
+    op.drop_column("calculation_jobs", "attempts")
+    op.drop_column("calculation_jobs", "lease_expires_at")
+    op.drop_column("calculation_jobs", "owner")
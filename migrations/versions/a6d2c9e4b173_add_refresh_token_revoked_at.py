@@ -0,0 +1,33 @@
+"""add revoked_at to refresh_tokens for revocation delta sync
+
+Revision ID: a6d2c9e4b173
+Revises: 4f1b7d2e8a60
+Create Date: 2026-10-19 17:58:03.904512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d2c9e4b173'
+down_revision: Union[str, None] = '4f1b7d2e8a60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("refresh_tokens", sa.Column("revoked_at", sa.DateTime(), nullable=True))
+    # Как и индекс по expires_at: без блокировки записи в refresh_tokens на время построения.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_refresh_tokens_revoked_at", "refresh_tokens", ["revoked_at"], postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_refresh_tokens_revoked_at", table_name="refresh_tokens", postgresql_concurrently=True)
+    op.drop_column("refresh_tokens", "revoked_at")
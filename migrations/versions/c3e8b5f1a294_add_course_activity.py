@@ -0,0 +1,36 @@
+"""add course activity for recalculation scheduler
+
+Revision ID: c3e8b5f1a294
+Revises: 9d4f2a6c0e17
+Create Date: 2026-10-19 15:47:12.630918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8b5f1a294'
+down_revision: Union[str, None] = '9d4f2a6c0e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _guid() -> sa.types.TypeEngine:
+    return postgresql.UUID() if op.get_context().dialect.name == "postgresql" else sa.String()
+
+
+def upgrade() -> None:
+    op.create_table(
+        "course_activity",
+        sa.Column("course_id", _guid(), primary_key=True),
+        sa.Column("last_event_at", sa.DateTime(), nullable=False),
+        sa.Column("last_scheduled_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("course_activity")
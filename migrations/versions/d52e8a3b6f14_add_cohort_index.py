@@ -0,0 +1,30 @@
+"""add cohort lookup index on metric_results
+
+Revision ID: d52e8a3b6f14
+Revises: 8e41b07c2d95
+Create Date: 2026-10-19 11:48:05.119374
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd52e8a3b6f14'
+down_revision: Union[str, None] = '8e41b07c2d95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_metric_results_course_period_user",
+        "metric_results",
+        ["course_id", "period_start", "period_end", "user_id", "metric_name"],
+        postgresql_include=["value"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_metric_results_course_period_user", table_name="metric_results")
@@ -0,0 +1,51 @@
+"""unique course-level summary scope (module_id IS NULL)
+
+Revision ID: e5b2f8a1c407
+Revises: a6d2c9e4b173
+Create Date: 2026-10-19 19:24:10.517302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b2f8a1c407'
+down_revision: Union[str, None] = 'a6d2c9e4b173'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_COURSE_SCOPE = sa.text("module_id IS NULL")
+
+
+def upgrade() -> None:
+    # Дубликаты сводок по курсу могли появиться из-за NULL в ограничении; сводка пересобирается
+    # при следующей записи scope, поэтому достаточно оставить любую из копий.
+    op.execute(
+        """
+        DELETE FROM course_metric_summaries
+        WHERE module_id IS NULL AND EXISTS (
+            SELECT 1 FROM course_metric_summaries AS other
+            WHERE other.module_id IS NULL
+              AND other.metric_name = course_metric_summaries.metric_name
+              AND other.course_id = course_metric_summaries.course_id
+              AND other.period_start = course_metric_summaries.period_start
+              AND other.period_end = course_metric_summaries.period_end
+              AND other.id > course_metric_summaries.id
+        )
+        """
+    )
+    op.create_index(
+        "uq_course_metric_summary_course_scope",
+        "course_metric_summaries",
+        ["metric_name", "course_id", "period_start", "period_end"],
+        unique=True,
+        postgresql_where=_COURSE_SCOPE,
+        sqlite_where=_COURSE_SCOPE,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_course_metric_summary_course_scope", table_name="course_metric_summaries")
@@ -0,0 +1,29 @@
+"""add leaderboard index on metric_results
+
+Revision ID: f07b9c4e1a38
+Revises: d52e8a3b6f14
+Create Date: 2026-10-19 12:31:52.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f07b9c4e1a38'
+down_revision: Union[str, None] = 'd52e8a3b6f14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_metric_results_leaderboard",
+        "metric_results",
+        ["course_id", "metric_name", "period_start", "period_end", "module_id", "value", "user_id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_metric_results_leaderboard", table_name="metric_results")
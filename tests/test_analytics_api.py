@@ -1,3 +1,5 @@
+import base64
+import json
 from datetime import datetime, timedelta, timezone
 from typing import Generator
 
@@ -12,7 +14,17 @@ from app.main import create_app
 from app.models.base import Base
 from app.models.metric import MetricName, MetricResult
 from app.routers.analytics import authorize_teacher_admin
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
+
+COURSE_1 = "c0000000-0000-4000-8000-000000000001"
+USER_1 = "a0000000-0000-4000-8000-000000000001"
+USER_2 = "a0000000-0000-4000-8000-000000000002"
+USER_3 = "a0000000-0000-4000-8000-000000000003"
+USER_A = "a0000000-0000-4000-8000-00000000000a"
+USER_B = "a0000000-0000-4000-8000-00000000000b"
+USER_C = "a0000000-0000-4000-8000-00000000000c"
+USER_D = "a0000000-0000-4000-8000-00000000000d"
+USER_E = "a0000000-0000-4000-8000-00000000000e"
 
 
 def make_session() -> Session:
@@ -38,6 +50,7 @@ def client() -> Generator[TestClient, None, None]:
             pass
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     app.dependency_overrides[authorize_teacher_admin] = lambda: {"role": "admin"}
     app.state._test_db = db  # type: ignore[attr-defined]
     with TestClient(app) as c:
@@ -50,24 +63,24 @@ def seed_metrics(db: Session, start: datetime, end: datetime):
     entries = [
         MetricResult(
             metric_name=MetricName.RETENTION,
-            user_id="user-1",
-            course_id="course-1",
+            user_id=USER_1,
+            course_id=COURSE_1,
             value=0.8,
             period_start=start,
             period_end=end,
         ),
         MetricResult(
             metric_name=MetricName.RETENTION,
-            user_id="user-2",
-            course_id="course-1",
+            user_id=USER_2,
+            course_id=COURSE_1,
             value=0.6,
             period_start=start,
             period_end=end,
         ),
         MetricResult(
             metric_name=MetricName.ENGAGEMENT,
-            user_id="user-1",
-            course_id="course-1",
+            user_id=USER_1,
+            course_id=COURSE_1,
             value=10.0,
             period_start=start,
             period_end=end,
@@ -84,9 +97,9 @@ def test_get_user_metrics_returns_filtered_results(client: TestClient):
     seed_metrics(db_override, start, end)
 
     resp = client.get(
-        "/api/v1/metrics/user/user-1",
+        f"/api/v1/metrics/user/{USER_1}",
         params={
-            "course_id": "course-1",
+            "course_id": COURSE_1,
             "period_start": start.isoformat(),
             "period_end": end.isoformat(),
         },
@@ -105,7 +118,7 @@ def test_get_course_analytics_returns_aggregates(client: TestClient):
     seed_metrics(db_override, start, end)
 
     resp = client.get(
-        "/api/v1/analytics/course/course-1",
+        f"/api/v1/analytics/course/{COURSE_1}",
         params={
             "period_start": start.isoformat(),
             "period_end": end.isoformat(),
@@ -115,3 +128,324 @@ def test_get_course_analytics_returns_aggregates(client: TestClient):
     data = resp.json()
     agg_map = {item["metric_name"]: item["average_value"] for item in data}
     assert agg_map[MetricName.RETENTION.value] == pytest.approx((0.8 + 0.6) / 2)
+
+
+def test_cohort_metrics_returns_user_metric_matrix(client: TestClient):
+    db_override: Session = client.app.state._test_db  # type: ignore[attr-defined]
+    start = datetime.now(timezone.utc) - timedelta(days=7)
+    end = datetime.now(timezone.utc)
+    seed_metrics(db_override, start, end)
+
+    resp = client.post(
+        "/api/v1/metrics/cohort",
+        json={
+            "course_id": COURSE_1,
+            "period_start": start.isoformat(),
+            "period_end": end.isoformat(),
+            "user_ids": [USER_2, USER_1, USER_3],
+            "metrics": [MetricName.RETENTION.value, MetricName.ENGAGEMENT.value],
+        },
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["user_ids"] == [USER_2, USER_1, USER_3]
+    assert body["metrics"] == [MetricName.RETENTION.value, MetricName.ENGAGEMENT.value]
+    assert body["values"] == [[0.6, None], [0.8, 10.0], [None, None]]
+
+    # UUID в верхнем регистре приводится к каноническому виду, в котором их хранит GUID.
+    upper = client.post(
+        "/api/v1/metrics/cohort",
+        json={
+            "course_id": COURSE_1.upper(),
+            "period_start": start.isoformat(),
+            "period_end": end.isoformat(),
+            "user_ids": [USER_2.upper()],
+            "metrics": [MetricName.RETENTION.value],
+        },
+    ).json()
+    assert upper["course_id"] == COURSE_1 and upper["user_ids"] == [USER_2]
+    assert upper["values"] == [[0.6]]
+
+
+def test_cohort_metrics_without_user_ids_covers_course(client: TestClient):
+    db_override: Session = client.app.state._test_db  # type: ignore[attr-defined]
+    start = datetime.now(timezone.utc) - timedelta(days=7)
+    end = datetime.now(timezone.utc)
+    seed_metrics(db_override, start, end)
+
+    resp = client.post(
+        "/api/v1/metrics/cohort",
+        json={"course_id": COURSE_1, "period_start": start.isoformat(), "period_end": end.isoformat()},
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["user_ids"] == [USER_1, USER_2]
+    assert body["metrics"] == [MetricName.ENGAGEMENT.value, MetricName.RETENTION.value]
+    assert body["values"] == [[10.0, 0.8], [None, 0.6]]
+
+
+def test_course_analytics_supports_conditional_get(client: TestClient):
+    db_override: Session = client.app.state._test_db  # type: ignore[attr-defined]
+    start = datetime.now(timezone.utc) - timedelta(days=7)
+    end = datetime.now(timezone.utc)
+    seed_metrics(db_override, start, end)
+    params = {"period_start": start.isoformat(), "period_end": end.isoformat()}
+
+    first = client.get(f"/api/v1/analytics/course/{COURSE_1}", params=params)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["last-modified"]
+
+    cached = client.get(f"/api/v1/analytics/course/{COURSE_1}", params=params, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert cached.content == b""
+
+    db_override.add(
+        MetricResult(
+            metric_name=MetricName.RETENTION,
+            user_id=USER_3,
+            course_id=COURSE_1,
+            value=0.1,
+            period_start=start,
+            period_end=end,
+        )
+    )
+    db_override.commit()
+    changed = client.get(f"/api/v1/analytics/course/{COURSE_1}", params=params, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_if_modified_since_accepts_unknown_zone_and_ignores_garbage(client: TestClient):
+    db_override: Session = client.app.state._test_db  # type: ignore[attr-defined]
+    start = datetime.now(timezone.utc) - timedelta(days=7)
+    end = datetime.now(timezone.utc)
+    seed_metrics(db_override, start, end)
+    params = {"period_start": start.isoformat(), "period_end": end.isoformat()}
+    url = f"/api/v1/analytics/course/{COURSE_1}"
+    last_modified = client.get(url, params=params).headers["last-modified"]
+
+    # «-0000» разбирается в naive datetime и трактуется как UTC, а не падает 500.
+    unknown_zone = last_modified.replace("GMT", "-0000")
+    assert client.get(url, params=params, headers={"If-Modified-Since": unknown_zone}).status_code == 304
+    older = "Mon, 01 Jan 2001 00:00:00 -0000"
+    assert client.get(url, params=params, headers={"If-Modified-Since": older}).status_code == 200
+    for garbage in ("yesterday", "Mon, 01 Jan 99999 00:00:00 GMT"):
+        assert client.get(url, params=params, headers={"If-Modified-Since": garbage}).status_code == 200
+
+
+def test_user_metrics_etag_is_scoped_to_user(client: TestClient):
+    db_override: Session = client.app.state._test_db  # type: ignore[attr-defined]
+    start = datetime.now(timezone.utc) - timedelta(days=7)
+    end = datetime.now(timezone.utc)
+    seed_metrics(db_override, start, end)
+    params = {"course_id": COURSE_1, "period_start": start.isoformat(), "period_end": end.isoformat()}
+
+    first = client.get(f"/api/v1/metrics/user/{USER_1}", params=params)
+    other = client.get(f"/api/v1/metrics/user/{USER_2}", params=params)
+    assert first.headers["etag"] != other.headers["etag"]
+
+    repeat = client.get(
+        f"/api/v1/metrics/user/{USER_1}", params=params, headers={"If-None-Match": first.headers["etag"]}
+    )
+    assert repeat.status_code == 304
+
+
+def seed_leaderboard(db: Session, start: datetime, end: datetime):
+    values = {USER_A: 0.9, USER_B: 0.5, USER_C: 0.9, USER_D: 0.1, USER_E: 0.7}
+    db.add_all(
+        MetricResult(
+            metric_name=MetricName.COMPLETION,
+            user_id=user_id,
+            course_id=COURSE_1,
+            value=value,
+            period_start=start,
+            period_end=end,
+        )
+        for user_id, value in values.items()
+    )
+    db.commit()
+
+
+def test_leaderboard_keyset_pagination(client: TestClient):
+    db_override: Session = client.app.state._test_db  # type: ignore[attr-defined]
+    start = datetime.now(timezone.utc) - timedelta(days=7)
+    end = datetime.now(timezone.utc)
+    seed_leaderboard(db_override, start, end)
+    params = {
+        "metric": MetricName.COMPLETION.value,
+        "period_start": start.isoformat(),
+        "period_end": end.isoformat(),
+        "limit": 2,
+    }
+
+    seen = []
+    cursor = None
+    while True:
+        page = client.get(
+            f"/api/v1/analytics/course/{COURSE_1}/leaderboard",
+            params={**params, **({"cursor": cursor} if cursor else {})},
+        )
+        assert page.status_code == 200
+        body = page.json()
+        seen.extend((item["user_id"], item["value"]) for item in body["items"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [(USER_C, 0.9), (USER_A, 0.9), (USER_E, 0.7), (USER_B, 0.5), (USER_D, 0.1)]
+
+    bad = client.get(f"/api/v1/analytics/course/{COURSE_1}/leaderboard", params={**params, "cursor": "???"})
+    assert bad.status_code == 400
+    # Курсор корректно декодируется, но user_id в нём не UUID: 400, а не ошибка bind GUID.
+    forged = base64.urlsafe_b64encode(json.dumps([0.5, "nobody"]).encode()).decode().rstrip("=")
+    forged_resp = client.get(f"/api/v1/analytics/course/{COURSE_1}/leaderboard", params={**params, "cursor": forged})
+    assert forged_resp.status_code == 400
+
+
+def test_leaderboard_user_rank_and_percentile(client: TestClient):
+    db_override: Session = client.app.state._test_db  # type: ignore[attr-defined]
+    start = datetime.now(timezone.utc) - timedelta(days=7)
+    end = datetime.now(timezone.utc)
+    seed_leaderboard(db_override, start, end)
+    params = {
+        "metric": MetricName.COMPLETION.value,
+        "period_start": start.isoformat(),
+        "period_end": end.isoformat(),
+    }
+
+    resp = client.get(f"/api/v1/analytics/course/{COURSE_1}/leaderboard/users/{USER_E}", params=params)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert (body["rank"], body["total"]) == (3, 5)
+    assert body["percentile"] == pytest.approx(60.0)
+
+    tied = client.get(f"/api/v1/analytics/course/{COURSE_1}/leaderboard/users/{USER_A}", params=params).json()
+    assert tied["rank"] == 1
+
+    missing = client.get(f"/api/v1/analytics/course/{COURSE_1}/leaderboard/users/{USER_1}", params=params)
+    assert missing.status_code == 404
+    # Не-UUID идентификатор отклоняется на входе, а не ошибкой БД.
+    invalid = client.get(f"/api/v1/analytics/course/{COURSE_1}/leaderboard/users/nobody", params=params)
+    assert invalid.status_code == 422
+
+
+def test_user_metric_series_with_downsampling(client: TestClient):
+    db_override: Session = client.app.state._test_db  # type: ignore[attr-defined]
+    first = datetime(2024, 1, 1)
+    db_override.add_all(
+        MetricResult(
+            metric_name=MetricName.ENGAGEMENT,
+            user_id=USER_1,
+            course_id=COURSE_1,
+            value=float(week),
+            period_start=first + timedelta(weeks=week),
+            period_end=first + timedelta(weeks=week + 1),
+        )
+        for week in range(6)
+    )
+    db_override.commit()
+    params = {
+        "course_id": COURSE_1,
+        "metric": MetricName.ENGAGEMENT.value,
+        "period_from": (first + timedelta(weeks=1)).isoformat(),
+        "period_to": (first + timedelta(weeks=5)).isoformat(),
+    }
+
+    resp = client.get(f"/api/v1/metrics/user/{USER_1}/series", params=params)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["values"] == [1.0, 2.0, 3.0, 4.0]
+    assert body["timestamps"][0] == (first + timedelta(weeks=1)).isoformat()
+
+    sampled = client.get(f"/api/v1/metrics/user/{USER_1}/series", params={**params, "max_points": 2}).json()
+    assert sampled["values"] == [1.5, 3.5]
+    assert len(sampled["timestamps"]) == 2
+
+
+def test_user_metric_series_keeps_one_window_per_period_start(client: TestClient):
+    db_override: Session = client.app.state._test_db  # type: ignore[attr-defined]
+    monday = datetime(2024, 1, 1)
+    # Дневное и недельное скользящие окна начинаются в один момент.
+    db_override.add_all(
+        MetricResult(
+            metric_name=MetricName.ENGAGEMENT,
+            user_id=USER_1,
+            course_id=COURSE_1,
+            value=value,
+            period_start=monday,
+            period_end=monday + length,
+        )
+        for value, length in ((7.0, timedelta(weeks=1)), (1.0, timedelta(days=1)))
+    )
+    db_override.commit()
+    params = {"course_id": COURSE_1, "metric": MetricName.ENGAGEMENT.value}
+
+    default = client.get(f"/api/v1/metrics/user/{USER_1}/series", params=params).json()
+    assert default["values"] == [1.0]
+    weekly = client.get(f"/api/v1/metrics/user/{USER_1}/series", params={**params, "window": "P7D"}).json()
+    assert weekly["values"] == [7.0]
+    assert weekly["timestamps"] == [monday.isoformat()]
+
+
+def test_user_metrics_fast_path_keeps_wire_shape(client: TestClient):
+    from fastapi.encoders import jsonable_encoder
+
+    from app.schemas.metrics import MetricResultOut
+
+    db_override: Session = client.app.state._test_db  # type: ignore[attr-defined]
+    start = datetime(2024, 1, 1)
+    end = datetime(2024, 1, 8, 12, 30)
+    seed_metrics(db_override, start, end)
+
+    resp = client.get(
+        f"/api/v1/metrics/user/{USER_1}",
+        params={"course_id": COURSE_1, "period_start": start.isoformat(), "period_end": end.isoformat()},
+    )
+    assert resp.status_code == 200
+    rows = (
+        db_override.query(MetricResult)
+        .filter(MetricResult.user_id == USER_1)
+        .order_by(MetricResult.period_start, MetricResult.metric_name)
+        .all()
+    )
+    expected = jsonable_encoder([MetricResultOut.from_orm(row) for row in rows])
+    assert sorted(resp.json(), key=lambda item: item["metric_name"]) == sorted(
+        expected, key=lambda item: item["metric_name"]
+    )
+
+
+def test_stale_course_analytics_trigger_single_revalidation(client: TestClient):
+    from app.models.job import CalculationJob
+
+    db_override: Session = client.app.state._test_db  # type: ignore[attr-defined]
+    start = datetime(2024, 1, 1)
+    end = datetime(2024, 1, 8)
+    seed_metrics(db_override, start, end)
+    db_override.query(MetricResult).update(
+        {MetricResult.calculated_at: datetime.utcnow() - timedelta(hours=2)}
+    )
+    db_override.commit()
+    params = {"period_start": start.isoformat(), "period_end": end.isoformat()}
+
+    fresh = client.get(f"/api/v1/analytics/course/{COURSE_1}", params={**params, "max_age": 86400})
+    assert fresh.status_code == 200
+    assert fresh.headers["X-Data-Stale"] == "false"
+    assert "X-Revalidation-Job" not in fresh.headers
+
+    stale = client.get(f"/api/v1/analytics/course/{COURSE_1}", params={**params, "max_age": 60})
+    assert stale.status_code == 200
+    assert stale.json() == fresh.json()
+    assert stale.headers["X-Data-Stale"] == "true"
+    assert int(stale.headers["X-Data-Age"]) >= 7200 - 5
+    job_id = stale.headers["X-Revalidation-Job"]
+
+    again = client.get(
+        f"/api/v1/analytics/course/{COURSE_1}",
+        params={**params, "max_age": 60},
+        headers={"If-None-Match": stale.headers["ETag"]},
+    )
+    assert again.status_code == 304
+    assert again.headers["X-Revalidation-Job"] == job_id
+    assert db_override.query(CalculationJob).count() == 1
@@ -0,0 +1,130 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401
+from app.core.cache import AnalyticsCache, InMemoryRedis, LocalLRUCache, SharedCache, build_analytics_cache
+from app.models.base import Base
+from app.models.metric import MetricName
+from app.repositories.metric_repository import MetricRepository
+from app.services.analytics import AnalyticsService
+
+COURSE_1 = "c0000000-0000-4000-8000-000000000001"
+USER_1 = "a0000000-0000-4000-8000-000000000001"
+
+
+def make_session() -> Session:
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine, autoflush=False, autocommit=False)()
+
+
+class CountingRepo(MetricRepository):
+    def __init__(self, cache):
+        super().__init__(cache=cache)
+        self.reads = 0
+
+    def get_course_aggregates(self, *args, **kwargs):
+        self.reads += 1
+        return super().get_course_aggregates(*args, **kwargs)
+
+
+def test_lru_evicts_by_entries_bytes_and_ttl():
+    cache = LocalLRUCache(max_entries=2, max_bytes=10, ttl_seconds=60)
+    cache.set("a", b"1234")
+    cache.set("b", b"1234")
+    assert cache.get("a") == b"1234"
+    cache.set("c", b"1234")
+    assert cache.get("b") is None  # вытеснен как least recently used
+    cache.set("d", b"12345678")
+    assert cache.stats()["bytes"] <= 10
+    assert cache.get("a") is None
+
+    cache.set("short", b"x", ttl_seconds=0.01)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+
+
+def run_version_invalidation(cache: AnalyticsCache):
+    db = make_session()
+    repo = CountingRepo(cache)
+    service = AnalyticsService(metric_repo=repo, cache=cache)
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=7)
+    repo.upsert_batch(db, MetricName.RETENTION, COURSE_1, start, end, [(USER_1, 1.0)])
+
+    first = service.get_course_aggregates(db, COURSE_1, start, end)
+    second = service.get_course_aggregates(db, COURSE_1, start, end)
+    assert first == second
+    assert repo.reads == 1
+
+    repo.upsert_batch(db, MetricName.RETENTION, COURSE_1, start, end, [(USER_1, 3.0)])
+    (updated,) = service.get_course_aggregates(db, COURSE_1, start, end)
+    assert updated.average_value == 3.0
+    assert repo.reads == 2
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["hit_ratio"] == 1 / 3
+
+
+def test_local_cache_is_invalidated_by_scope_version():
+    run_version_invalidation(AnalyticsCache(LocalLRUCache(max_entries=100, max_bytes=1 << 20, ttl_seconds=60)))
+
+
+def test_shared_cache_is_invalidated_by_scope_version():
+    run_version_invalidation(AnalyticsCache(SharedCache(InMemoryRedis(), ttl_seconds=60)))
+
+
+def test_cache_miss_after_bump_loads_from_primary():
+    cache = AnalyticsCache(SharedCache(InMemoryRedis(), ttl_seconds=60))
+    primary, replica = make_session(), make_session()
+    repo = MetricRepository(cache=cache)
+    service = AnalyticsService(metric_repo=repo, cache=cache)
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=7)
+    # Реплика отстала: на ней ещё значение до записи.
+    repo.upsert_batch(replica, MetricName.RETENTION, COURSE_1, start, end, [(USER_1, 1.0)])
+    repo.upsert_batch(primary, MetricName.RETENTION, COURSE_1, start, end, [(USER_1, 3.0)])
+
+    (fresh,) = service.get_course_aggregates(replica, COURSE_1, start, end, primary_db=primary)
+    (cached,) = service.get_course_aggregates(replica, COURSE_1, start, end, primary_db=primary)
+    assert fresh.average_value == cached.average_value == 3.0
+
+
+def test_version_bump_is_seen_by_uppercase_course_id():
+    cache = AnalyticsCache(LocalLRUCache(max_entries=100, max_bytes=1 << 20, ttl_seconds=60))
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=7)
+    before = cache.version(COURSE_1.upper(), start, end)
+    cache.bump(COURSE_1, start, end)
+    assert cache.version(COURSE_1.upper(), start, end) == cache.version(COURSE_1, start, end) != before
+
+
+def test_local_counters_are_bounded_and_never_go_back():
+    cache = LocalLRUCache(max_entries=2, max_bytes=1 << 20, ttl_seconds=60)
+    for _ in range(3):
+        cache.incr("a")
+    assert cache.incr("b") == 1
+    cache.incr("c")  # вытесняет «a» со значением 3
+    assert cache.stats()["counters"] == 2
+    assert cache.get_counter("a") == 3  # не откатывается к 0
+    assert cache.incr("a") == 4
+    assert cache.get_counter("never-bumped") == 3
+
+
+def test_local_cache_is_rejected_with_several_workers():
+    with pytest.raises(RuntimeError):
+        build_analytics_cache("local", web_concurrency=4)
+    assert build_analytics_cache("none", web_concurrency=4).enabled is False
+    assert build_analytics_cache("local", web_concurrency=1).enabled
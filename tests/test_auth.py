@@ -1,3 +1,5 @@
+import uuid
+from datetime import datetime, timedelta
 from typing import Generator
 
 import pytest
@@ -7,9 +9,12 @@ from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.core.database import get_db
+from app.core.telemetry import REFRESH_PURGE_SECONDS, REFRESH_TOKENS_PURGED
 from app.main import create_app
 from app.models.base import Base
+from app.models.refresh_token import RefreshToken
 from app.models.user import UserRole
+from app.repositories.refresh_token_repository import RefreshTokenRepository
 import app.models  # noqa: F401
 
 
@@ -111,3 +116,53 @@ def test_refresh_token_cannot_be_reused(client: TestClient):
     # new refresh should still work
     second_rotation = client.post("/auth/refresh", json={"refresh_token": second_refresh})
     assert second_rotation.status_code == 200
+
+
+def test_refresh_does_not_purge_and_background_purge_is_chunked(client: TestClient, monkeypatch):
+    payload = {"email": "purge@example.com", "password": "secret123", "role": UserRole.STUDENT.value}
+    register_resp = client.post("/auth/register", json=payload)
+    user_id = register_resp.json()["user"]["id"]
+    now = datetime.utcnow()
+    with TestingSessionLocal() as db:
+        db.add_all(
+            RefreshToken(jti=str(uuid.uuid4()), user_id=user_id, expires_at=now - timedelta(minutes=i + 1))
+            for i in range(7)
+        )
+        db.commit()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("purge must not run on /auth/refresh")
+
+    monkeypatch.setattr(RefreshTokenRepository, "purge_expired", fail)
+    refresh_resp = client.post("/auth/refresh", json={"refresh_token": register_resp.json()["refresh_token"]})
+    assert refresh_resp.status_code == 200
+    monkeypatch.undo()
+
+    repo = RefreshTokenRepository()
+    purged_before, runs_before = REFRESH_TOKENS_PURGED.value(), REFRESH_PURGE_SECONDS.count()
+    with TestingSessionLocal() as db:
+        assert repo.purge_expired(db, batch_size=3, pause_seconds=0) == 7
+        # Остались только действующие: отозванный при ротации и новый.
+        assert db.query(RefreshToken).count() == 2
+    assert repo.purge_stats.snapshot()["rows_purged"] == 7
+    assert REFRESH_TOKENS_PURGED.value() - purged_before == 7
+    assert REFRESH_PURGE_SECONDS.count() - runs_before == 1
+
+
+def test_rotation_is_single_use_and_flags_reuse(client: TestClient):
+    payload = {"email": "race@example.com", "password": "secret123", "role": UserRole.STUDENT.value}
+    user_id = client.post("/auth/register", json=payload).json()["user"]["id"]
+    jti = str(uuid.uuid4())
+    expires_at = datetime.utcnow() + timedelta(days=1)
+    repo = RefreshTokenRepository()
+    with TestingSessionLocal() as db:
+        repo.create(db, jti=jti, user_id=user_id, expires_at=expires_at)
+
+    with TestingSessionLocal() as first, TestingSessionLocal() as second:
+        assert repo.rotate(first, jti=jti, user_id=user_id, new_jti=str(uuid.uuid4()), expires_at=expires_at)
+        assert not repo.rotate(second, jti=jti, user_id=user_id, new_jti=str(uuid.uuid4()), expires_at=expires_at)
+
+    with TestingSessionLocal() as db:
+        # Исходный + регистрационный + ровно один выпущенный при ротации.
+        assert db.query(RefreshToken).filter(RefreshToken.user_id == user_id).count() == 3
+    assert repo.reuse_detected == 1
@@ -0,0 +1,192 @@
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401
+from app.models.base import Base
+from app.models.job import CalculationJob, JobPriority, JobStatus
+from app.models.metric import MetricName, MetricResult
+from app.repositories.metric_repository import MetricRepository
+from app.services.jobs import CalculationJobQueue
+from app.services.metrics import MetricsEngine
+
+COURSE_1 = "c0000000-0000-4000-8000-000000000001"
+DASHBOARD_COURSE = "c0000000-0000-4000-8000-000000000009"
+NIGHTLY_COURSE = "c0000000-0000-4000-8000-000000000008"
+USER_1 = "a0000000-0000-4000-8000-000000000001"
+
+
+class StubCHRepo:
+    def __init__(self, fail_on: MetricName | None = None):
+        self.fail_on = fail_on
+        self.calls: List[Tuple[MetricName, str]] = []
+
+    async def fetch_metric(self, metric, start, end, course_id):
+        self.calls.append((metric, course_id))
+        if metric == self.fail_on:
+            raise RuntimeError("clickhouse unavailable")
+        return [(USER_1, 0.5)]
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+
+def make_queue(session_factory, ch_repo: StubCHRepo, node_id: str = "node-a", **kwargs) -> CalculationJobQueue:
+    engine = MetricsEngine(ch_repo=ch_repo, metric_repo=MetricRepository())
+    return CalculationJobQueue(
+        engine_provider=lambda: engine,
+        session_factory=session_factory,
+        concurrency=0,
+        node_id=node_id,
+        **kwargs,
+    )
+
+
+@pytest.mark.anyio
+async def test_duplicate_submissions_are_coalesced(session_factory):
+    queue = make_queue(session_factory, StubCHRepo())
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=7)
+
+    with session_factory() as db:
+        first, created = queue.submit(db, COURSE_1, start, end, [MetricName.RETENTION, MetricName.COMPLETION])
+        second, created_again = queue.submit(db, COURSE_1, start, end, [MetricName.COMPLETION, MetricName.RETENTION])
+        other, _ = queue.submit(db, COURSE_1, start, end, [MetricName.RETENTION])
+        first_id = first.id
+        assert created and not created_again
+        assert second.id == first_id
+        assert other.id != first_id
+
+    assert await queue.run_once()
+    with session_factory() as db:
+        job = queue.repo.get(db, first_id)
+        assert job.status == JobStatus.SUCCEEDED.value
+        assert job.progress == pytest.approx(1.0)
+        # После завершения тот же scope снова ставится новым заданием.
+        rerun, created = queue.submit(db, COURSE_1, start, end, [MetricName.RETENTION, MetricName.COMPLETION])
+        assert created and rerun.id != first_id
+
+
+@pytest.mark.anyio
+async def test_interactive_jobs_run_before_batch(session_factory):
+    ch_repo = StubCHRepo()
+    queue = make_queue(session_factory, ch_repo)
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=7)
+
+    with session_factory() as db:
+        queue.submit(db, NIGHTLY_COURSE, start, end, [MetricName.RETENTION], priority=JobPriority.BATCH)
+        queue.submit(db, DASHBOARD_COURSE, start, end, [MetricName.RETENTION])
+
+    while await queue.run_once():
+        pass
+    assert [course for _, course in ch_repo.calls] == [DASHBOARD_COURSE, NIGHTLY_COURSE]
+
+
+@pytest.mark.anyio
+async def test_failed_job_records_error(session_factory):
+    queue = make_queue(session_factory, StubCHRepo(fail_on=MetricName.COMPLETION))
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=7)
+
+    with session_factory() as db:
+        job, _ = queue.submit(db, COURSE_1, start, end, [MetricName.RETENTION, MetricName.COMPLETION])
+
+    assert await queue.run_once()
+    with session_factory() as db:
+        failed = queue.repo.get(db, job.id)
+        assert failed.status == JobStatus.FAILED.value
+        assert "clickhouse unavailable" in failed.error
+        assert failed.progress == pytest.approx(0.5)
+        assert db.query(MetricResult).count() == 1
+
+
+@pytest.mark.anyio
+async def test_expired_lease_is_reclaimed_by_another_node(session_factory):
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=7)
+    dead = make_queue(session_factory, StubCHRepo(), node_id="node-dead", lease_seconds=30)
+    alive_ch = StubCHRepo()
+    alive = make_queue(session_factory, alive_ch, node_id="node-alive")
+
+    with session_factory() as db:
+        job, _ = dead.submit(db, COURSE_1, start, end, [MetricName.RETENTION])
+        job_id = job.id
+        # Узел взял задание и умер, не продлив аренду.
+        assert dead.repo.claim_next(db, "node-dead", lease_seconds=30, max_attempts=3).id == job_id
+        assert alive.repo.claim_next(db, "node-alive", lease_seconds=30, max_attempts=3) is None
+        db.query(CalculationJob).filter(CalculationJob.id == job_id).update(
+            {CalculationJob.lease_expires_at: datetime.utcnow() - timedelta(seconds=1)}
+        )
+        db.commit()
+
+    assert await alive.run_once()
+    assert alive_ch.calls == [(MetricName.RETENTION, COURSE_1)]
+    with session_factory() as db:
+        reclaimed = alive.repo.get(db, job_id)
+        assert reclaimed.status == JobStatus.SUCCEEDED.value
+        assert reclaimed.owner == "node-alive"
+        assert reclaimed.attempts == 2
+        # Запоздавший прежний владелец не может ни продлить, ни завершить задание.
+        assert not dead.repo.renew(db, job_id, "node-dead", 1, lease_seconds=30)
+        assert not dead.repo.finish(db, job_id, "node-dead", 1, error="late")
+
+
+@pytest.mark.anyio
+async def test_lost_lease_stops_writing_results(session_factory):
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=7)
+
+    class TakeoverCHRepo(StubCHRepo):
+        async def fetch_metric(self, metric, start, end, course_id):
+            with session_factory() as other:
+                other.query(CalculationJob).update({CalculationJob.owner: "node-b"})
+                other.commit()
+            return await super().fetch_metric(metric, start, end, course_id)
+
+    queue = make_queue(session_factory, TakeoverCHRepo())
+    with session_factory() as db:
+        job, _ = queue.submit(db, COURSE_1, start, end, [MetricName.RETENTION, MetricName.COMPLETION])
+        job_id = job.id
+
+    assert await queue.run_once()
+    with session_factory() as db:
+        taken = queue.repo.get(db, job_id)
+        assert taken.status == JobStatus.RUNNING.value
+        assert taken.owner == "node-b"
+        assert len(queue.engine_provider().ch_repo.calls) == 1
+        # Аренду перехватили во время скана: его результаты не записываются.
+        assert db.query(MetricResult).count() == 0
+
+
+@pytest.mark.anyio
+async def test_sibling_reclaim_in_same_process_fences_previous_attempt(session_factory):
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=7)
+    queue = make_queue(session_factory, StubCHRepo())
+
+    with session_factory() as db:
+        job, _ = queue.submit(db, COURSE_1, start, end, [MetricName.RETENTION])
+        job_id = job.id
+        assert queue.repo.claim_next(db, "node-a", lease_seconds=30, max_attempts=3).attempts == 1
+        db.query(CalculationJob).filter(CalculationJob.id == job_id).update(
+            {CalculationJob.lease_expires_at: datetime.utcnow() - timedelta(seconds=1)}
+        )
+        db.commit()
+        # Тот же node_id (другой воркер процесса) забирает задание с истёкшей арендой.
+        assert queue.repo.claim_next(db, "node-a", lease_seconds=30, max_attempts=3).attempts == 2
+
+        assert not queue.repo.holds_lease(db, job_id, "node-a", 1)
+        assert not queue.repo.renew(db, job_id, "node-a", 1, lease_seconds=30)
+        assert not queue.repo.set_progress(db, job_id, "node-a", 1, 0.5)
+        assert not queue.repo.finish(db, job_id, "node-a", 1)
+        assert queue.repo.finish(db, job_id, "node-a", 2)
+        assert queue.repo.get(db, job_id).status == JobStatus.SUCCEEDED.value
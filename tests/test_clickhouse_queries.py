@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+
+import httpx
+import pytest
+
+from app.core.clickhouse import ClickHouseQueryLog, QueryStats, parse_query_stats, query_log
+from app.core.logging import job_id_var, request_id_var
+from app.models.metric import MetricName
+from app.repositories.metric_ch_repository import ClickHouseMetricRepository
+
+START = datetime(2024, 9, 1)
+END = datetime(2024, 9, 8)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def clean_query_log():
+    query_log.clear()
+    yield
+    query_log.clear()
+
+
+def test_parse_query_stats_prefers_statistics_block():
+    payload = {"rows": 2, "statistics": {"elapsed": 0.25, "rows_read": 1000, "bytes_read": 64000}}
+    headers = {"X-ClickHouse-Summary": json.dumps({"read_rows": "1", "read_bytes": "1"})}
+    assert parse_query_stats(headers, payload) == QueryStats(1000, 64000, 0.25, 2)
+
+
+def test_parse_query_stats_falls_back_to_summary_header():
+    summary = {"read_rows": "500", "read_bytes": "4096", "elapsed_ns": "1500000000", "result_rows": "3"}
+    stats = parse_query_stats({"X-ClickHouse-Summary": json.dumps(summary)})
+    assert stats == QueryStats(500, 4096, 1.5, 3)
+    assert parse_query_stats({}) == QueryStats(0, 0, 0.0, 0)
+
+
+@pytest.mark.anyio
+async def test_fetch_metric_tags_query_and_records_stats():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(dict(request.url.params))
+        return httpx.Response(
+            200,
+            json={
+                "data": [{"user_id": "u1", "value": 1}],
+                "rows": 1,
+                "statistics": {"elapsed": 0.01, "rows_read": 300, "bytes_read": 9000},
+            },
+        )
+
+    client = httpx.AsyncClient(base_url="http://clickhouse", transport=httpx.MockTransport(handler))
+    repo = ClickHouseMetricRepository(client_provider=lambda: client)
+    token = request_id_var.set("req-1")
+    try:
+        rows = await repo.fetch_metric(MetricName.RETENTION, START, END, "course-1")
+    finally:
+        request_id_var.reset(token)
+        await client.aclose()
+
+    assert rows == [("u1", 1.0)]
+    # Клиентский X-Request-ID получает серверный суффикс и не заменяет чужие сканы.
+    prefix = "metric:retention:course-1:20240901T000000-20240908T000000:req-1:"
+    assert seen[0]["query_id"].startswith(prefix) and len(seen[0]["query_id"]) == len(prefix) + 8
+    assert "replace_running_query" not in seen[0]
+    [scope] = query_log.top()
+    assert scope["metric"] == "retention" and scope["course_id"] == "course-1"
+    assert scope["queries"] == 1 and scope["rows_read"] == 300 and scope["bytes_read"] == 9000
+
+
+@pytest.mark.anyio
+async def test_job_scans_use_deterministic_replaceable_query_id():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(dict(request.url.params))
+        return httpx.Response(200, json={"data": []})
+
+    client = httpx.AsyncClient(base_url="http://clickhouse", transport=httpx.MockTransport(handler))
+    repo = ClickHouseMetricRepository(client_provider=lambda: client)
+    request_token = request_id_var.set("job-j1")  # клиент может прислать такой же X-Request-ID
+    try:
+        await repo.fetch_metric(MetricName.RETENTION, START, END, "course-1")
+        job_token = job_id_var.set("j1")
+        try:
+            await repo.fetch_metric(MetricName.RETENTION, START, END, "course-1")
+            await repo.fetch_metric(MetricName.RETENTION, START, END, "course-1")
+        finally:
+            job_id_var.reset(job_token)
+    finally:
+        request_id_var.reset(request_token)
+        await client.aclose()
+
+    job_query_id = "metric:retention:course-1:20240901T000000-20240908T000000:job-j1"
+    assert seen[0]["query_id"] != job_query_id and "replace_running_query" not in seen[0]
+    assert [params["query_id"] for params in seen[1:]] == [job_query_id, job_query_id]
+    assert all(params["replace_running_query"] == "1" for params in seen[1:])
+
+
+@pytest.mark.anyio
+async def test_cancelled_query_is_killed_on_server():
+    started = asyncio.Event()
+    killed = []
+
+    sent = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        query = request.url.params["query"]
+        if query.startswith("KILL QUERY"):
+            killed.append(query)
+            return httpx.Response(200, text="")
+        sent.append(request.url.params["query_id"])
+        started.set()
+        await asyncio.sleep(10)
+        return httpx.Response(200, json={"data": []})
+
+    client = httpx.AsyncClient(base_url="http://clickhouse", transport=httpx.MockTransport(handler))
+    repo = ClickHouseMetricRepository(client_provider=lambda: client)
+    task = asyncio.create_task(repo.fetch_metric(MetricName.COMPLETION, START, END, "course-2"))
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    for _ in range(10):
+        if killed:
+            break
+        await asyncio.sleep(0)
+    await client.aclose()
+
+    assert sent[0].startswith("metric:completion_rate:course-2:20240901T000000-20240908T000000:none:")
+    assert killed == [f"KILL QUERY WHERE query_id = '{sent[0]}' ASYNC"]
+
+
+def test_query_log_bounds_scopes_and_logs_slow_queries(caplog):
+    log = ClickHouseQueryLog(max_scopes=2, slow_query_seconds=1.0)
+    with caplog.at_level(logging.WARNING, logger="app.core.clickhouse"):
+        log.record("retention", "c1", "q1", QueryStats(10, 100, 0.1, 1))
+        log.record("retention", "c2", "q2", QueryStats(10, 300, 2.5, 1))
+        log.record("retention", "c3", "q3", QueryStats(10, 200, 0.1, 1))
+
+    assert [scope["course_id"] for scope in log.top()] == ["c2", "c3"]
+    assert [record.getMessage().split(":")[0] for record in caplog.records] == ["Slow ClickHouse query q2"]
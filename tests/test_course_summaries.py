@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401
+from app.core.sketch import QuantileSketch
+from app.models.base import Base
+from app.models.metric import CourseMetricSummary, MetricName, MetricResult
+from app.repositories.metric_repository import MetricRepository
+
+COURSE_1 = "c0000000-0000-4000-8000-000000000001"
+USER_1 = "a0000000-0000-4000-8000-000000000001"
+USER_2 = "a0000000-0000-4000-8000-000000000002"
+USER_3 = "a0000000-0000-4000-8000-000000000003"
+MODULE_1 = "d0000000-0000-4000-8000-000000000001"
+
+
+def make_session() -> Session:
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine, autoflush=False, autocommit=False)()
+
+
+def test_sketch_quantiles_are_close_to_exact():
+    values = [float(v) for v in range(1001)]
+    sketch = QuantileSketch.from_json(QuantileSketch.from_values(values, max_centroids=32).to_json())
+    assert len(sketch.centroids) <= 32
+    assert sketch.quantile(0.0) == 0.0
+    assert sketch.quantile(1.0) == 1000.0
+    assert sketch.quantile(0.5) == pytest.approx(500.0, abs=20.0)
+    assert sketch.quantile(0.9) == pytest.approx(900.0, abs=20.0)
+
+
+def test_upsert_maintains_summary_with_replacement():
+    db = make_session()
+    repo = MetricRepository()
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=7)
+
+    repo.upsert_batch(db, MetricName.RETENTION, COURSE_1, start, end, [(USER_1, 1.0), (USER_2, 3.0)])
+    repo.upsert_batch(db, MetricName.RETENTION, COURSE_1, start, end, [(USER_2, 5.0), (USER_3, 0.0)])
+
+    summary = db.query(CourseMetricSummary).one()
+    assert summary.count == 3
+    assert summary.value_sum == pytest.approx(6.0)
+    assert summary.value_sum_sq == pytest.approx(26.0)
+    assert (summary.min_value, summary.max_value) == (0.0, 5.0)
+
+    (aggregate,) = repo.get_course_aggregates(db, COURSE_1, start, end)
+    assert aggregate.metric_name == MetricName.RETENTION
+    assert aggregate.average_value == pytest.approx(2.0)
+    assert aggregate.count == 3
+    assert aggregate.stddev == pytest.approx((26.0 / 3 - 4.0) ** 0.5)
+    assert aggregate.p50 == pytest.approx(1.0)
+
+
+def test_aggregates_filter_metrics_from_summaries():
+    db = make_session()
+    repo = MetricRepository()
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=7)
+    repo.upsert_batch(db, MetricName.RETENTION, COURSE_1, start, end, [(USER_1, 1.0)])
+    repo.upsert_batch(db, MetricName.ENGAGEMENT, COURSE_1, start, end, [(USER_1, 4.0)])
+
+    aggregates = repo.get_course_aggregates(db, COURSE_1, start, end, metrics=[MetricName.ENGAGEMENT])
+    assert [a.metric_name for a in aggregates] == [MetricName.ENGAGEMENT]
+    assert aggregates[0].average_value == pytest.approx(4.0)
+
+
+def test_fallback_covers_each_metric_without_summary_at_course_scope():
+    db = make_session()
+    repo = MetricRepository()
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=7)
+    repo.upsert_batch(db, MetricName.RETENTION, COURSE_1, start, end, [(USER_1, 1.0)])
+    # Записи в обход репозитория: без сводки, часть — на уровне модуля.
+    db.add_all(
+        [
+            MetricResult(metric_name=MetricName.ENGAGEMENT, user_id=USER_1, course_id=COURSE_1,
+                         value=2.0, period_start=start, period_end=end),
+            MetricResult(metric_name=MetricName.ENGAGEMENT, user_id=USER_2, course_id=COURSE_1,
+                         module_id=MODULE_1, value=100.0, period_start=start, period_end=end),
+        ]
+    )
+    db.commit()
+
+    aggregates = {a.metric_name: a for a in repo.get_course_aggregates(db, COURSE_1, start, end)}
+    assert set(aggregates) == {MetricName.RETENTION, MetricName.ENGAGEMENT}
+    assert aggregates[MetricName.ENGAGEMENT].count == 1
+    assert aggregates[MetricName.ENGAGEMENT].average_value == pytest.approx(2.0)
+
+    count, _ = repo.get_scope_validator(db, COURSE_1, start, end)
+    assert count == 1 + 2  # сводка retention + строки engagement
+
+
+def test_course_scope_summary_is_unique_despite_null_module():
+    db = make_session()
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=7)
+    for _ in range(2):
+        db.add(CourseMetricSummary(metric_name=MetricName.RETENTION, course_id=COURSE_1,
+                                   period_start=start, period_end=end))
+    with pytest.raises(IntegrityError):
+        db.commit()
@@ -0,0 +1,39 @@
+from app.core import database as db_module
+from app.core.database import ReadReplicaRouter
+
+
+def make_router(monkeypatch, lags):
+    router = ReadReplicaRouter(
+        replica_urls=["sqlite://", "sqlite://"],
+        max_lag_seconds=5.0,
+        lag_check_interval_seconds=0.0,
+    )
+    lag_by_url = dict(zip([id(r) for r in router._replicas], lags))
+    monkeypatch.setattr(ReadReplicaRouter, "_measure_lag", staticmethod(lambda r: lag_by_url[id(r)]))
+    return router
+
+
+def test_router_round_robins_fresh_replicas(monkeypatch):
+    router = make_router(monkeypatch, [0.0, 1.0])
+    picked = {id(router._pick()) for _ in range(4)}
+    assert picked == {id(r) for r in router._replicas}
+
+
+def test_router_skips_lagging_and_unavailable_replicas(monkeypatch):
+    router = make_router(monkeypatch, [30.0, None])
+    assert router._pick() is None
+
+    session = router.session()
+    try:
+        assert session.get_bind() is db_module.engine
+    finally:
+        session.close()
+
+
+def test_router_without_replicas_uses_primary():
+    router = ReadReplicaRouter(replica_urls=[], max_lag_seconds=5.0, lag_check_interval_seconds=1.0)
+    session = router.session()
+    try:
+        assert session.get_bind() is db_module.engine
+    finally:
+        session.close()
@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from typing import Generator
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401
+from app.core.database import get_read_session_factory
+from app.main import create_app
+from app.models.base import Base
+from app.models.metric import MetricName
+from app.repositories.metric_repository import MetricRepository
+from app.routers.analytics import authorize_admin
+from app.services.export import MetricExportService
+
+COURSE_1 = "c0000000-0000-4000-8000-000000000001"
+COURSE_2 = "c0000000-0000-4000-8000-000000000002"
+USER_9 = "a0000000-0000-4000-8000-000000000009"
+USER_IDS = [f"a0000000-0000-4000-8000-00000000000{i}" for i in range(5)]
+
+START = datetime(2024, 1, 1)
+END = START + timedelta(days=7)
+
+
+@pytest.fixture
+def db() -> Generator[Session, None, None]:
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, autoflush=False, autocommit=False)()
+    repo = MetricRepository()
+    rows = [(user_id, i / 10) for i, user_id in enumerate(USER_IDS)]
+    repo.upsert_batch(session, MetricName.RETENTION, COURSE_1, START, END, rows)
+    repo.upsert_batch(session, MetricName.RETENTION, COURSE_2, START, END, [(USER_9, 1.0)])
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def test_csv_export_streams_in_chunks(db: Session):
+    chunks = list(MetricExportService().stream(db, "csv", course_id=COURSE_1, chunk_size=2))
+    assert len(chunks) == 3
+
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+    assert len(rows) == 5
+    assert {row["user_id"] for row in rows} == set(USER_IDS)
+    assert rows[0]["metric_name"] == MetricName.RETENTION.value
+    assert rows[0]["period_start"] == START.isoformat()
+
+
+def test_ndjson_export_endpoint(db: Session):
+    application = create_app()
+    application.dependency_overrides[get_read_session_factory] = lambda: lambda: db
+    application.dependency_overrides[authorize_admin] = lambda: {"role": "admin"}
+    with TestClient(application) as client:
+        resp = client.get(
+            "/api/v1/metrics/export",
+            params={"format": "ndjson", "period_from": START.isoformat(), "period_to": END.isoformat()},
+        )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert len(lines) == 6
+    assert {line["course_id"] for line in lines} == {COURSE_1, COURSE_2}
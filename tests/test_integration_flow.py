@@ -1,6 +1,8 @@
 from datetime import datetime, timedelta, timezone
 from typing import Generator, List
 
+import anyio
+
 import pytest
 from httpx import AsyncClient
 from sqlalchemy import create_engine
@@ -13,13 +15,14 @@ from app.core.database import get_db
 from app.main import create_app
 from app.models.base import Base
 from app.models.metric import MetricName, MetricResult
-from app.repositories.metric_repository import MetricRepository
+from app.repositories.metric_repository import CourseAggregate, MetricRepository
 from app.routers import metrics as metrics_router
 from app.routers import analytics as analytics_router
 from app.routers.events import get_collector_service
 from app.schemas.events import EventIn
 from app.services.event_collector import EventCollectorService
 from app.services.analytics import AnalyticsService
+from app.services.jobs import CalculationJobQueue
 from app.services.metrics import MetricsEngine
 
 
@@ -49,7 +52,9 @@ class MemoryMetricRepo:
     def __init__(self):
         self.rows = []
 
-    def upsert_batch(self, db, metric_name, course_id, period_start, period_end, rows):
+    def upsert_batch(self, db, metric_name, course_id, period_start, period_end, rows, guard=None):
+        if guard is not None:
+            guard(db)
         for user_id, value in rows:
             existing = next(
                 (
@@ -89,6 +94,9 @@ class MemoryMetricRepo:
         ]
         return [MetricResult(**r) for r in filtered]
 
+    def get_scope_validator(self, db, course_id, period_start, period_end, metrics=None, user_id=None):
+        return len(self.rows), None
+
     def get_course_aggregates(self, db, course_id, period_start, period_end, metrics=None):
         filtered = [
             r
@@ -101,7 +109,7 @@ class MemoryMetricRepo:
         agg = {}
         for r in filtered:
             agg.setdefault(r["metric_name"], []).append(r["value"])
-        return [(name, sum(vals) / len(vals)) for name, vals in agg.items()]
+        return [CourseAggregate(name, sum(vals) / len(vals)) for name, vals in agg.items()]
 
 
 @pytest.fixture
@@ -140,19 +148,29 @@ def app_with_overrides() -> Generator:
         metric_repo=metric_repo,
     )
     analytics_router.analytics_service = AnalyticsService(metric_repo=metric_repo)
+    original_queue = metrics_router.job_queue
+    metrics_router.job_queue = CalculationJobQueue(
+        engine_provider=lambda: metrics_router.engine,
+        session_factory=SessionLocal,
+        concurrency=1,
+        poll_interval_seconds=0.05,
+    )
     app.state.metric_repo = metric_repo  # type: ignore[attr-defined]
 
     try:
         yield app
     finally:
         metrics_router.engine = original_engine
+        metrics_router.job_queue = original_queue
         app.dependency_overrides.clear()
 
 
 @pytest.mark.anyio
 async def test_full_flow_auth_events_metrics_analytics(app_with_overrides):
     app = app_with_overrides
-    async with AsyncClient(app=app, base_url="http://test") as client:
+    # AsyncClient не выполняет lifespan: пул воркеров очереди поднимаем сами, как это делает lifespan.
+    async with anyio.create_task_group() as background, AsyncClient(app=app, base_url="http://test") as client:
+        await background.start(metrics_router.job_queue.serve)
         # Register admin and obtain token
         reg_resp = await client.post(
             "/auth/register",
@@ -211,6 +229,17 @@ async def test_full_flow_auth_events_metrics_analytics(app_with_overrides):
         )
         assert calc_resp.status_code == 202
         assert MetricName.RETENTION.value in calc_resp.json()["calculated"]
+        job_id = calc_resp.json()["job_id"]
+
+        for _ in range(100):
+            job_resp = await client.get(f"/api/v1/metrics/jobs/{job_id}")
+            assert job_resp.status_code == 200
+            if job_resp.json()["status"] in ("succeeded", "failed"):
+                break
+            await anyio.sleep(0.02)
+        assert job_resp.json()["status"] == "succeeded"
+        assert job_resp.json()["progress"] == pytest.approx(1.0)
+        await metrics_router.job_queue.stop()
         # Data persisted in in-memory metric repo?
         assert len(app.state.metric_repo.rows) > 0  # type: ignore[attr-defined]
 
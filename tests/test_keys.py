@@ -0,0 +1,77 @@
+import ecdsa
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+
+import app.routers.keys as keys_router
+from app.core.keys import KeyRing
+from app.main import create_app
+
+
+def make_pem() -> str:
+    return ecdsa.SigningKey.generate(curve=ecdsa.NIST256p).to_pem().decode()
+
+
+@pytest.fixture
+def key_files(tmp_path):
+    paths = []
+    for name in ("current.pem", "next.pem"):
+        path = tmp_path / name
+        path.write_text(make_pem())
+        paths.append(str(path))
+    return paths
+
+
+def test_tokens_carry_kid_and_survive_rotation(key_files):
+    changes = []
+    ring = KeyRing(algorithm="ES256", secret_key="unused", key_files=key_files[:1], on_change=lambda: changes.append(1))
+    old_token = ring.sign({"sub": "user-1", "exp": 4102444800})
+    old_kid = jwt.get_unverified_header(old_token)["kid"]
+    assert old_kid == ring.active_kid
+    assert ring.verify(old_token)["sub"] == "user-1"
+
+    # Шаг 1 ротации: новый ключ становится активным, старый остаётся для проверки.
+    ring.key_files = [key_files[1], key_files[0]]
+    assert ring.reload()
+    new_token = ring.sign({"sub": "user-1", "exp": 4102444800})
+    assert jwt.get_unverified_header(new_token)["kid"] != old_kid
+    assert ring.verify(old_token) and ring.verify(new_token)
+    assert not ring.reload()
+
+    # Шаг 2: старый ключ изъят — его токены больше не принимаются.
+    ring.key_files = key_files[1:]
+    ring.reload()
+    assert ring.verify(old_token) is None
+    assert ring.verify(new_token)["sub"] == "user-1"
+    assert len(changes) == 3
+
+
+def test_symmetric_tokens_rejected_by_asymmetric_ring(key_files):
+    hs_token = jwt.encode({"sub": "user-1", "exp": 4102444800}, "secret", algorithm="HS256")
+    strict = KeyRing(algorithm="ES256", secret_key="secret", key_files=key_files[:1])
+    migrating = KeyRing(algorithm="ES256", secret_key="secret", key_files=key_files[:1], accept_hs256=True)
+
+    assert strict.verify(hs_token) is None
+    assert migrating.verify(hs_token)["sub"] == "user-1"
+    with pytest.raises(ValueError):
+        KeyRing(algorithm="EdDSA")
+
+
+def test_jwks_endpoint_publishes_public_keys_only(key_files, monkeypatch):
+    ring = KeyRing(algorithm="ES256", secret_key="unused", key_files=key_files)
+    monkeypatch.setattr(keys_router, "key_ring", ring)
+    client = TestClient(create_app())
+
+    response = client.get("/.well-known/jwks.json")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"].startswith("public, max-age=")
+    keys = response.json()["keys"]
+    assert [key["kid"] for key in keys] == ring.kids
+    assert all(key["alg"] == "ES256" and "d" not in key for key in keys)
+
+    token = ring.sign({"sub": "user-1", "exp": 4102444800})
+    # Сервис-сосед проверяет токен по опубликованному JWKS без обращения к API.
+    assert jwt.decode(token, response.json(), algorithms=["ES256"])["sub"] == "user-1"
+
+    cached = client.get("/.well-known/jwks.json", headers={"If-None-Match": response.headers["ETag"]})
+    assert cached.status_code == 304
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401
+from app.core.cache import scope_key
+from app.core.pubsub import UpdateBroker
+from app.models.base import Base
+from app.models.metric import MetricName
+from app.repositories.metric_repository import MetricRepository
+from app.services.updates import stream_updates
+
+COURSE_1 = "c0000000-0000-4000-8000-000000000001"
+COURSE_2 = "c0000000-0000-4000-8000-000000000002"
+USER_1 = "a0000000-0000-4000-8000-000000000001"
+
+START = datetime(2024, 1, 1)
+END = START + timedelta(days=7)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.mark.anyio
+async def test_commit_publishes_to_scope_subscribers():
+    broker = UpdateBroker(max_buffer=10)
+    subscription = broker.subscribe([scope_key(COURSE_1, START, END)])
+    other = broker.subscribe([scope_key(COURSE_2, START, END)])
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        repo = MetricRepository(updates=broker)
+        # Запись из другого потока, как у sync-роутов и воркеров.
+        writer = threading.Thread(
+            target=repo.upsert_batch, args=(db, MetricName.RETENTION, COURSE_1, START, END, [(USER_1, 0.5)])
+        )
+        writer.start()
+        writer.join()
+
+    messages = await subscription.get(timeout=1)
+    assert [(m["course_id"], m["metric_name"]) for m in messages] == [(COURSE_1, MetricName.RETENTION)]
+    assert await other.get(timeout=0.01) == []
+
+
+@pytest.mark.anyio
+async def test_slow_consumer_is_evicted():
+    broker = UpdateBroker(max_buffer=2)
+    topic = scope_key(COURSE_1, START, END)
+    slow = broker.subscribe([topic])
+
+    for i in range(3):
+        broker.publish(topic, {"course_id": COURSE_1, "n": i})
+
+    assert await slow.get(timeout=0.01) is None
+    assert broker.stats() == {"subscribers": 0, "topics": 0, "evictions": 1}
+    assert broker.publish(topic, {"course_id": COURSE_1}) == 0
+
+
+@pytest.mark.anyio
+async def test_stream_emits_sse_events_and_keepalives():
+    broker = UpdateBroker(max_buffer=10)
+    topic = scope_key(COURSE_1, START, END)
+    disconnected = asyncio.Event()
+
+    async def is_disconnected() -> bool:
+        return disconnected.is_set()
+
+    async def load_aggregates(message):
+        return [{"metric_name": "retention", "average_value": 0.5}]
+
+    stream = stream_updates(
+        lambda: broker.subscribe([topic]), is_disconnected, keepalive_seconds=0.01, load_aggregates=load_aggregates
+    )
+    # Поток, который так и не начали читать, не держит подписку.
+    assert broker.stats()["subscribers"] == 0
+    assert await stream.__anext__() == b"retry: 3000\n\n"
+    assert broker.stats()["subscribers"] == 1
+    assert await stream.__anext__() == b": keepalive\n\n"
+
+    broker.publish(topic, {"course_id": COURSE_1, "metric_name": "retention"})
+    broker.publish(topic, {"course_id": COURSE_1, "metric_name": "completion_rate"})
+    event = (await stream.__anext__()).decode()
+    lines = event.strip().split("\n")
+    assert lines[:2] == ["id: 1", "event: metrics_updated"]
+    payload = json.loads(lines[2][len("data: "):])
+    assert payload["metric_name"] == "completion_rate"
+    assert payload["aggregates"] == [{"metric_name": "retention", "average_value": 0.5}]
+
+    disconnected.set()
+    with pytest.raises(StopAsyncIteration):
+        await stream.__anext__()
+    assert broker.stats()["subscribers"] == 0
@@ -2,8 +2,10 @@ from datetime import datetime, timedelta, timezone
 from typing import Generator, Iterable, List, Tuple
 
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import StatementError
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
 
 import app.models  # noqa: F401
 from app.models.base import Base
@@ -11,6 +13,10 @@ from app.models.metric import MetricName, MetricResult
 from app.repositories.metric_repository import MetricRepository
 from app.services.metrics import MetricsEngine
 
+COURSE_1 = "c0000000-0000-4000-8000-000000000001"
+USER_1 = "a0000000-0000-4000-8000-000000000001"
+USER_2 = "a0000000-0000-4000-8000-000000000002"
+
 
 class StubCHRepo:
     def __init__(self):
@@ -24,12 +30,13 @@ class StubCHRepo:
         course_id: str,
     ) -> List[Tuple[str, float]]:
         self.calls.append((metric, course_id))
-        return [("1111-2222", 0.5), ("3333-4444", 0.9)]
+        return [(USER_1, 0.5), (USER_2, 0.9)]
 
 
 @pytest.fixture
 def db_session() -> Generator[Session, None, None]:
-    engine = create_engine("sqlite://", connect_args={"check_same_thread": False})
+    # StaticPool: запись результатов идёт в потоке, а in-memory база живёт в одном соединении.
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
     SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
@@ -48,7 +55,7 @@ async def test_metrics_engine_stores_results(db_session: Session):
 
     start = datetime.now(timezone.utc) - timedelta(days=7)
     end = datetime.now(timezone.utc)
-    course_id = "course-1"
+    course_id = COURSE_1
 
     calculated = await engine.calculate_for_course(
         db=db_session,
@@ -63,3 +70,30 @@ async def test_metrics_engine_stores_results(db_session: Session):
     assert len(saved) == 4  # 2 metrics * 2 users
     assert all(r.course_id == course_id for r in saved)
     assert ch_repo.calls[0][0] == MetricName.RETENTION
+
+
+def test_metric_results_use_compact_keys(db_session: Session):
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=7)
+    MetricRepository().upsert_batch(
+        db_session, MetricName.COMPLETION, COURSE_1, start, end, [(USER_1, 0.5)]
+    )
+
+    raw_id, raw_name = db_session.execute(text("SELECT id, metric_name FROM metric_results")).one()
+    assert isinstance(raw_id, int)
+    assert raw_name == 3
+
+    saved = db_session.query(MetricResult).one()
+    assert saved.metric_name == MetricName.COMPLETION
+    assert saved.user_id == USER_1
+
+
+def test_guid_columns_normalize_and_reject_ids(db_session: Session):
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=7)
+    repo = MetricRepository()
+    repo.upsert_batch(db_session, MetricName.COMPLETION, COURSE_1.upper(), start, end, [(USER_1, 0.5)])
+    assert db_session.query(MetricResult).one().course_id == COURSE_1
+
+    with pytest.raises(StatementError):
+        repo.upsert_batch(db_session, MetricName.COMPLETION, "course-1", start, end, [(USER_1, 0.5)])
@@ -0,0 +1,61 @@
+from datetime import datetime
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import app.models  # noqa: F401
+from app.core.config import settings
+from app.models.metric import MetricName
+from app.repositories.metric_repository import MetricRepository
+
+ROOT = Path(__file__).resolve().parent.parent
+COURSE_1 = "c0000000-0000-4000-8000-000000000001"
+USER_1 = "a0000000-0000-4000-8000-000000000001"
+USER_2 = "a0000000-0000-4000-8000-000000000002"
+START = datetime(2024, 1, 1)
+END = datetime(2024, 1, 8)
+
+
+def alembic_config() -> Config:
+    # Без alembic.ini: fileConfig из env.py отключил бы логгеры приложения для остальных тестов.
+    config = Config()
+    config.set_main_option("script_location", str(ROOT / "migrations"))
+    return config
+
+
+def test_sqlite_upgrade_head_compacts_metric_results(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    monkeypatch.setattr(settings, "database_url", url)
+    config = alembic_config()
+    command.upgrade(config, "3c9a1f5d7e20")
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO metric_results "
+                "(id, metric_name, user_id, course_id, value, period_start, period_end, calculated_at) "
+                "VALUES ('legacy-id', 'retention', :user, :course, 0.5, :start, :end, :start)"
+            ),
+            {"user": USER_1, "course": COURSE_1, "start": START, "end": END},
+        )
+
+    command.upgrade(config, "head")
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT id, metric_name FROM metric_results")).all() == [(1, 1)]
+    db = sessionmaker(bind=engine)()
+    repo = MetricRepository()
+    repo.upsert_batch(db, MetricName.RETENTION, COURSE_1, START, END, [(USER_1, 1.0), (USER_2, 0.0)])
+    (aggregate,) = repo.get_course_aggregates(db, COURSE_1, START, END)
+    assert aggregate.count == 2 and aggregate.average_value == 0.5
+    db.close()
+
+    command.downgrade(config, "3c9a1f5d7e20")
+    with engine.connect() as conn:
+        assert {row.metric_name for row in conn.execute(text("SELECT metric_name FROM metric_results"))} == {
+            "retention"
+        }
+    engine.dispose()
@@ -0,0 +1,87 @@
+from concurrent.futures import Future
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.core.security as security
+import app.models  # noqa: F401
+from app.core.hashing import HasherSaturatedError, PasswordHasher
+from app.models.base import Base
+from app.models.user import UserRole
+from app.schemas.auth import UserCreate, UserLogin
+from app.services.auth import AuthService
+
+
+def make_session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine, autoflush=False, autocommit=False)()
+
+
+def test_process_pool_hashes_and_verifies():
+    hasher = PasswordHasher(workers=1, queue_limit=1, rounds=4)
+    try:
+        hashed = hasher.hash("secret123")
+        assert hashed.startswith("$2b$04$")
+        assert hasher.verify_and_update("secret123", hashed) == (True, None)
+        assert hasher.verify_and_update("wrong", hashed)[0] is False
+    finally:
+        hasher.shutdown()
+
+
+def test_saturated_hasher_rejects_with_503(monkeypatch):
+    hasher = PasswordHasher(workers=0, queue_limit=0, rounds=4)
+    monkeypatch.setattr(security, "password_hasher", hasher)
+    assert hasher._slots.acquire(blocking=False)  # единственный слот занят «долгим» хешированием
+    try:
+        with pytest.raises(HasherSaturatedError):
+            hasher.hash("secret123")
+        with pytest.raises(HTTPException) as exc_info:
+            security.hash_password("secret123")
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.headers == {"Retry-After": "1"}
+    finally:
+        hasher._slots.release()
+    assert security.hash_password("secret123").startswith("$2b$04$")
+
+
+def test_login_rehashes_when_cost_changes(monkeypatch):
+    db = make_session()
+    service = AuthService()
+    monkeypatch.setattr(security, "password_hasher", PasswordHasher(workers=0, queue_limit=1, rounds=4))
+    user, _, _ = service.register_user(
+        db, UserCreate(email="cost@example.com", password="secret123", role=UserRole.STUDENT)
+    )
+    assert user.hashed_password.startswith("$2b$04$")
+
+    monkeypatch.setattr(security, "password_hasher", PasswordHasher(workers=0, queue_limit=1, rounds=5))
+    authed, _, _ = service.authenticate(db, UserLogin(email="cost@example.com", password="secret123"))
+    db.refresh(authed)
+    assert authed.hashed_password.startswith("$2b$05$")
+    # Повторный вход уже не перехеширует и проходит со старым паролем.
+    previous = authed.hashed_password
+    service.authenticate(db, UserLogin(email="cost@example.com", password="secret123"))
+    db.refresh(authed)
+    assert authed.hashed_password == previous
+
+
+def test_hash_timeout_maps_to_503_and_holds_slot_until_done(monkeypatch):
+    hasher = PasswordHasher(workers=1, queue_limit=0, rounds=4, timeout_seconds=0.01)
+    pending = Future()
+    monkeypatch.setattr(hasher, "_submit", lambda fn, *args: pending)
+    monkeypatch.setattr(security, "password_hasher", hasher)
+    assert pending.set_running_or_notify_cancel()  # задача уже выполняется и не снимается отменой
+    with pytest.raises(HTTPException) as exc_info:
+        security.hash_password("secret123")
+    assert exc_info.value.status_code == 503
+    assert hasher.in_flight == 1  # слот держится, пока воркер не закончил
+    with pytest.raises(HasherSaturatedError):
+        hasher.hash("secret123")
+
+    pending.set_result("done")
+    assert hasher.in_flight == 0
+    assert hasher._slots.acquire(blocking=False)
+    hasher._slots.release()
@@ -0,0 +1,101 @@
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401
+from app.core.revocation import RevokedTokenIndex
+from app.core.security import create_refresh_token
+from app.core.tasks import sync_revoked_tokens
+from app.models.base import Base
+from app.models.refresh_token import RefreshToken
+from app.models.user import User, UserRole
+from app.repositories.refresh_token_repository import RefreshTokenRepository
+from app.services.auth import AuthService
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+
+def test_entries_expire_with_the_token():
+    index = RevokedTokenIndex(max_entries=2)
+    index.add("expired", time.time() - 1)
+    index.add("a", time.time() + 60)
+    index.add("b", time.time() + 60)
+    index.add("c", time.time() + 60)
+
+    assert not index.contains("expired")
+    # Переполнение вытесняет самую старую запись.
+    assert [index.contains(jti) for jti in ("a", "b", "c")] == [False, True, True]
+
+
+def test_replayed_token_is_rejected_without_database(session_factory):
+    with session_factory() as db:
+        user = User(email="replay@example.com", hashed_password="x", role=UserRole.STUDENT)
+        db.add(user)
+        db.commit()
+        user_id = user.id
+    token, jti, expires_at = create_refresh_token(user_id, UserRole.STUDENT.value)
+    repo = RefreshTokenRepository()
+    with session_factory() as db:
+        repo.create(db, jti=jti, user_id=user_id, expires_at=expires_at)
+
+    service = AuthService(refresh_repo=repo, revoked=RevokedTokenIndex(max_entries=10))
+    with session_factory() as db:
+        service.refresh_tokens(db, token)
+
+    class NoDatabase:
+        def __getattr__(self, name):
+            raise AssertionError("replay must not reach the database")
+
+    for _ in range(3):
+        with pytest.raises(HTTPException) as exc:
+            service.refresh_tokens(NoDatabase(), token)
+        assert exc.value.status_code == 401
+
+
+def test_delta_sync_picks_up_revocations_from_other_workers(session_factory):
+    repo = RefreshTokenRepository()
+    index = RevokedTokenIndex(max_entries=100)
+    user_id = str(uuid.uuid4())
+    jtis = [str(uuid.uuid4()) for _ in range(3)]
+    with session_factory() as db:
+        for jti in jtis:
+            repo.create(db, jti=jti, user_id=user_id, expires_at=datetime.utcnow() + timedelta(days=1))
+        repo.revoke(db, jti=jtis[0])
+
+    assert sync_revoked_tokens(session_factory, repo, index) == 1
+    assert index.contains(jtis[0]) and not index.contains(jtis[1])
+
+    with session_factory() as db:
+        repo.revoke(db, jti=jtis[1])
+    sync_revoked_tokens(session_factory, repo, index)
+    assert index.contains(jtis[1]) and not index.contains(jtis[2])
+
+
+def test_delta_sync_pages_past_batch_of_identical_revoked_at(session_factory):
+    repo = RefreshTokenRepository()
+    index = RevokedTokenIndex(max_entries=100)
+    user_id = str(uuid.uuid4())
+    revoked_at = datetime.utcnow()
+    jtis = [str(uuid.uuid4()) for _ in range(7)]
+    with session_factory() as db:
+        for jti in jtis:
+            repo.create(db, jti=jti, user_id=user_id, expires_at=datetime.utcnow() + timedelta(days=1))
+            repo.revoke(db, jti=jti)
+        db.query(RefreshToken).update({RefreshToken.revoked_at: revoked_at})
+        db.commit()
+
+    assert sync_revoked_tokens(session_factory, repo, index, batch_size=3) == 7
+    assert all(index.contains(jti) for jti in jtis)
+    # Повторный проход перечитывает окно перекрытия целиком и тоже завершается.
+    assert sync_revoked_tokens(session_factory, repo, index, batch_size=3) == 7
@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401
+from app.models.base import Base
+from app.models.job import PRIORITY_LEVELS, CalculationJob, JobPriority, JobStatus
+from app.schemas.events import EventIn
+from app.services.event_collector import EventCollectorService
+from app.services.scheduler import CourseActivityTracker, RecalculationScheduler, rolling_windows
+
+COURSE_ID = "c8f6d0f7-3868-41a8-9c1b-bd93fa2c0bcb"
+
+
+class MemoryRepo:
+    async def insert_batch(self, events):
+        pass
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+
+def make_event(course_id: str = COURSE_ID) -> EventIn:
+    return EventIn(
+        user_id="7f7b2b28-0d85-4701-a6c1-0d2a4b5b3e18",
+        course_id=course_id,
+        module_id="2d2f8c71-4a3d-4b1e-8cf8-474c84e0a940",
+        event_type="page_view",
+        timestamp="2024-01-01T00:00:00Z",
+    )
+
+
+def test_rolling_windows_cover_day_week_and_term():
+    now = datetime(2024, 10, 17, 13, 45)  # четверг
+    day, week, term = rolling_windows(now, ["day", "week", "term"], [2, 9])
+
+    assert day == (datetime(2024, 10, 17), datetime(2024, 10, 18))
+    assert week == (datetime(2024, 10, 14), datetime(2024, 10, 21))
+    assert term == (datetime(2024, 9, 1), datetime(2025, 2, 1))
+    assert rolling_windows(datetime(2025, 1, 5), ["term"], [2, 9]) == [(datetime(2024, 9, 1), datetime(2025, 2, 1))]
+
+
+@pytest.mark.anyio
+async def test_only_courses_with_new_events_are_scheduled(session_factory):
+    tracker = CourseActivityTracker()
+    collector = EventCollectorService(repository=MemoryRepo(), activity=tracker)
+    scheduler = RecalculationScheduler(
+        session_factory=session_factory, tracker=tracker, windows=["day", "week"], max_courses_per_tick=10
+    )
+    now = datetime(2024, 10, 17, 12, 0)
+
+    assert scheduler.tick(now) == 0
+
+    await collector.ingest_events([make_event(), make_event()])
+    assert scheduler.tick(now) == 2
+    # Без новых событий курс повторно не планируется.
+    assert scheduler.tick(now + timedelta(minutes=5)) == 0
+
+    with session_factory() as db:
+        jobs = db.query(CalculationJob).all()
+        assert {job.course_id for job in jobs} == {COURSE_ID}
+        assert {job.priority for job in jobs} == {PRIORITY_LEVELS[JobPriority.BATCH]}
+        assert {(job.period_start, job.period_end) for job in jobs} == {
+            (datetime(2024, 10, 17), datetime(2024, 10, 18)),
+            (datetime(2024, 10, 14), datetime(2024, 10, 21)),
+        }
+
+    # Новые события, пока прежние задания ещё в очереди, присоединяются к ним.
+    await collector.ingest_events([make_event()])
+    assert scheduler.tick(now + timedelta(minutes=10)) == 2
+    with session_factory() as db:
+        assert db.query(CalculationJob).count() == 2
+
+
+def test_rate_limit_defers_remaining_courses(session_factory):
+    tracker = CourseActivityTracker()
+    scheduler = RecalculationScheduler(
+        session_factory=session_factory, tracker=tracker, windows=["day"], max_courses_per_tick=2
+    )
+    tracker.mark([f"c0000000-0000-4000-8000-00000000000{i}" for i in range(5)], at=datetime(2024, 10, 17, 9, 0))
+    now = datetime(2024, 10, 17, 12, 0)
+
+    assert [scheduler.tick(now) for _ in range(4)] == [2, 2, 1, 0]
+    with session_factory() as db:
+        assert db.query(CalculationJob).count() == 5
+
+
+@pytest.mark.anyio
+async def test_course_stays_dirty_while_its_job_is_running(session_factory):
+    tracker = CourseActivityTracker()
+    collector = EventCollectorService(repository=MemoryRepo(), activity=tracker)
+    scheduler = RecalculationScheduler(
+        session_factory=session_factory, tracker=tracker, windows=["day"], max_courses_per_tick=10
+    )
+    now = datetime(2024, 10, 17, 12, 0)
+
+    await collector.ingest_events([make_event()])
+    assert scheduler.tick(now) == 1
+    with session_factory() as db:
+        db.query(CalculationJob).update({CalculationJob.status: JobStatus.RUNNING.value})
+        db.commit()
+
+    # Скан выполняющегося задания уже начат: события после него требуют нового пересчёта.
+    await collector.ingest_events([make_event()])
+    assert scheduler.tick(now + timedelta(minutes=5)) == 0
+    assert scheduler.tick(now + timedelta(minutes=10)) == 0
+
+    with session_factory() as db:
+        db.query(CalculationJob).update({CalculationJob.status: JobStatus.SUCCEEDED.value})
+        db.commit()
+    assert scheduler.tick(now + timedelta(minutes=15)) == 1
+    assert scheduler.tick(now + timedelta(minutes=20)) == 0
+    with session_factory() as db:
+        assert db.query(CalculationJob).count() == 2
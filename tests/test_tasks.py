@@ -0,0 +1,121 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.tasks import AdvisoryLockLeader, TaskSupervisor, jittered
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class StaticLeader:
+    def __init__(self, leader: bool):
+        self.leader = leader
+        self.released = False
+
+    def is_leader(self) -> bool:
+        return self.leader
+
+    def release(self) -> None:
+        self.released = True
+
+
+class FakeLockConnection:
+    """Соединение Postgres: pg_try_advisory_lock всегда успешен, SELECT 1 падает после обрыва."""
+
+    def __init__(self):
+        self.broken = False
+        self.calls = []
+
+    def execute(self, statement, params=None):
+        if self.broken and "SELECT 1" in str(statement):
+            raise ConnectionError("server closed the connection")
+        return SimpleNamespace(scalar=lambda: True)
+
+    def commit(self):
+        pass
+
+    def invalidate(self):
+        self.calls.append("invalidate")
+
+    def close(self):
+        self.calls.append("close")
+
+
+def test_jitter_stays_within_ratio():
+    values = [jittered(10.0, 0.2) for _ in range(200)]
+    assert all(8.0 <= value <= 12.0 for value in values)
+    assert jittered(10.0, 0.0) == 10.0
+
+
+@pytest.mark.anyio
+async def test_only_leader_runs_leader_jobs_and_stats_are_collected():
+    leader = StaticLeader(leader=False)
+    tasks = TaskSupervisor(leader=leader, shutdown_timeout_seconds=1.0)
+    calls = []
+    exclusive = tasks.register("purge", lambda: calls.append("purge"), 60, leader_only=True)
+    everywhere = tasks.register("sync", lambda: calls.append("sync"), 60)
+    failing = tasks.register("broken", lambda: 1 / 0, 60)
+    assert tasks.register("disabled", lambda: None, 0) is None
+
+    assert not await tasks.run_job(exclusive)
+    assert await tasks.run_job(everywhere)
+    leader.leader = True
+    assert await tasks.run_job(exclusive)
+    await tasks.run_job(failing)
+
+    assert calls == ["sync", "purge"]
+    stats = {job["name"]: job for job in tasks.stats()["jobs"]}
+    assert (stats["purge"]["runs"], stats["purge"]["skipped"]) == (1, 1)
+    assert stats["broken"]["failures"] == 1 and "ZeroDivisionError" in stats["broken"]["last_error"]
+
+
+@pytest.mark.anyio
+async def test_stop_waits_for_short_runs_and_cancels_hung_ones():
+    leader = StaticLeader(leader=True)
+    tasks = TaskSupervisor(leader=leader, shutdown_timeout_seconds=0.2)
+    started = asyncio.Event()
+    cancelled = []
+
+    async def hung():
+        started.set()
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    tasks.register("quick", lambda: None, 0.01)
+    tasks.register("hung", hung, 60)
+    tasks.start()
+    await asyncio.wait_for(started.wait(), timeout=1)
+    await asyncio.sleep(0.05)
+
+    await asyncio.wait_for(tasks.stop(), timeout=2)
+    assert cancelled == [True]
+    assert leader.released
+    assert not tasks.stats()["running"]
+    assert {job["name"]: job["runs"] for job in tasks.stats()["jobs"]}["quick"] >= 2
+
+
+def test_leader_connection_is_invalidated_not_returned_to_pool():
+    connections = []
+
+    def connect():
+        connections.append(FakeLockConnection())
+        return connections[-1]
+
+    engine = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), connect=connect)
+    leader = AdvisoryLockLeader(lambda: engine, lock_key=1)
+
+    assert leader.is_leader()
+    connections[0].broken = True
+    assert leader.is_leader()  # переподключение с новой блокировкой
+    leader.release()
+
+    # Соединения с блокировкой (потерянное и освобождённое) не возвращаются в пул.
+    assert connections[0].calls == ["invalidate", "close"]
+    assert connections[1].calls == ["invalidate", "close"]
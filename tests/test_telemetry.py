@@ -0,0 +1,72 @@
+from typing import Generator
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401
+from app.core.database import get_db
+from app.core.telemetry import AUTH_SECONDS, Registry
+from app.main import create_app
+from app.models.base import Base
+from app.models.user import UserRole
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db() -> Generator[Session, None, None]:
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client() -> Generator[TestClient, None, None]:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    application = create_app()
+    application.dependency_overrides[get_db] = override_get_db
+    with TestClient(application) as test_client:
+        yield test_client
+
+
+def test_prometheus_text_format():
+    registry = Registry()
+    requests = registry.counter("demo_requests_total", "Demo requests", ("outcome",))
+    latency = registry.histogram("demo_seconds", "Demo latency", ("op",), buckets=(0.1, 1.0))
+    requests.inc(outcome="ok")
+    requests.inc(2, outcome="ok")
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, op='a"b')
+
+    lines = registry.render().splitlines()
+    assert "# TYPE demo_requests_total counter" in lines
+    assert 'demo_requests_total{outcome="ok"} 3.0' in lines
+    assert 'demo_seconds_bucket{op="a\\"b",le="0.1"} 1.0' in lines
+    assert 'demo_seconds_bucket{op="a\\"b",le="1.0"} 2.0' in lines
+    assert 'demo_seconds_bucket{op="a\\"b",le="+Inf"} 3.0' in lines
+    assert 'demo_seconds_count{op="a\\"b"} 3.0' in lines
+    assert 'demo_seconds_sum{op="a\\"b"} 5.55' in lines
+
+
+def test_metrics_endpoint_reports_hot_paths(client: TestClient):
+    before = AUTH_SECONDS.count(operation="register", outcome="ok")
+    payload = {"email": "telemetry@example.com", "password": "secret123", "role": UserRole.STUDENT.value}
+    assert client.post("/auth/register", json=payload).status_code == 201
+    assert client.post("/auth/register", json=payload).status_code == 400
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert AUTH_SECONDS.count(operation="register", outcome="ok") == before + 1
+    assert 'auth_operation_duration_seconds_count{operation="register",outcome="400"}' in body
+    assert 'http_request_duration_seconds_count{method="POST",route="/auth/register",status="201"}' in body
+    assert 'password_hash_duration_seconds_count{operation="hash"}' in body
+    assert 'threadpool_threads{state="capacity"}' in body
+    assert 'db_pool_connections{pool="primary",state="checkedout"}' in body
@@ -0,0 +1,52 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+import app.core.security as security
+from app.core.security import create_access_token, create_refresh_token
+from app.core.token_cache import VerifiedTokenCache
+
+
+def bearer(token: str) -> HTTPAuthorizationCredentials:
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+def test_repeated_requests_skip_jwt_decode(monkeypatch):
+    cache = VerifiedTokenCache(max_entries=10)
+    monkeypatch.setattr(security, "access_token_cache", cache)
+    calls = []
+    original_decode = security.decode_token
+
+    def counting_decode(token):
+        calls.append(token)
+        return original_decode(token)
+
+    monkeypatch.setattr(security, "decode_token", counting_decode)
+    token = create_access_token("user-1", "teacher")
+
+    for _ in range(5):
+        assert security.get_current_payload(bearer(token))["role"] == "teacher"
+    assert len(calls) == 1
+
+    refresh, _, _ = create_refresh_token("user-1", "teacher")
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            security.get_current_payload(bearer(refresh))
+    assert len(calls) == 3
+    assert len(cache) == 1
+
+
+def test_entries_expire_with_token_and_are_bounded():
+    cache = VerifiedTokenCache(max_entries=2)
+    now = time.time()
+    cache.set("expired", {"sub": "a", "exp": now - 1})
+    assert cache.get("expired") is None
+
+    cache.set("t1", {"sub": "1", "exp": now + 60})
+    cache.set("t2", {"sub": "2", "exp": now + 60})
+    assert cache.get("t1")["sub"] == "1"  # t1 становится самым свежим
+    cache.set("t3", {"sub": "3", "exp": now + 60})
+    assert cache.get("t2") is None
+    assert [cache.get(t)["sub"] for t in ("t1", "t3")] == ["1", "3"]